@@ -1,9 +1,11 @@
+import { env } from "process";
 import express from "express";
 import cors from 'cors';
 import cookieParser from "cookie-parser";
 import compression from 'compression'
 
 import corsConfig from './config/cors';
+import serverTiming from './middlewares/serverTiming';
 import eventRouter from './routes/event';
 import userRouter from "./routes/user";
 import organisationRouter from "./routes/organisation";
@@ -14,13 +16,16 @@ import quotaRouter from "./routes/quota";
 import quotaTypeRouter from "./routes/quotaType";
 import renderRouter from "./routes/render";
 import emailRouter from "./routes/email";
+import logRouter from "./routes/log";
 
 const app = express()
 
+if (parseInt(env.ENABLE_SERVER_TIMING as string)) app.use(serverTiming)
 app.use(cors(corsConfig))
 app.use(cookieParser())
 app.use(express.json({ limit: "64mb" }))
-app.use(compression())
+// PNGs are already compressed, compressing them again only costs CPU
+app.use(compression({ filter: (req, res) => res.getHeader('Content-Type') !== 'image/png' && compression.filter(req, res) }))
 
 app.use('/event', eventRouter)
 app.use('/user', userRouter)
@@ -32,5 +37,6 @@ app.use('/quota', quotaRouter)
 app.use('/quotaType', quotaTypeRouter)
 app.use('/render', renderRouter)
 app.use('/email', emailRouter)
+app.use('/log', logRouter)
 
 export default app
@@ -2,15 +2,15 @@ import { env } from "process";
 import { Request, Response } from '../types'
 import { prismaClient } from "../services/database";
 import { Prisma } from '@prisma/client';
-import { InvitationEmail } from '../emails/invitation-email'
-import { TicketEmail } from '../emails/ticket-email'
 import { Resend } from "resend";
 import { isAdmin } from "../utils/permissionCheckers";
+import { getConfig } from "../utils/eventConfig";
+import { cpuPool, PoolBusyError } from "../utils/workerPool";
+import { composeTicketEmail, composeTicketEmails, getResend, getSender, getTicketEmailEvent, markSent, setResend, ticketEmailAddress } from "../services/email";
+import { createMailJob, hasRunningMailJob, isMailJobActive, runMailJob, stopMailJob } from "../utils/mailJob";
+import { logEvent } from "../utils/databaseLogging";
 
-const { PUBLIC_FRONTEND_BASE_INVITATION_URL, PUBLIC_FRONTEND_BASE_TICKET_URL, PUBLIC_FRONTEND_BACKGROUND_URL, PUBLIC_FRONTEND_LOGO_URL, BACKEND_BASE_RENDER_URL, EVENT_TIMEZONE } = env
-let resendClient: Resend | undefined = undefined;
-let senderDomain = "";
-const senderName = "no-reply";
+const { PUBLIC_FRONTEND_BASE_INVITATION_URL, PUBLIC_FRONTEND_BACKGROUND_URL, PUBLIC_FRONTEND_LOGO_URL, BACKEND_BASE_RENDER_URL } = env
 
 
 export const auth = async (req: Request, res: Response) => {
@@ -19,18 +19,13 @@ export const auth = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403);
 
     try {
-        const oldResendClient = resendClient
-        resendClient = new Resend(apiKey)
+        const resendClient = new Resend(apiKey)
         if (!domain) {
-            const data = await resendClient?.domains.list()
-            if (data.data?.data.length) {
-                senderDomain = data.data?.data[0].name
-            } else {
-                resendClient = oldResendClient
-                return res.sendStatus(400)
-            }
+            const data = await resendClient.domains.list()
+            if (!data.data?.data.length) return res.sendStatus(400)
+            setResend(resendClient, data.data.data[0].name)
         } else {
-            senderDomain = domain
+            setResend(resendClient, domain)
         }
 
         return res.sendStatus(200)
@@ -46,14 +41,14 @@ export const sendInvitation = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403);
 
     try {
-        const event_info = await prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({ where: { name: 'event_info' } })
-        const eventName = (event_info.value as { name?: string })?.name || "";
+        const event_info = await getConfig('event_info')
+        const eventName = (event_info as { name?: string })?.name || "";
 
-        const data = await resendClient?.emails.send({
-            from: `${senderName}@${senderDomain}`,
+        const data = await getResend()?.emails.send({
+            from: getSender(),
             to,
             subject: `Invitation to ${eventName}`,
-            react: InvitationEmail({
+            html: await cpuPool.run('invitationEmail', {
                 event: { name: eventName },
                 bgUrl: PUBLIC_FRONTEND_BACKGROUND_URL,
                 logoUrl: PUBLIC_FRONTEND_LOGO_URL,
@@ -72,6 +67,10 @@ export const sendInvitation = async (req: Request, res: Response) => {
         if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
             return res.sendStatus(404)
         }
+        if (e instanceof PoolBusyError) {
+            res.set('Retry-After', '1')
+            return res.sendStatus(503)
+        }
         console.log(e)
     }
 }
@@ -81,42 +80,23 @@ export const sendTickets = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403);
 
     try {
-        const [tickets, event_info, event_details] = await prismaClient.$transaction([
+        // A running mail job reads the same tickets, sending them here too would mail them twice
+        if (await hasRunningMailJob()) return res.sendStatus(409)
+        const [tickets, event] = await Promise.all([
             prismaClient.ticket.findMany({ where: { sentEmail: "" }, take: Math.min(limit, 100) }),
-            prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({ where: { name: 'event_info' } }),
-            prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({ where: { name: 'event_details' } })
+            getTicketEmailEvent()
         ])
 
-        const eventName = (event_info.value as { name?: string })?.name || "";
-        const eventLocationName = (event_details.value as { locationName?: string })?.locationName || "";
-        const eventStartTime = (event_details.value as { startTime?: Date })?.startTime || new Date();
-
-        const data = await resendClient?.batch.send(tickets.map(({ UUID, ownerName, ownerContacts }) => {
-            return ({
-                from: `${senderName}@${senderDomain}`,
-                to: [(ownerContacts as { email: string })?.email],
-                subject: `Your ticket for ${eventName}`,
-                react: TicketEmail({
-                    event: { name: eventName || "", locationName: eventLocationName, startTime: eventStartTime },
-                    ownerName: ownerName,
-                    bgUrl: PUBLIC_FRONTEND_BACKGROUND_URL,
-                    logoUrl: PUBLIC_FRONTEND_LOGO_URL,
-                    ticketLink: `${PUBLIC_FRONTEND_BASE_TICKET_URL}/${UUID}`,
-                    qrImgUrl: `${BACKEND_BASE_RENDER_URL}/ticket/${UUID}`,
-                    timezone: EVENT_TIMEZONE
-                })
-            })
-        }))
+        const data = await getResend()?.batch.send(await composeTicketEmails(tickets, event))
 
-        const deliveredList: any[] = []
-        for (let i = 0; i < Math.min(tickets.length, Math.min(limit, 100)); i++) {
-            if (data?.data?.data[i].id) deliveredList.push({ UUID: tickets[i].UUID, sentMail: data.data.data[i].id });
+        const deliveredList: { UUID: string, sentEmail: string }[] = []
+        for (let i = 0; i < tickets.length; i++) {
+            const id = data?.data?.data[i]?.id
+            if (id) deliveredList.push({ UUID: tickets[i].UUID, sentEmail: id });
         }
 
         if (deliveredList.length) {
-            await prismaClient.$transaction(deliveredList.map((e) =>
-                prismaClient.ticket.update({ where: { UUID: e.UUID }, data: { sentEmail: e.sentMail } })
-            ))
+            await markSent(deliveredList)
             return res.sendStatus(200)
         } else {
             return res.sendStatus(400)
@@ -125,6 +105,10 @@ export const sendTickets = async (req: Request, res: Response) => {
         if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
             return res.sendStatus(404)
         }
+        if (e instanceof PoolBusyError) {
+            res.set('Retry-After', '1')
+            return res.sendStatus(503)
+        }
         console.log(e)
     }
 }
@@ -134,31 +118,13 @@ export const sendTicket = async (req: Request, res: Response) => {
     if (typeof UUID !== "string") return res.sendStatus(400)
     if (!isAdmin(req.user)) return res.sendStatus(403)
     try {
-        const [ticket, event_info, event_details] = await prismaClient.$transaction([
+        const [ticket, event] = await Promise.all([
             prismaClient.ticket.findUniqueOrThrow({ where: { UUID } }),
-            prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({ where: { name: 'event_info' } }),
-            prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({ where: { name: 'event_details' } })
+            getTicketEmailEvent()
         ])
 
-        if (!((ticket.ownerContacts as { email?: string })?.email)) return res.sendStatus(400);
-        const eventName = (event_info.value as { name?: string })?.name || "";
-        const eventLocationName = (event_details.value as { locationName?: string })?.locationName || "";
-        const eventStartTime = (event_details.value as { startTime?: Date })?.startTime || new Date();
-
-        const data = await resendClient?.emails.send({
-            from: `${senderName}@${senderDomain}`,
-            to: [(ticket.ownerContacts as { email: string })?.email],
-            subject: `Your ticket for ${eventName}`,
-            react: TicketEmail({
-                event: { name: eventName || "", locationName: eventLocationName, startTime: eventStartTime },
-                ownerName: ticket.ownerName,
-                bgUrl: PUBLIC_FRONTEND_BACKGROUND_URL,
-                logoUrl: PUBLIC_FRONTEND_LOGO_URL,
-                ticketLink: `${PUBLIC_FRONTEND_BASE_TICKET_URL}/${UUID}`,
-                qrImgUrl: `${BACKEND_BASE_RENDER_URL}/ticket/${UUID}`,
-                timezone: EVENT_TIMEZONE
-            })
-        })
+        if (!ticketEmailAddress(ticket)) return res.sendStatus(400);
+        const data = await getResend()?.emails.send(await composeTicketEmail(ticket, event))
 
         if (data?.data?.id) {
             await prismaClient.ticket.update({ where: { UUID }, data: { sentEmail: data.data.id } })
@@ -166,10 +132,95 @@ export const sendTicket = async (req: Request, res: Response) => {
         } else {
             return res.sendStatus(400)
         }
+    } catch (e) {
+        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
+            return res.sendStatus(404)
+        }
+        if (e instanceof PoolBusyError) {
+            res.set('Retry-After', '1')
+            return res.sendStatus(503)
+        }
+        console.log(e)
+    }
+}
+
+
+// Post
+// Starts mailing every ticket without an email yet in the background, see utils/mailJob. One job runs at a time,
+// /email/sendTickets answers 409 meanwhile.
+export const createJob = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    if (!getResend()) return res.sendStatus(400)
+
+    try {
+        const job = await createMailJob()
+        if (!job) return res.sendStatus(409)
+        runMailJob(job.UUID)
+        await logEvent({ event: "CREATE", summary: `Create MailJob`, description: `Created mailJob for ${job.total} tickets [UUID=${job.UUID}]` })
+        return res.status(201).json({ job })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
+// Get
+export const getJobs = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+
+    try {
+        const jobs = await prismaClient.mailJob.findMany({ orderBy: { createdTime: 'desc' }, take: 20 })
+        return res.json({ jobs })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
+// Get
+// active tells whether this process is mailing for the job, a running job which is not waits for /email/auth
+export const getJob = async (req: Request, res: Response) => {
+    const { UUID } = req.params
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+
+    try {
+        const job = await prismaClient.mailJob.findUniqueOrThrow({ where: { UUID } })
+        return res.json({
+            job,
+            active: isMailJobActive(UUID),
+            remaining: Math.max(0, job.total - job.sent - job.failed)
+        })
+    } catch (e) {
+        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
+            return res.sendStatus(404)
+        }
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
+// Post
+// Stops the job once its batches in flight are sent, the tickets left keep no email and go to the next job
+// A job ran by another process stops there once it renews its lease, see utils/mailJob
+export const cancelJob = async (req: Request, res: Response) => {
+    const { UUID } = req.params
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+
+    try {
+        const job = await prismaClient.mailJob.findUniqueOrThrow({ where: { UUID } })
+        if (job.status !== 'running') return res.sendStatus(409)
+        await prismaClient.mailJob.update({ where: { UUID }, data: { status: 'cancelled', finishedTime: new Date() } })
+        await stopMailJob(UUID)
+        await logEvent({ event: "UPDATE", summary: `Cancel MailJob`, description: `Cancelled mailJob [UUID=${UUID}]` })
+        return res.json({ job: await prismaClient.mailJob.findUniqueOrThrow({ where: { UUID } }) })
     } catch (e) {
         if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
             return res.sendStatus(404)
         }
         console.log(e)
+        return res.sendStatus(500)
     }
 }
@@ -2,15 +2,11 @@ import { Request, Response } from '../types'
 import { prismaClient } from "../services/database";
 import { Prisma } from '@prisma/client';
 import { isAdmin } from '../utils/permissionCheckers';
+import { configCache, getConfig, invalidateConfig } from '../utils/eventConfig';
 
 export const getInfo = async (req: Request, res: Response) => {
     try {
-        const { value: base_info } = await prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({
-            where: { name: 'event_info' }
-        });
-        const { value: event_socials } = await prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({
-            where: { name: 'event_socials' }
-        });
+        const [base_info, event_socials] = await Promise.all([getConfig('event_info'), getConfig('event_socials')])
         return res.json({ event: { ...(base_info as Object), socials: event_socials } })
     } catch (e) {
         if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
@@ -24,10 +20,10 @@ export const getInfo = async (req: Request, res: Response) => {
 export const getDetails = async (req: Request, res: Response) => {
     try {
         const { UUID } = req.query
-        await prismaClient.ticket.findUniqueOrThrow({ where: { UUID: UUID as string } })
-        const { value: event_details } = await prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({
-            where: { name: 'event_details' }
-        });
+        const [_, event_details] = await Promise.all([
+            prismaClient.ticket.findUniqueOrThrow({ where: { UUID: UUID as string } }),
+            getConfig('event_details')
+        ])
         return res.json({ event_details })
     } catch (e) {
         if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
@@ -67,6 +63,7 @@ export const update = async (req: Request, res: Response) => {
             where: { name: name },
             data: { value: value }
         })
+        invalidateConfig(name)
         return res.sendStatus(201)
     } catch (e) {
         if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
@@ -75,3 +72,12 @@ export const update = async (req: Request, res: Response) => {
         console.log(e)
     }
 }
+
+
+// Get
+export const getCacheStats = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    return res.json({
+        cache: { ttl: configCache.ttl, size: configCache.size, ...configCache.stats, keys: Object.fromEntries(configCache.keyStats) }
+    })
+}
@@ -3,20 +3,34 @@ import { Prisma } from "@prisma/client";
 import { prismaClient } from "../services/database";
 import { isAdmin, isOrganisationManager } from "../utils/permissionCheckers";
 import { logEvent } from "../utils/databaseLogging";
+import { filterValidators, pageArgs, pageQueryValidator, toPage } from "../utils/pagination";
+import { exportFormats, streamTickets } from "../utils/ticketExport";
+
+const listQueryValidator = pageQueryValidator(['createdTime', 'name', 'usageQuota', 'usageLeft', 'UUID']).extend({
+    organisationId: filterValidators.UUID
+})
 
 
 // Get
 export const getAll = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403)
 
+    const parsedQuery = listQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { organisationId, ...page } = parsedQuery.data
+
     try {
-        const invitations = await prismaClient.invitation.findMany({
-            include: { publisher: { select: { name: true } } }
+        const rows = await prismaClient.invitation.findMany({
+            where: { organisationId },
+            include: { publisher: { select: { name: true } } },
+            ...pageArgs(page)
         });
 
-        return res.json({ invitations })
+        const { rows: invitations, nextCursor } = toPage(rows, page)
+        return res.json({ invitations, nextCursor })
     } catch (e) {
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -135,6 +149,28 @@ export const getTickets = async (req: Request, res: Response) => {
 }
 
 
+// Get
+// ?format=ndjson|csv, streamed a chunk of tickets at a time
+export const exportTickets = async (req: Request, res: Response) => {
+    const { UUID } = req.params
+    const { format = 'ndjson' } = req.query
+    if (typeof UUID !== "string" || !exportFormats.includes(format as any)) return res.sendStatus(400)
+
+    try {
+        const { organisationId } = await prismaClient.invitation.findUniqueOrThrow({
+            where: { UUID: UUID as string },
+            select: { organisationId: true }
+        });
+        if (!isOrganisationManager(req.user, organisationId)) return res.sendStatus(403)
+
+        return await streamTickets(res, { invitationId: UUID as string }, format as typeof exportFormats[number], `tickets-${UUID}`)
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(404)
+    }
+}
+
+
 // Get
 export const getDefaultQuotas = async (req: Request, res: Response) => {
     const { UUID } = req.params
@@ -208,6 +244,57 @@ export const create = async (req: Request, res: Response) => {
 }
 
 
+// Post
+export const createMany = async (req: Request, res: Response) => {
+    const { invitations = [] }: {
+        invitations: { name: string, organisationId: string, usageQuota?: number, defaultQuotas?: DefaultQuotaInput[] }[]
+    } = req.body
+    if (!Array.isArray(invitations)) return res.sendStatus(400)
+
+    let valid = true
+    let permitted = true
+    invitations.forEach(({ name, organisationId, usageQuota = 1, defaultQuotas = [] }) => {
+        valid &&= !!name && !!organisationId && (typeof usageQuota === "number") && Array.isArray(defaultQuotas)
+            && defaultQuotas.every((element) => typeof element.quotaTypeId === "string") // prevents nested create
+        permitted &&= !!isOrganisationManager(req.user, organisationId)
+    })
+    if (!valid) return res.sendStatus(400)
+    if (!permitted) return res.sendStatus(403)
+
+    try {
+        const createdInvitations = await prismaClient.$transaction(
+            invitations.map(({ name, organisationId, usageQuota = 1, defaultQuotas = [] }) => (
+                prismaClient.invitation.create({
+                    data: {
+                        name: name,
+                        organisationId: organisationId,
+                        usageQuota: usageQuota,
+                        usageLeft: usageQuota,
+                        defaultQuotas: {
+                            createMany: { data: defaultQuotas }
+                        }
+                    },
+                    include: {
+                        defaultQuotas: {
+                            include: {
+                                quotaType: {
+                                    select: { name: true }
+                                }
+                            }
+                        }
+                    }
+                })))
+        )
+
+        await logEvent({ event: "CREATE", summary: `Create Many Invitation`, description: `Created ${createdInvitations.length} invitations [UUIDs=${createdInvitations.map((invitation) => invitation.UUID)}]` })
+        return res.json({ invitations: createdInvitations })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
 // Patch
 export const update = async (req: Request, res: Response) => {
     const {
@@ -289,3 +376,30 @@ export const deleteOne = async (req: Request, res: Response) => {
         console.log(e)
     }
 }
+
+
+// Delete
+export const deleteMany = async (req: Request, res: Response) => {
+    const { UUIDs = [] }: { UUIDs: string[] } = req.body;
+    if (!Array.isArray(UUIDs) || !UUIDs.every((UUID) => typeof UUID === "string")) return res.sendStatus(400)
+
+    try {
+        const invitations = await prismaClient.invitation.findMany({
+            where: { UUID: { in: UUIDs } },
+            select: { organisationId: true }
+        })
+
+        let permitted = true
+        invitations.forEach(({ organisationId }) => { permitted &&= !!isOrganisationManager(req.user, organisationId) })
+        if (!permitted) return res.sendStatus(403)
+
+        const deletedInvitations = await prismaClient.invitation.deleteMany({
+            where: { UUID: { in: UUIDs } }
+        })
+
+        await logEvent({ event: "DELETE", summary: `Delete Invitations`, description: `Deleted ${deletedInvitations.count} invitations [UUIDs=${UUIDs}]` })
+        return res.sendStatus(201)
+    } catch (e) {
+        console.log(e)
+    }
+}
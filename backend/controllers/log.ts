@@ -0,0 +1,153 @@
+import { Request, Response } from '../types'
+import { z } from 'zod';
+import { Prisma } from '@prisma/client';
+import { prismaClient, logAction } from "../services/database";
+import { isAdmin } from '../utils/permissionCheckers';
+import { getLogActionId, logQueue, logWriteMode } from '../utils/databaseLogging';
+import { DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE } from '../utils/pagination';
+import { pruneLogs } from '../utils/logRetention';
+
+const HOUR = 60 * 60 * 1000
+// Widest range of a rollup, a minute per row
+const MAX_ROLLUP_SPAN = 7 * 24 * HOUR
+
+const rangeValidator = {
+    action: z.nativeEnum(logAction).optional(),
+    from: z.coerce.date().optional(),
+    to: z.coerce.date().optional()
+}
+
+// ?after=<nextCursor of the previous page>, the id of the last log of that page
+const listQueryValidator = z.object({
+    ...rangeValidator,
+    limit: z.coerce.number().int().min(1).max(MAX_PAGE_SIZE).default(DEFAULT_PAGE_SIZE),
+    after: z.coerce.number().int().optional()
+})
+
+const rollupQueryValidator = z.object(rangeValidator)
+
+const pruneValidator = z.object({
+    before: z.coerce.date(),
+    archive: z.boolean().optional()
+})
+
+const statsQueryValidator = z.object({
+    since: z.coerce.date().optional()
+})
+
+
+// Get
+// Logs ordered by action, then newest first, as the (logActionId, at) index is. Prisma turns the cursor into a keyset
+// condition on the cursor's row, so a page is a range scan of the index however deep it is; filtering by action and
+// range narrows the scan further.
+export const getAll = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    const parsedQuery = listQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { action, from, to, limit, after } = parsedQuery.data
+
+    try {
+        const rows = await prismaClient.log.findMany({
+            where: {
+                logActionId: action ? await getLogActionId(action) : undefined,
+                at: { gte: from, lt: to }
+            },
+            select: {
+                id: true,
+                summary: true,
+                description: true,
+                at: true,
+                logAction: { select: { name: true } }
+            },
+            orderBy: [{ logActionId: 'asc' }, { at: 'desc' }, { id: 'desc' }],
+            take: limit + 1,
+            ...(after !== undefined ? { cursor: { id: after }, skip: 1 } : {})
+        })
+        const logs = rows.slice(0, limit)
+        return res.json({ logs, nextCursor: rows.length > limit ? logs[logs.length - 1].id : null })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
+// Get
+// Logs counted per action per minute, over the last hour unless from and to say otherwise
+export const getRollup = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    const parsedQuery = rollupQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { action } = parsedQuery.data
+    const to = parsedQuery.data.to ?? new Date()
+    const from = parsedQuery.data.from ?? new Date(to.getTime() - HOUR)
+    if (to.getTime() - from.getTime() > MAX_ROLLUP_SPAN) return res.status(400).json({ errors: { from: ['The range spans more than 7 days'] } })
+
+    try {
+        const rollup = await prismaClient.$queryRaw<{ action: string | null, minute: Date, count: number }[]>`
+            SELECT "LogAction".name AS action, date_trunc('minute', "Log"."at") AS minute, COUNT(*)::int AS count
+            FROM "Log" LEFT JOIN "LogAction" ON "LogAction".id = "Log"."logActionId"
+            WHERE "Log"."at" >= ${from} AND "Log"."at" < ${to}
+            ${action ? Prisma.sql`AND "Log"."logActionId" = ${await getLogActionId(action)}` : Prisma.empty}
+            GROUP BY 1, 2
+            ORDER BY 2, 1
+        `
+        return res.json({ rollup, from, to })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
+// Post
+// Deletes, or moves to LogArchive, the logs older than before, in batches (see utils/logRetention)
+export const prune = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    const parsedBody = pruneValidator.safeParse(req.body)
+    if (!parsedBody.success) return res.status(400).json({ errors: parsedBody.error.flatten().fieldErrors })
+    const { before, archive } = parsedBody.data
+
+    try {
+        const removed = await pruneLogs(before, archive)
+        return res.json({ removed })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
+// Get
+// The state of the audit log queue, with since, also the log rows written since then by action name
+export const getStats = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    const parsedQuery = statsQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { since } = parsedQuery.data
+
+    try {
+        const queue = {
+            mode: logWriteMode,
+            pending: logQueue.pending,
+            limit: logQueue.limit,
+            overflow: logQueue.overflow,
+            ...logQueue.stats
+        }
+        if (!since) return res.json({ queue, now: new Date() })
+
+        const [logActions, counts] = await Promise.all([
+            prismaClient.logAction.findMany(),
+            prismaClient.log.groupBy({ by: ['logActionId'], where: { at: { gte: since } }, _count: { _all: true } })
+        ])
+        const rows = Object.fromEntries(logActions.map(({ name }) => [name, 0]))
+        counts.forEach(({ logActionId, _count }) => {
+            const logAction = logActions.find(({ id }) => id === logActionId)
+            if (logAction) rows[logAction.name] = _count._all
+        })
+        return res.json({ queue, rows, now: new Date() })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
@@ -2,14 +2,22 @@ import { Request, Response } from "../types";
 import { prismaClient } from "../services/database";
 import { isAdmin, isOrganisationManager } from "../utils/permissionCheckers";
 import { logEvent } from "../utils/databaseLogging";
+import { pageArgs, pageQueryValidator, toPage } from "../utils/pagination";
+import { exportFormats, streamTickets } from "../utils/ticketExport";
+
+const listQueryValidator = pageQueryValidator(['name', 'UUID'])
 
 
 // Get
 export const getAll = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403)
 
+    const parsedQuery = listQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+
     try {
-        const organisations = await prismaClient.organisation.findMany({
+        const rows = await prismaClient.organisation.findMany({
+            ...pageArgs(parsedQuery.data),
             select: {
                 UUID: true,
                 name: true,
@@ -25,9 +33,11 @@ export const getAll = async (req: Request, res: Response) => {
             }
         });
 
-        return res.json({ organisations })
+        const { rows: organisations, nextCursor } = toPage(rows, parsedQuery.data)
+        return res.json({ organisations, nextCursor })
     } catch (e) {
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -169,6 +179,28 @@ export const getTickets = async (req: Request, res: Response) => {
 }
 
 
+// Get
+// ?format=ndjson|csv, streamed a chunk of tickets at a time
+export const exportTickets = async (req: Request, res: Response) => {
+    const { UUID } = req.params
+    const { format = 'ndjson' } = req.query
+    if (!isOrganisationManager(req.user, UUID)) return res.sendStatus(403)
+    if (typeof UUID !== "string" || !exportFormats.includes(format as any)) return res.sendStatus(400)
+
+    try {
+        const organisation = await prismaClient.organisation.findUniqueOrThrow({
+            where: { UUID: UUID as string },
+            select: { UUID: true }
+        });
+
+        return await streamTickets(res, { ownerAffiliationId: organisation.UUID }, format as typeof exportFormats[number], `tickets-${organisation.UUID}`)
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(404)
+    }
+}
+
+
 // Post
 export const create = async (req: Request, res: Response) => {
     const { name } = req.body
@@ -3,14 +3,29 @@ import { Prisma } from "@prisma/client";
 import { prismaClient } from "../services/database";
 import { isAdmin, isOrganisationManager } from "../utils/permissionCheckers";
 import { logEvent } from "../utils/databaseLogging";
+import { filterValidators, pageArgs, pageQueryValidator, toPage } from "../utils/pagination";
+
+const listQueryValidator = pageQueryValidator(['UUID', 'usageLeft', 'quotaTypeId', 'ticketId']).extend({
+    organisationId: filterValidators.UUID,
+    invitationId: filterValidators.UUID,
+    quotaTypeId: filterValidators.UUID
+})
 
 
 // Get
 export const getAll = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403)
 
+    const parsedQuery = listQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { organisationId, invitationId, quotaTypeId, ...page } = parsedQuery.data
+
     try {
-        const quotas = await prismaClient.quota.findMany({
+        const rows = await prismaClient.quota.findMany({
+            where: {
+                quotaTypeId,
+                ticket: (organisationId || invitationId) ? { ownerAffiliationId: organisationId, invitationId } : undefined
+            },
             select: {
                 UUID: true,
                 quotaTypeId: true,
@@ -21,12 +36,15 @@ export const getAll = async (req: Request, res: Response) => {
                     select: { ownerName: true }
                 },
                 usageLeft: true
-            }
+            },
+            ...pageArgs(page)
         });
 
-        return res.json({ quotas })
+        const { rows: quotas, nextCursor } = toPage(rows, page)
+        return res.json({ quotas, nextCursor })
     } catch (e) {
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -103,6 +121,7 @@ export const consume = async (req: Request, res: Response) => {
         if (!isOrganisationManager(req.user, ticket.ownerAffiliationId)) return res.sendStatus(403)
         if (!usageLeft) return res.sendStatus(403)
 
+        // A concurrent consume may have taken the last usage since the check above
         const consumedQuota = await prismaClient.quota.update({
             where: {
                 UUID: UUID,
@@ -113,12 +132,20 @@ export const consume = async (req: Request, res: Response) => {
                     decrement: 1
                 }
             }
+        }).catch((e) => {
+            if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') return null
+            throw e
         })
+        if (!consumedQuota) return res.sendStatus(403)
 
         await logEvent({ event: "CONSUME", summary: `Consume Quota`, description: `Consumed quota with ticketId=${consumedQuota.ticketId} and quotaTypeId=${consumedQuota.quotaTypeId} [UUID=${consumedQuota.UUID}]` })
         return res.json({ quota: consumedQuota })
     } catch (e) {
+        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
+            return res.sendStatus(404)
+        }
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -82,6 +82,33 @@ export const create = async (req: Request, res: Response) => {
 }
 
 
+// Post
+export const createMany = async (req: Request, res: Response) => {
+    const { quotaTypes = [] }: { quotaTypes: { name: string, description?: string }[] } = req.body
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    if (!Array.isArray(quotaTypes)) return res.sendStatus(400)
+
+    let permitted = true
+    quotaTypes.forEach(({ name, description = "" }) => {
+        permitted &&= (!!name && typeof name === 'string' && typeof description === 'string')
+    })
+    if (!permitted) return res.sendStatus(400)
+
+    try {
+        const createdQuotaTypes = await prismaClient.$transaction(
+            quotaTypes.map(({ name, description = "" }) => (
+                prismaClient.quotaType.create({ data: { name, description } })))
+        )
+
+        await logEvent({ event: "CREATE", summary: `Create Many QuotaType`, description: `Created ${createdQuotaTypes.length} quotaTypes [UUIDs=${createdQuotaTypes.map((quotaType) => quotaType.UUID)}]` })
+        return res.json({ quotaTypes: createdQuotaTypes })
+    } catch (e) {
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
+
+
 // Patch
 export const update = async (req: Request, res: Response) => {
     const { UUID, name, description } = req.body
@@ -123,3 +150,25 @@ export const deleteOne = async (req: Request, res: Response) => {
         console.log(e)
     }
 }
+
+
+// Delete
+export const deleteMany = async (req: Request, res: Response) => {
+    const { UUIDs = [] }: { UUIDs: string[] } = req.body;
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+
+    let permitted = Array.isArray(UUIDs)
+    if (permitted) UUIDs.forEach(UUID => { permitted &&= (typeof UUID === "string") });
+    if (!permitted) return res.sendStatus(400)
+
+    try {
+        const deletedQuotaTypes = await prismaClient.quotaType.deleteMany({
+            where: { UUID: { in: UUIDs } }
+        })
+
+        await logEvent({ event: "DELETE", summary: `Delete QuotaTypes`, description: `Deleted ${deletedQuotaTypes.count} quotaTypes [UUIDs=${UUIDs}]` })
+        return res.sendStatus(201)
+    } catch (e) {
+        console.log(e)
+    }
+}
@@ -1,34 +1,96 @@
-import { env } from "process";
 import { Request, Response } from '../types'
-import { prismaClient } from "../services/database";
+import { z } from 'zod';
 import { Prisma } from '@prisma/client';
-import QRCode, { QRCodeToBufferOptions } from 'qrcode';
+import { prismaClient } from "../services/database";
+import { isAdmin, isOrganisationManager } from '../utils/permissionCheckers';
+import { MAX_SHEET_TICKETS, streamBadgeSheet } from '../utils/badgeSheet';
+import { getQRImage, qrCache, QRKind, qrFormats } from '../utils/qrImages';
+import { cpuPool, PoolBusyError } from '../utils/workerPool';
+
+const renderQueryValidator = z.object({
+    UUID: z.string().uuid(),
+    format: z.enum(['png', 'svg']).default('png')
+})
 
-const { PUBLIC_FRONTEND_BASE_INVITATION_URL, PUBLIC_FRONTEND_BASE_TICKET_URL } = env
+const sheetValidator = z.object({
+    invitationId: z.string().uuid().optional(),
+    organisationId: z.string().uuid().optional(),
+    UUIDs: z.array(z.string().uuid()).min(1).max(MAX_SHEET_TICKETS).optional()
+}).refine(({ invitationId, organisationId, UUIDs }) => [invitationId, organisationId, UUIDs].filter(Boolean).length === 1, {
+    message: 'Give exactly one of invitationId, organisationId or UUIDs', path: ['invitationId']
+})
 
-const QRCodeOptions = { errorCorrectionLevel: 'Q', scale:8, margin:2 }
 
+// The image of a UUID never changes, clients may keep it for a year without asking again
+const sendQRImage = async (kind: QRKind, req: Request, res: Response) => {
+    const parsed = renderQueryValidator.safeParse({ ...req.query, UUID: req.params.UUID })
+    if (!parsed.success) return res.sendStatus(400)
+    const { UUID, format } = parsed.data
 
-export const getInvitation = async (req: Request, res: Response) => {
-    const { UUID } = req.params
-    if (typeof UUID !== "string") return res.sendStatus(400)
     try {
-        const buffer = await QRCode.toBuffer(`${PUBLIC_FRONTEND_BASE_INVITATION_URL}/${UUID}`, QRCodeOptions as QRCodeToBufferOptions) // only png
-        res.contentType('image/png')
-        return res.send(buffer)
+        const { body, etag, known } = await getQRImage(kind, UUID, format)
+        res.set('ETag', etag)
+        // Only the images of existing UUIDs are cached for good, see utils/qrImages
+        res.set('Cache-Control', known ? 'public, max-age=31536000, immutable' : 'no-cache')
+        if (req.fresh) return res.status(304).end()
+        res.contentType(qrFormats[format])
+        return res.send(body)
     } catch (e) {
+        if (e instanceof PoolBusyError) {
+            res.set('Retry-After', '1')
+            return res.sendStatus(503)
+        }
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
-export const getTicket = async (req: Request, res: Response) => {
-    const { UUID } = req.params
-    if (typeof UUID !== "string") return res.sendStatus(400)
+
+// Get
+export const getInvitation = (req: Request, res: Response) => sendQRImage('invitation', req, res)
+
+// Get
+export const getTicket = (req: Request, res: Response) => sendQRImage('ticket', req, res)
+
+
+// Get, Post
+// A PDF of badges to print, for the tickets of an invitation or an organisation (query) or of a list of UUIDs (body)
+export const getBadgeSheet = async (req: Request, res: Response) => {
+    const parsed = sheetValidator.safeParse(req.method === 'GET' ? req.query : req.body)
+    if (!parsed.success) return res.status(400).json({ errors: parsed.error.flatten().fieldErrors })
+    const { invitationId, organisationId, UUIDs } = parsed.data
+
     try {
-        const buffer = await QRCode.toBuffer(`${PUBLIC_FRONTEND_BASE_TICKET_URL}/${UUID}`, QRCodeOptions as QRCodeToBufferOptions) // only png
-        res.contentType('image/png')
-        return res.send(buffer)
+        if (invitationId) {
+            const invitation = await prismaClient.invitation.findUniqueOrThrow({ where: { UUID: invitationId }, select: { organisationId: true } })
+            if (!isOrganisationManager(req.user, invitation.organisationId)) return res.sendStatus(403)
+            return await streamBadgeSheet(res, { invitationId }, `badges-${invitationId}`)
+        }
+        if (organisationId) {
+            if (!isOrganisationManager(req.user, organisationId)) return res.sendStatus(403)
+            await prismaClient.organisation.findUniqueOrThrow({ where: { UUID: organisationId }, select: { UUID: true } })
+            return await streamBadgeSheet(res, { ownerAffiliationId: organisationId }, `badges-${organisationId}`)
+        }
+
+        // Organisation managers only get the tickets of their organisation
+        if (!req.user || !isOrganisationManager(req.user, req.user.organisationId)) return res.sendStatus(403)
+        const ownerAffiliationId = isAdmin(req.user) ? undefined : req.user.organisationId
+        return await streamBadgeSheet(res, { UUID: { in: UUIDs }, ownerAffiliationId }, 'badges')
     } catch (e) {
+        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
+            return res.sendStatus(404)
+        }
         console.log(e)
+        return res.sendStatus(500)
     }
 }
+
+// Get
+// The state of the worker pool rendering the images (and emails), waitTime and runTime are totals in ms
+export const getStats = async (req: Request, res: Response) => {
+    if (!isAdmin(req.user)) return res.sendStatus(403)
+    return res.json({
+        pool: { size: cpuPool.size, busy: cpuPool.busy, queueDepth: cpuPool.queueDepth, queueLimit: cpuPool.queueLimit, ...cpuPool.stats },
+        cache: { size: qrCache.size, maxEntries: qrCache.maxEntries, ...qrCache.stats }
+    })
+}
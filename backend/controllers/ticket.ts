@@ -3,6 +3,10 @@ import { Prisma } from "@prisma/client";
 import { prismaClient } from "../services/database";
 import { isAdmin, isOrganisationManager } from "../utils/permissionCheckers";
 import { logEvent } from "../utils/databaseLogging";
+import { prerenderQRImages, qrDiskCache } from "../utils/qrImages";
+import { filterValidators, pageArgs, pageQueryValidator, toPage } from "../utils/pagination";
+import { ImportRow, batches, importFormats, importRows } from "../utils/ticketImport";
+import { randomUUID } from "crypto";
 import { z } from "zod";
 
 const UUIDValidator = z.string().uuid({ message: 'Invalid UUID' })
@@ -13,14 +17,113 @@ const contactsValidator = z.object({
     email: z.string().email({ message: 'Invalid email' }).nullable(),
     phone_number: z.string().regex(/\d{10,15}$/, { message: 'Invalid phone number' }).nullable()
 })
+const listQueryValidator = pageQueryValidator(['createdTime', 'ownerName', 'lastUpdated', 'UUID']).extend({
+    organisationId: filterValidators.UUID,
+    invitationId: filterValidators.UUID,
+    quotaTypeId: filterValidators.UUID,
+    sentEmail: filterValidators.sentEmail
+})
+
+type ReservedTicket = Prisma.TicketGetPayload<{ include: { quotas: { include: { quotaType: true } } } }> & { invitationUsageLeft: number }
+
+// Takes one of the invitation's usageLeft and creates the ticket along with its default quotas, in a single statement
+// hence a single round trip. The guarded decrement is the only check of the invitation's quota: it locks the
+// invitation's row, so concurrent reservations queue up on it and none can take the last usage twice, while a failing
+// insert (e.g. a taken ownerName) rolls the decrement back with it. No rows are returned when the invitation does not
+// exist or has no usage left.
+// Written against the tables prisma/schema.prisma generates, keep the two in sync.
+const reserveTicket = (ownerName: string, ownerContacts: z.infer<typeof contactsValidator>, invitationId: string) => prismaClient.$queryRaw<ReservedTicket[]>`
+    WITH reserved AS (
+        UPDATE "Invitation" SET "usageLeft" = "usageLeft" - 1
+        WHERE "UUID" = ${invitationId} AND "usageLeft" > 0
+        RETURNING "UUID", "organisationId", "usageLeft"
+    ), ticket AS (
+        INSERT INTO "Ticket" ("ownerName", "ownerContacts", "ownerAffiliationId", "invitationId", "lastUpdated")
+        SELECT ${ownerName}, ${JSON.stringify(ownerContacts)}::jsonb, "organisationId", "UUID", CURRENT_TIMESTAMP FROM reserved
+        RETURNING *
+    ), quotas AS (
+        INSERT INTO "Quota" ("quotaTypeId", "usageLeft", "ticketId")
+        SELECT "DefaultQuota"."quotaTypeId", "DefaultQuota"."value", ticket."UUID"
+        FROM ticket JOIN "DefaultQuota" ON "DefaultQuota"."invitationId" = ticket."invitationId"
+        RETURNING *
+    )
+    SELECT ticket.*, reserved."usageLeft" AS "invitationUsageLeft", COALESCE((
+        SELECT json_agg(json_build_object(
+            'UUID', quotas."UUID", 'quotaTypeId', quotas."quotaTypeId", 'usageLeft', quotas."usageLeft", 'ticketId', quotas."ticketId",
+            'quotaType', json_build_object('UUID', "QuotaType"."UUID", 'name', "QuotaType"."name", 'description', "QuotaType"."description")
+        ))
+        FROM quotas JOIN "QuotaType" ON "QuotaType"."UUID" = quotas."quotaTypeId"
+    ), '[]') AS quotas
+    FROM ticket, reserved
+`
+
+// Unique constraints violated by a raw query come as the database's own error code
+const isUniqueViolation = (e: unknown) => e instanceof Prisma.PrismaClientKnownRequestError
+    && (e.code === 'P2002' || (e.code === 'P2010' && (e.meta as { code?: string } | undefined)?.code === '23505'))
+
+// Rows validated and inserted at once by importMany
+const IMPORT_BATCH_SIZE = 1000
+const IMPORT_BATCH_ATTEMPTS = 3
+// Row errors listed by importMany at most, the rest are only counted, so an invalid upload is not held in memory
+const MAX_IMPORT_ERRORS = 1000
+
+type ImportError = { row: number, errors: { name?: string, contacts?: string, row?: string } }
+type ImportTicket = { row: number, ownerName: string, ownerContacts: z.infer<typeof contactsValidator> }
+type ImportInvitation = { UUID: string, organisationId: string, defaultQuotas: { quotaTypeId: string, value: number }[] }
+
+// Inserts a batch of tickets along with their default quotas, within a single transaction. Names already taken are
+// left out, then as many of the rest as the invitation's usageLeft allows are reserved, in order, and inserted.
+const importBatch = (invitation: ImportInvitation, tickets: ImportTicket[]) => prismaClient.$transaction(async (tx) => {
+    const takenNames = new Set((await tx.ticket.findMany({
+        where: { ownerName: { in: tickets.map((ticket) => ticket.ownerName) } },
+        select: { ownerName: true }
+    })).map((ticket) => ticket.ownerName))
+    const available = tickets.filter((ticket) => !takenNames.has(ticket.ownerName))
+
+    // The row is locked until the transaction ends, concurrent reservations and ticket creations wait for it
+    const [reservation = { reserved: 0, usageLeft: 0 }] = await tx.$queryRaw<{ reserved: number, usageLeft: number }[]>`
+        WITH current AS (SELECT "usageLeft" FROM "Invitation" WHERE "UUID" = ${invitation.UUID} FOR UPDATE)
+        UPDATE "Invitation" SET "usageLeft" = "Invitation"."usageLeft" - LEAST(current."usageLeft", ${available.length}::int)
+        FROM current WHERE "Invitation"."UUID" = ${invitation.UUID}
+        RETURNING LEAST(current."usageLeft", ${available.length}::int)::int AS "reserved", "Invitation"."usageLeft"
+    `
+    const accepted = available.slice(0, reservation.reserved).map((ticket) => ({ ...ticket, UUID: randomUUID() }))
+
+    await tx.ticket.createMany({
+        data: accepted.map(({ UUID, ownerName, ownerContacts }) => ({
+            UUID, ownerName, ownerContacts, invitationId: invitation.UUID, ownerAffiliationId: invitation.organisationId
+        }))
+    })
+    await tx.quota.createMany({
+        data: accepted.flatMap(({ UUID }) => invitation.defaultQuotas.map(({ quotaTypeId, value }) => ({ ticketId: UUID, quotaTypeId, usageLeft: value })))
+    })
+
+    return {
+        accepted,
+        taken: tickets.filter((ticket) => takenNames.has(ticket.ownerName)),
+        exhausted: available.slice(reservation.reserved),
+        usageLeft: reservation.usageLeft
+    }
+}, { timeout: 30000 })
 
 
 // Get
 export const getAll = async (req: Request, res: Response) => {
     if (!isAdmin(req.user)) return res.sendStatus(403)
 
+    const parsedQuery = listQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { organisationId, invitationId, quotaTypeId, sentEmail, ...page } = parsedQuery.data
+
     try {
-        const tickets = await prismaClient.ticket.findMany({
+        const rows = await prismaClient.ticket.findMany({
+            where: {
+                ownerAffiliationId: organisationId,
+                invitationId,
+                // Tickets with a quota of the type
+                quotas: quotaTypeId ? { some: { quotaTypeId } } : undefined,
+                sentEmail: sentEmail === 'sent' ? { not: "" } : sentEmail === 'unsent' ? "" : undefined
+            },
             include: {
                 ownerAffiliation: {
                     select: { name: true }
@@ -28,12 +131,15 @@ export const getAll = async (req: Request, res: Response) => {
                 invitation: {
                     select: { name: true }
                 }
-            }
+            },
+            ...pageArgs(page)
         });
 
-        return res.json({ tickets })
+        const { rows: tickets, nextCursor } = toPage(rows, page)
+        return res.json({ tickets, nextCursor })
     } catch (e) {
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -88,75 +194,24 @@ export const create = async (req: Request, res: Response) => {
 
 
     try {
-        const invitation = await prismaClient.invitation.findUniqueOrThrow({
-            where: { UUID: invitationId },
-            select: {
-                usageQuota: true,
-                usageLeft: true,
-                organisationId: true,
-                defaultQuotas: {
-                    select: {
-                        quotaTypeId: true,
-                        value: true
-                    }
-                }
-            }
-        })
-
-        const { _count: createdTicketCount } = await prismaClient.ticket.aggregate({
-            where: { invitationId: invitationId },
-            _count: true
-        })
-
-        if (createdTicketCount >= invitation.usageQuota) return res.json(403)
-
-        // if (invitation.usageLeft === 0) return res.json(403)
-
-        const consumeInvitation = prismaClient.invitation.update({
-            where: {
-                UUID: invitationId,
-                usageLeft: { gt: 0 }
-            },
-            data: {
-                usageLeft: { decrement: 1 }
-            }
-        })
-
-        const createTicket = prismaClient.ticket.create({
-            data: {
-                ownerName: ownerName,
-                ownerContacts: ownerContacts,
-                invitationId: invitationId,
-                ownerAffiliationId: invitation.organisationId,
-                quotas: {
-                    createMany: {
-                        data: invitation.defaultQuotas.map((e) => { return { quotaTypeId: e.quotaTypeId, usageLeft: e.value } })
-                    }
-                }
-            },
-            include: {
-                quotas: {
-                    include: {
-                        quotaType: true
-                    }
-                }
-            }
-        })
+        const [reservation] = await reserveTicket(parsedName.data, parsedContacts.data, invitationId)
+        // Either the invitation does not exist, or its usageLeft is used up
+        if (!reservation) return res.sendStatus(403)
 
-        const [consumedInvitation, ticket] = await prismaClient.$transaction([
-            consumeInvitation,
-            createTicket
+        const { invitationUsageLeft, ...ticket } = reservation
+        prerenderQRImages('ticket', [ticket.UUID])
+        await Promise.all([
+            logEvent({ event: "CONSUME", summary: `Consume Invitation`, description: JSON.stringify({ UUID: invitationId, usageLeft: invitationUsageLeft }) }),
+            logEvent({ event: "CREATE", summary: `Create Ticket`, description: JSON.stringify(ticket) })
         ])
-
-        await logEvent({ event: "CONSUME", summary: `Consume Invitation`, description: JSON.stringify(consumedInvitation) })
-        await logEvent({ event: "CREATE", summary: `Create Ticket`, description: JSON.stringify(ticket) })
         return res.json({ ticket })
     } catch (e) {
-        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2002') {
+        if (isUniqueViolation(e)) {
             errors['name'] = "Please enter your full name."
             return res.status(400).json({errors})
         }
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -230,3 +285,98 @@ export const deleteOne = async (req: Request, res: Response) => {
         console.log(e)
     }
 }
+
+
+// Post
+// Imports tickets to an invitation from a csv (text/csv, with ownerName, email and phone_number columns) or newline
+// delimited json (application/x-ndjson, a /ticket/create body per line) upload. The body is parsed as it is received
+// and inserted IMPORT_BATCH_SIZE rows at a time, rows which can not be imported are reported with their row number.
+export const importMany = async (req: Request, res: Response) => {
+    const { invitationId } = req.params
+    const format = importFormats[(req.get('Content-Type') ?? '').split(';')[0].trim() as keyof typeof importFormats]
+    if (typeof invitationId !== "string") return res.sendStatus(400)
+    if (!format) return res.sendStatus(415)
+
+    try {
+        const invitation = await prismaClient.invitation.findUniqueOrThrow({
+            where: { UUID: invitationId },
+            select: {
+                UUID: true,
+                organisationId: true,
+                defaultQuotas: { select: { quotaTypeId: true, value: true } }
+            }
+        })
+        if (!isOrganisationManager(req.user, invitation.organisationId)) return res.sendStatus(403)
+
+        const errors: ImportError[] = []
+        let failed = 0
+        let created = 0
+        let usageLeft: number | undefined = undefined
+
+        const addError = (error: ImportError) => {
+            failed++
+            if (errors.length < MAX_IMPORT_ERRORS) errors.push(error)
+        }
+
+        // Names are only compared within a batch, a name of an earlier batch is taken by then (see importBatch)
+        const validate = (row: ImportRow, seenNames: Set<string>): ImportTicket | undefined => {
+            if (row.error) {
+                addError({ row: row.row, errors: { row: row.error } })
+                return
+            }
+            const parsedName = nameValidator.safeParse(row.ownerName)
+            const parsedContacts = contactsValidator.safeParse(row.ownerContacts)
+            if (!parsedName.success || !parsedContacts.success) {
+                addError({ row: row.row, errors: {
+                    name: parsedName.success ? undefined : parsedName.error.message,
+                    contacts: parsedContacts.success ? undefined : parsedContacts.error.message
+                } })
+                return
+            }
+            if (seenNames.has(parsedName.data)) {
+                addError({ row: row.row, errors: { name: "Duplicate name within the import" } })
+                return
+            }
+            seenNames.add(parsedName.data)
+            return { row: row.row, ownerName: parsedName.data, ownerContacts: parsedContacts.data }
+        }
+
+        for await (const batch of batches(importRows(req, format), IMPORT_BATCH_SIZE)) {
+            const seenNames = new Set<string>()
+            const tickets = batch.map((row) => validate(row, seenNames)).filter((ticket): ticket is ImportTicket => !!ticket)
+            if (!tickets.length) continue
+
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    const result = await importBatch(invitation, tickets)
+                    result.taken.forEach(({ row }) => addError({ row, errors: { name: "Name is already taken" } }))
+                    result.exhausted.forEach(({ row }) => addError({ row, errors: { row: "Invitation has no usage left" } }))
+                    created += result.accepted.length
+                    usageLeft = result.usageLeft
+
+                    if (result.accepted.length) {
+                        // Without a disk cache, a large import would only render images that get evicted before being requested
+                        if (qrDiskCache) prerenderQRImages('ticket', result.accepted.map((ticket) => ticket.UUID))
+                        await logEvent({ event: "CONSUME", summary: `Consume Invitation`, description: JSON.stringify({ UUID: invitationId, usageLeft }) })
+                        await logEvent({ event: "CREATE", summary: `Import Tickets`, description: `Imported ${result.accepted.length} tickets to invitation [UUID=${invitationId}] [UUIDs=${result.accepted.map((ticket) => ticket.UUID)}]` })
+                    }
+                    break
+                } catch (e) {
+                    // A name taken by a concurrent /ticket/create between the check and the insert, checked again
+                    if (isUniqueViolation(e) && attempt < IMPORT_BATCH_ATTEMPTS) continue
+                    throw e
+                }
+            }
+        }
+
+        errors.sort((a, b) => a.row - b.row)
+        // Errors past MAX_IMPORT_ERRORS are counted in failed, errorsOmitted tells how many are not listed
+        return res.json({ created, failed, usageLeft, errors, errorsOmitted: failed - errors.length })
+    } catch (e) {
+        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
+            return res.sendStatus(404)
+        }
+        console.log(e)
+        return res.sendStatus(500)
+    }
+}
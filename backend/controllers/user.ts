@@ -6,9 +6,15 @@ import { prismaClient, userRole } from "../services/database";
 import { logEvent } from "../utils/databaseLogging";
 import { isAdmin } from "../utils/permissionCheckers";
 import { Prisma } from "@prisma/client";
+import { filterValidators, pageArgs, pageQueryValidator, toPage } from "../utils/pagination";
 
 const { REFRESH_TOKEN_SECRET, ACCESS_TOKEN_SECRET, REFRESH_TOKEN_LIFETIME, ACCESS_TOKEN_LIFETIME, ACCESS_TOKEN_LIFETIME_AFTER_LOGIN } = env;
 
+const listQueryValidator = pageQueryValidator(['username', 'role', 'UUID']).extend({
+    organisationId: filterValidators.UUID,
+    role: filterValidators.role
+})
+
 
 // Get
 // can be accessed by everyone
@@ -20,26 +26,36 @@ export const getRoles = async (req: Request, res: Response) => {
 export const getAll = async (req: Request, res: Response) => {
     if (!req.user || req.user.role < userRole.ADMIN) return res.sendStatus(403)
 
+    const parsedQuery = listQueryValidator.safeParse(req.query)
+    if (!parsedQuery.success) return res.status(400).json({ errors: parsedQuery.error.flatten().fieldErrors })
+    const { organisationId, role: roleFilter, ...page } = parsedQuery.data
+
     try {
         const { role } = await prismaClient.user.findUniqueOrThrow({
             where: { UUID: req.user.UUID },
             select: { role: true }
         })
 
-        const users = await prismaClient.user.findMany({
-            where: { role: { lt: role } },
+        const rows = await prismaClient.user.findMany({
+            where: {
+                AND: [{ role: { lt: role } }, { role: roleFilter }],
+                organisationId
+            },
             select: {
                 UUID: true,
                 username: true,
                 role: true,
                 organisationManaged: true,
                 organisationId: true
-            }
+            },
+            ...pageArgs(page)
         });
 
-        return res.json({ users })
+        const { rows: users, nextCursor } = toPage(rows, page)
+        return res.json({ users, nextCursor })
     } catch (e) {
         console.log(e)
+        return res.sendStatus(500)
     }
 }
 
@@ -86,6 +102,9 @@ export const getSelf = async (req: Request, res: Response) => {
         });
         return res.json({ user })
     } catch (e) {
+        if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2025') {
+            return res.sendStatus(404)
+        }
         console.log(e)
     }
 }
@@ -1,9 +1,40 @@
 import { env } from "process";
 import app from "./app";
+import { flushLogs } from "./utils/databaseLogging";
+import { scheduleLogRetention } from "./utils/logRetention";
+import { scheduleMailJobs, stopMailJobs } from "./utils/mailJob";
 
 let { BACKEND_PORT } = env;
 BACKEND_PORT = BACKEND_PORT !== undefined ? BACKEND_PORT : "8080";
 
-app.listen(parseInt(BACKEND_PORT), async () => {
+const server = app.listen(parseInt(BACKEND_PORT), async () => {
     console.log(`Backend listening on localhost:${BACKEND_PORT}`)
 })
+
+scheduleLogRetention()
+scheduleMailJobs()
+
+// Stops taking requests and resolves once those being handled are answered, or after timeout ms
+const closeServer = (timeout: number = 10000) => new Promise<void>((resolve) => {
+    const timer = setTimeout(resolve, timeout)
+    server.close(() => {
+        clearTimeout(timer)
+        resolve()
+    })
+    // Idle keep-alive connections would otherwise hold close() until they time out
+    server.closeIdleConnections()
+})
+
+// Stops taking requests and waits for those being handled, lets the mail jobs write their batches in flight, then
+// writes the queued audit log events, including those of the last requests, before exiting
+const shutdown = async (signal: string) => {
+    console.log(`${signal} received, shutting down`)
+    await closeServer()
+    await stopMailJobs()
+    const left = await flushLogs()
+    if (left) console.log(`${left} audit log events could not be written`)
+    process.exit(0)
+}
+
+process.once('SIGTERM', shutdown)
+process.once('SIGINT', shutdown)
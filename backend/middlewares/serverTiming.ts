@@ -0,0 +1,31 @@
+import { performance } from 'perf_hooks';
+import { Request, Response, NextFunction } from '../types';
+import { timingStorage, formatTimings } from '../utils/serverTiming';
+
+
+// Collects the timings of the request (see utils/serverTiming) and sends them in the Server-Timing header,
+// along with the time spent serializing the response body and the total time until the headers were sent.
+function serverTiming(req: Request, res: Response, next: NextFunction) {
+    const entries: Parameters<typeof formatTimings>[0] = []
+    const start = performance.now()
+
+    res.json = (body?: any) => {
+        const serializeStart = performance.now()
+        const payload = JSON.stringify(body)
+        entries.push({ name: 'serialize', duration: performance.now() - serializeStart })
+
+        if (!res.get('Content-Type')) res.set('Content-Type', 'application/json')
+        return res.send(payload)
+    }
+
+    const writeHead = res.writeHead
+    res.writeHead = function (this: Response, ...args: any[]) {
+        entries.push({ name: 'total', duration: performance.now() - start })
+        this.setHeader('Server-Timing', formatTimings(entries))
+        return writeHead.apply(this, args as Parameters<typeof writeHead>)
+    } as typeof res.writeHead
+
+    timingStorage.run(entries, next)
+};
+
+export default serverTiming;
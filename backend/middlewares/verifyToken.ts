@@ -1,7 +1,9 @@
 import { env } from 'process';
 import { Response, NextFunction } from 'express';
 import jwt from 'jsonwebtoken';
+import { performance } from 'perf_hooks';
 import { Request, User } from '../types';
+import { addTiming } from '../utils/serverTiming';
 
 const { ACCESS_TOKEN_SECRET } = env;
 
@@ -12,7 +14,9 @@ function verifyToken(req: Request, res: Response, next: NextFunction) {
 
     const token = tokenHeader.split(' ')[1]
 
+    const start = performance.now()
     jwt.verify(token, ACCESS_TOKEN_SECRET as string, (err, decoded) => {
+        addTiming('auth', performance.now() - start)
         if (err) return res.status(403).json({ message: "E101: Please login again." })
         req.user = (decoded as User)
         req.user.recentlyLoggedIn ||= false;
@@ -1,6 +1,6 @@
 import { Router } from "express";
 import verifyToken from "../middlewares/verifyToken";
-import { auth, sendInvitation, sendTicket, sendTickets } from "../controllers/email";
+import { auth, cancelJob, createJob, getJob, getJobs, sendInvitation, sendTicket, sendTickets } from "../controllers/email";
 
 
 const emailRouter = Router({ mergeParams: true })
@@ -10,5 +10,10 @@ emailRouter.post('/sendInvitation', verifyToken, sendInvitation)
 emailRouter.post('/sendTickets', verifyToken, sendTickets)
 emailRouter.post('/sendTicket', verifyToken, sendTicket)
 
+emailRouter.get('/jobs', verifyToken, getJobs)
+emailRouter.post('/jobs', verifyToken, createJob)
+emailRouter.get('/jobs/:UUID', verifyToken, getJob)
+emailRouter.post('/jobs/:UUID/cancel', verifyToken, cancelJob)
+
 
 export default emailRouter
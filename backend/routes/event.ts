@@ -1,5 +1,5 @@
 import { Router } from "express";
-import { getInfo, getDetails, update, getAsAdmin } from "../controllers/event";
+import { getInfo, getDetails, update, getAsAdmin, getCacheStats } from "../controllers/event";
 import verifyToken from "../middlewares/verifyToken";
 
 const eventRouter = Router({})
@@ -8,5 +8,6 @@ eventRouter.get('/', getInfo)
 eventRouter.get('/details', getDetails)
 eventRouter.get('/get', verifyToken, getAsAdmin)
 eventRouter.patch('/update', verifyToken, update)
+eventRouter.get('/cache', verifyToken, getCacheStats)
 
 export default eventRouter
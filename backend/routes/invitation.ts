@@ -1,6 +1,6 @@
 import { Router } from "express";
 import verifyToken from "../middlewares/verifyToken";
-import { create, getAll, getOne, getOnePublic, getTickets, getDefaultQuotas, update, deleteOne } from "../controllers/invitation";
+import { create, createMany, getAll, getOne, getOnePublic, getTickets, exportTickets, getDefaultQuotas, update, deleteOne, deleteMany } from "../controllers/invitation";
 
 
 const invitationRouter = Router({ mergeParams: true })
@@ -9,10 +9,13 @@ invitationRouter.get('/', verifyToken, getAll)
 invitationRouter.get('/public/:UUID', getOnePublic)
 invitationRouter.get('/info/:UUID', verifyToken, getOne)
 invitationRouter.get('/info/:UUID/tickets', verifyToken, getTickets)
+invitationRouter.get('/info/:UUID/tickets/export', verifyToken, exportTickets)
 invitationRouter.get('/info/:UUID/defaultQuotas', verifyToken, getDefaultQuotas)
 invitationRouter.post('/create', verifyToken, create)
+invitationRouter.post('/createMany', verifyToken, createMany)
 invitationRouter.patch('/update', verifyToken, update)
 invitationRouter.delete('/delete', verifyToken, deleteOne)
+invitationRouter.delete('/deleteMany', verifyToken, deleteMany)
 
 
 export default invitationRouter
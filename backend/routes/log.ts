@@ -0,0 +1,12 @@
+import { Router } from "express";
+import { getAll, getRollup, getStats, prune } from "../controllers/log";
+import verifyToken from "../middlewares/verifyToken";
+
+const logRouter = Router({})
+
+logRouter.get('/', verifyToken, getAll)
+logRouter.get('/rollup', verifyToken, getRollup)
+logRouter.get('/stats', verifyToken, getStats)
+logRouter.post('/prune', verifyToken, prune)
+
+export default logRouter
@@ -1,6 +1,6 @@
 import { Router } from "express";
 import verifyToken from "../middlewares/verifyToken";
-import { create, createMany, deleteOne, getAll, getOne, getInvitations, getManagers, getTickets, update, deleteMany } from "../controllers/organisation";
+import { create, createMany, deleteOne, getAll, getOne, getInvitations, getManagers, getTickets, exportTickets, update, deleteMany } from "../controllers/organisation";
 
 
 const organisationRouter = Router({ mergeParams: true })
@@ -10,6 +10,7 @@ organisationRouter.get('/info/:UUID', verifyToken, getOne)
 organisationRouter.get('/info/:UUID/managers', verifyToken, getManagers)
 organisationRouter.get('/info/:UUID/invitations', verifyToken, getInvitations)
 organisationRouter.get('/info/:UUID/tickets', verifyToken, getTickets)
+organisationRouter.get('/info/:UUID/tickets/export', verifyToken, exportTickets)
 organisationRouter.post('/create', verifyToken, create)
 organisationRouter.post('/createMany', verifyToken, createMany)
 organisationRouter.patch('/update', verifyToken, update)
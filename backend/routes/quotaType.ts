@@ -1,6 +1,6 @@
 import { Router } from "express";
 import verifyToken from "../middlewares/verifyToken";
-import { create, getAll, getOne, update, deleteOne } from "../controllers/quotaType";
+import { create, createMany, getAll, getOne, update, deleteOne, deleteMany } from "../controllers/quotaType";
 
 
 const quotaTypeRouter = Router({ mergeParams: true })
@@ -8,8 +8,10 @@ const quotaTypeRouter = Router({ mergeParams: true })
 quotaTypeRouter.get('/', verifyToken, getAll)
 quotaTypeRouter.get('/info/:UUID', verifyToken, getOne)
 quotaTypeRouter.post('/create', verifyToken, create)
+quotaTypeRouter.post('/createMany', verifyToken, createMany)
 quotaTypeRouter.patch('/update', verifyToken, update)
 quotaTypeRouter.delete('/delete', verifyToken, deleteOne)
+quotaTypeRouter.delete('/deleteMany', verifyToken, deleteMany)
 
 
 export default quotaTypeRouter
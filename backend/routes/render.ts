@@ -1,10 +1,14 @@
 import { Router } from "express";
-import { getInvitation, getTicket } from "../controllers/render";
+import { getInvitation, getTicket, getBadgeSheet, getStats } from "../controllers/render";
+import verifyToken from "../middlewares/verifyToken";
 
 
 const renderRouter = Router({ mergeParams: true })
 
 renderRouter.get('/invitation/:UUID', getInvitation)
 renderRouter.get('/ticket/:UUID', getTicket)
+renderRouter.get('/sheet', verifyToken, getBadgeSheet)
+renderRouter.post('/sheet', verifyToken, getBadgeSheet)
+renderRouter.get('/stats', verifyToken, getStats)
 
 export default renderRouter
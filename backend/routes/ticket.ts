@@ -1,6 +1,6 @@
 import { Router } from "express";
 import verifyToken from "../middlewares/verifyToken";
-import { create, getAll, getOne, update, deleteOne } from "../controllers/ticket";
+import { create, importMany, getAll, getOne, update, deleteOne } from "../controllers/ticket";
 
 
 const ticketRouter = Router({ mergeParams: true })
@@ -9,6 +9,7 @@ ticketRouter.get('/', verifyToken, getAll)
 ticketRouter.get('/public/:UUID', getOne)
 ticketRouter.get('/info/:UUID', getOne)
 ticketRouter.post('/create', create)
+ticketRouter.post('/import/:invitationId', verifyToken, importMany)
 ticketRouter.patch('/update', update)
 ticketRouter.delete('/delete', verifyToken, deleteOne)
 
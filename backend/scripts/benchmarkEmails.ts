@@ -0,0 +1,59 @@
+import { performance } from "perf_hooks";
+import { render } from "@react-email/components";
+import { TicketEmail } from "../emails/ticket-email";
+import { EmailTemplate } from "../workers/emailTemplate";
+
+// Compares the time to render ticket emails with React, as each email used to be, and by filling in a template of the
+// shared shell, as workers/cpuTasks now does. A fresh template is compiled per round, the way a new batch on a cold
+// thread would.
+//
+//   yarn ts-node scripts/benchmarkEmails.ts [emails per round = 1000] [rounds = 5]
+
+const count = parseInt(process.argv[2] || '1000')
+const rounds = parseInt(process.argv[3] || '5')
+
+const shell = {
+    event: { name: "Invetixia", locationName: "a Zoom meeting", startTime: new Date("2024-05-15T00:00:00.000+00:00") },
+    bgUrl: "http://localhost:5173/bg.jpg",
+    logoUrl: "http://localhost:5173/favicon.png",
+    timezone: "GMT"
+}
+
+// Names with characters React escapes, so the comparison also checks the escaping matches
+const recipients = Array.from({ length: count }, (_, idx) => ({
+    ownerName: idx % 10 ? `Owner ${idx}` : `O'Brien & <Sons> "${idx}"`,
+    ticketLink: `http://localhost:5173/ticket/${idx}`,
+    qrImgUrl: `http://localhost:8080/render/ticket/${idx}`
+}))
+
+const time = (fn: () => string[]) => {
+    const start = performance.now()
+    const html = fn()
+    return { html, elapsed: performance.now() - start }
+}
+
+const fields = ['ownerName', 'ticketLink', 'qrImgUrl'] as const
+const paths = {
+    react: () => recipients.map((recipient) => render(TicketEmail({ ...shell, ...recipient }))),
+    template: () => {
+        const template = new EmailTemplate((placeholders) => render(TicketEmail({ ...shell, ...placeholders })), fields)
+        return recipients.map((recipient) => template.fill(recipient))
+    }
+}
+
+const totals = { react: 0, template: 0 }
+for (let round = 0; round <= rounds; round++) {
+    const react = time(paths.react)
+    const template = time(paths.template)
+    const mismatch = react.html.findIndex((html, idx) => html !== template.html[idx])
+    if (mismatch >= 0) throw new Error(`The template rendered the email of ${JSON.stringify(recipients[mismatch])} differently`)
+    // The first round only warms up
+    if (round === 0) continue
+    totals.react += react.elapsed
+    totals.template += template.elapsed
+}
+
+const per1000 = (total: number) => total / rounds / count * 1000
+console.log(`${count} ticket emails, ${rounds} rounds, identical output`)
+console.log(`react-email: ${per1000(totals.react).toFixed(1)}ms per 1000 emails`)
+console.log(`template:    ${per1000(totals.template).toFixed(1)}ms per 1000 emails (${(totals.react / totals.template).toFixed(1)}x)`)
@@ -1,7 +1,8 @@
 import { env } from "process";
 import { PrismaClient } from "@prisma/client";
+import { measure } from "../utils/serverTiming";
 
-const { ENABLE_QUERY_LOGGING } = env;
+const { ENABLE_QUERY_LOGGING, ENABLE_SERVER_TIMING } = env;
 
 export enum userRole {
     SUPER_ADMIN = 0b1000,
@@ -33,4 +34,15 @@ function createPrismaClient() {
     }
 }
 
-export const prismaClient = createPrismaClient()
+// Times every query within the request it belongs to, reported in the Server-Timing header
+function withServerTiming(prismaClient: PrismaClient) {
+    return prismaClient.$extends({
+        query: {
+            async $allOperations({ model, operation, args, query }) {
+                return measure('db', () => query(args), model ? `${model}.${operation}` : operation)
+            }
+        }
+    }) as unknown as PrismaClient
+}
+
+export const prismaClient = parseInt(ENABLE_SERVER_TIMING as string) ? withServerTiming(createPrismaClient()) : createPrismaClient()
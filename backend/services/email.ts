@@ -0,0 +1,97 @@
+import { env } from "process";
+import { Resend } from "resend";
+import { prismaClient } from "./database";
+import { getConfig } from "../utils/eventConfig";
+import { cpuPool } from "../utils/workerPool";
+
+const {
+    PUBLIC_FRONTEND_BASE_TICKET_URL,
+    PUBLIC_FRONTEND_BACKGROUND_URL,
+    PUBLIC_FRONTEND_LOGO_URL,
+    BACKEND_BASE_RENDER_URL,
+    EVENT_TIMEZONE,
+    RESEND_API_KEY,
+    RESEND_DOMAIN = ""
+} = env;
+
+const senderName = "no-reply";
+
+// Set through /email/auth, or from RESEND_API_KEY and RESEND_DOMAIN so that mail jobs resume unattended after a restart
+let resendClient: Resend | undefined = RESEND_API_KEY ? new Resend(RESEND_API_KEY) : undefined;
+let senderDomain = RESEND_DOMAIN;
+const authListeners: (() => void)[] = []
+
+export const getResend = () => resendClient
+
+export const getSender = () => `${senderName}@${senderDomain}`
+
+export const setResend = (client: Resend, domain: string) => {
+    resendClient = client
+    senderDomain = domain
+    authListeners.forEach((listener) => listener())
+}
+
+// listener is called on every (re)authentication of the Resend client
+export const onResendAuth = (listener: () => void) => {
+    authListeners.push(listener)
+}
+
+
+export type TicketEmailEvent = { name: string, locationName: string, startTime: Date }
+export type EmailTicket = { UUID: string, ownerName: string, ownerContacts: unknown }
+
+// The parts of the event config shown in ticket emails
+export const getTicketEmailEvent = async (): Promise<TicketEmailEvent> => {
+    const [event_info, event_details] = await Promise.all([getConfig('event_info'), getConfig('event_details')])
+    return {
+        name: (event_info as { name?: string })?.name || "",
+        locationName: (event_details as { locationName?: string })?.locationName || "",
+        startTime: (event_details as { startTime?: Date })?.startTime || new Date()
+    }
+}
+
+export const ticketEmailAddress = (ticket: EmailTicket) => (ticket.ownerContacts as { email?: string } | null)?.email
+
+// The parts of a ticket email shared by every ticket of the event
+const ticketEmailShell = (event: TicketEmailEvent) => ({
+    event,
+    bgUrl: PUBLIC_FRONTEND_BACKGROUND_URL,
+    logoUrl: PUBLIC_FRONTEND_LOGO_URL,
+    timezone: EVENT_TIMEZONE
+})
+
+const ticketEmailRecipient = ({ UUID, ownerName }: EmailTicket) => ({
+    ownerName,
+    ticketLink: `${PUBLIC_FRONTEND_BASE_TICKET_URL}/${UUID}`,
+    qrImgUrl: `${BACKEND_BASE_RENDER_URL}/ticket/${UUID}`
+})
+
+const ticketEmail = (ticket: EmailTicket, event: TicketEmailEvent, html: string) => ({
+    from: getSender(),
+    to: [ticketEmailAddress(ticket) as string],
+    subject: `Your ticket for ${event.name}`,
+    html
+})
+
+// The email of a ticket as sent to Resend, rendered by the worker pool (see utils/workerPool)
+export const composeTicketEmail = async (ticket: EmailTicket, event: TicketEmailEvent) => (
+    ticketEmail(ticket, event, await cpuPool.run('ticketEmail', { ...ticketEmailShell(event), ...ticketEmailRecipient(ticket) }))
+)
+
+// The emails of a batch of tickets, rendered by a single task which fills in a template of the shared shell per
+// ticket (see workers/emailTemplate) instead of rendering each email whole
+export const composeTicketEmails = async (tickets: EmailTicket[], event: TicketEmailEvent) => {
+    const html = await cpuPool.run('ticketEmails', { shell: ticketEmailShell(event), recipients: tickets.map(ticketEmailRecipient) })
+    return tickets.map((ticket, idx) => ticketEmail(ticket, event, html[idx]))
+}
+
+
+// Writes the ids Resend gave to the emails of the tickets, in a single statement
+export const markSent = async (deliveries: { UUID: string, sentEmail: string }[]) => {
+    if (!deliveries.length) return 0
+    return await prismaClient.$executeRaw`
+        UPDATE "Ticket" SET "sentEmail" = delivery."sentEmail", "lastUpdated" = CURRENT_TIMESTAMP
+        FROM unnest(${deliveries.map(({ UUID }) => UUID)}::text[], ${deliveries.map(({ sentEmail }) => sentEmail)}::text[]) AS delivery("UUID", "sentEmail")
+        WHERE "Ticket"."UUID" = delivery."UUID"
+    `
+}
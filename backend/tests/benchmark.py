@@ -0,0 +1,124 @@
+import os
+import json
+import math
+import time
+import platform
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from commons import AsyncResponse
+
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(__file__), '.benchmarks')
+DEFAULT_RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results.json')
+DEFAULT_BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Metrics compared against the baseline, a higher value is a regression for all of them
+COMPARED_METRICS = ['p50', 'p95', 'p99']
+
+
+def percentile(values: List[float], q: float):
+    "Nearest-rank percentile, q in [0, 100]"
+    if not values: return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered)-1, math.ceil(q/100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(responses: List[AsyncResponse], wallTime: float):
+    "Summarizes latencies (in milliseconds), throughput (requests/s) and response sizes (bytes) of a benchmark run"
+    latencies = [res.elapsed.total_seconds()*1000 for res in responses]
+    sizes = [len(res.content) for res in responses]
+    count = len(responses)
+    return {
+        'count': count,
+        'errors': sum(1 for res in responses if not res.ok),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': sum(latencies)/count if count else 0.0,
+        'max': max(latencies, default=0.0),
+        'throughput': count/wallTime if wallTime > 0 else 0.0,
+        'bytesMean': sum(sizes)/count if count else 0.0,
+        'bytesTotal': sum(sizes),
+    }
+
+
+async def measure(request, count: int, _with, **kwargs):
+    "Runs `request.fan_out` and returns the responses along with their summary"
+    start = time.perf_counter()
+    responses = await request.fan_out(count, _with=_with, **kwargs)
+    wallTime = time.perf_counter() - start
+    return responses, summarize(responses, wallTime)
+
+
+def fit_power_law(xs: List[float], ys: List[float]):
+    """Least squares fit of y = coefficient * x^exponent on a log-log scale, returns (exponent, coefficient).
+
+    An exponent around 1 means y grows linearly with x, around 0 means it does not depend on x."""
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2: return 0.0, 0.0
+    meanX = sum(x for x, _ in points)/len(points)
+    meanY = sum(y for _, y in points)/len(points)
+    variance = sum((x-meanX)**2 for x, _ in points)
+    if not variance: return 0.0, math.exp(meanY)
+    exponent = sum((x-meanX)*(y-meanY) for x, y in points)/variance
+    return exponent, math.exp(meanY - exponent*meanX)
+
+
+def find_regressions(name: str, result: Dict, baseline: Dict, threshold: float):
+    """Compares a result against its baseline entry, returns a list of human readable regressions.
+
+    A metric regresses when it exceeds the baseline by more than `threshold` (0.2 = 20% slower)."""
+    reference = baseline.get(name)
+    if reference is None: return []
+    regressions = []
+    for metric in COMPARED_METRICS:
+        if metric not in reference or not reference[metric]: continue
+        ratio = result[metric]/reference[metric]
+        if ratio > 1 + threshold:
+            regressions.append("%s: %s regressed %.1f%% (%.2fms -> %.2fms)" % (name, metric, (ratio-1)*100, reference[metric], result[metric]))
+    return regressions
+
+
+def load_results(path: str):
+    if not os.path.exists(path): return {}
+    with open(path) as f:
+        return json.load(f).get('routes', {})
+
+
+def save_results(path: str, results: Dict, meta: Dict | None = None):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = {
+        'createdAt': datetime.now(timezone.utc).isoformat(),
+        'host': platform.node(),
+        **(meta or {}),
+        'routes': results
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+class Recorder:
+    "Collects the benchmark summaries of a test session and checks them against the stored baseline"
+    def __init__(self, size: int, concurrency: int, threshold: float, baselinePath: str, outputPath: str, saveBaseline: bool = False):
+        self.size = size
+        self.concurrency = concurrency
+        self.threshold = threshold
+        self.baselinePath = baselinePath
+        self.outputPath = outputPath
+        self.saveBaseline = saveBaseline
+        self.baseline = load_results(baselinePath)
+        self.results = {}
+    
+    def record(self, name: str, summary: Dict):
+        "Stores the summary, returns its regressions against the baseline"
+        self.results[name] = summary
+        return find_regressions(name, summary, self.baseline, self.threshold)
+    
+    def save(self):
+        if not self.results: return
+        meta = {'size': self.size, 'concurrency': self.concurrency}
+        save_results(self.outputPath, self.results, meta)
+        if self.saveBaseline:
+            save_results(self.baselinePath, {**self.baseline, **self.results}, meta)
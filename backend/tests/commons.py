@@ -1,21 +1,58 @@
 from functools import lru_cache
+from contextlib import contextmanager
 import os
+import asyncio
+import tempfile
+import json as jsonlib
+import time
+from datetime import timedelta
 from enum import IntFlag
 import secrets
-from typing import Dict
+from typing import Callable, Dict, Iterable, List
 
 import requests
+import aiohttp
 import dotenv
 from faker import Faker
 
+from server_timing import ServerTimingCollector
+from traffic import TrafficLog
+
 dotenv.load_dotenv()
 
 # Constants
 BASE_URL = "http://127.0.0.1:8080"
 SUPERUSER_CREDENTIALS = {"username":"superuser", "password":str(os.environ.get("SUPERUSER_PASSWORD",""))}
-PS = PERSISTENT_STORE = {}
 FAKE = Faker()
 
+# Set by pytest-xdist within its worker processes, e.g. WORKER_ID='gw3'
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "")
+IS_PARALLEL = bool(WORKER_ID)
+RUN_ID = os.environ.get("PYTEST_XDIST_TESTRUNUID", "") or str(os.getpid())
+
+
+def shared_store_path(runId: str = RUN_ID):
+    return os.path.join(tempfile.gettempdir(), "invetixia-tests-%s.json" % runId)
+
+
+_PROCESS_STORES = {}
+
+def process_store() -> dict:
+    "Returns the persistent store of the current process, a forked process never sees the store of its parent"
+    return _PROCESS_STORES.setdefault(os.getpid(), {})
+
+PS = PERSISTENT_STORE = process_store()
+
+# Server-Timing breakdowns of every response received, enabled with --server-timing
+SERVER_TIMINGS = ServerTimingCollector()
+
+# Requests sent by every session, recorded with --record-traffic for tests/replay.py
+TRAFFIC = TrafficLog()
+
+# Tokens of users logged in by sessions with useCache, keyed by the credentials (see Session._cache_key), reused instead
+# of logging in again
+SESSION_CACHE: Dict[str, Dict] = {}
+
 class Role(IntFlag):
     SUPER_ADMIN = 0b1000
     ADMIN = 0b100
@@ -24,21 +61,44 @@ class Role(IntFlag):
     PUBLIC = 0b0
 
 
+def namespaced(value: str, separator: str = ' '):
+    "Suffixes value with the namespace of the current worker, FAKE.unique is only unique within a process"
+    return '%s%s%s' % (value, separator, WORKER_ID) if IS_PARALLEL else value
+
+
+def namespaced_path(path: str):
+    "Inserts the namespace of the current worker before the extension of path, e.g. timings.gw0.json"
+    root, extension = os.path.splitext(path)
+    return '%s.%s%s' % (root, WORKER_ID, extension) if IS_PARALLEL else path
+
+
+def in_namespace(value: str, separator: str = ' '):
+    "Whether value was generated by the current worker, always true when not running in parallel"
+    return value.endswith('%s%s' % (separator, WORKER_ID)) if IS_PARALLEL else True
+
+
+def generate_unique_name():
+    return namespaced(FAKE.unique.name())
+
+
+def generate_unique_company():
+    return namespaced(FAKE.unique.company())
+
+
 def generate_credentials():
-    credentials = {'username':FAKE.unique.name(), 'password':secrets.token_hex(16)}
+    credentials = {'username':generate_unique_name(), 'password':secrets.token_hex(16)}
     return credentials
 
 
 def generate_create_user_input(role: Role, organisationName = None):
     if organisationName is None:
         organisationName = 'organisation-%s' % secrets.token_hex(4)
-    return {**generate_credentials(), 'role': role.value, "organisationName": FAKE.unique.company()}
+    return {**generate_credentials(), 'role': role.value, "organisationName": generate_unique_company()}
 
 @lru_cache(maxsize=None)
 def generate_many_create_user_input(role:Role, count=1):
-    "Generate many create user input, but with persistence within a session"
-    if count==0: return []
-    return generate_many_create_user_input(role, count-1)+[generate_create_user_input(role)]
+    "Generate many create user input, but with persistence within a session, see factory.Factory for large amounts"
+    return [generate_create_user_input(role) for _ in range(count)]
 
 
 def generate_random_hex(prefix: str = '', randomLength: int = 8):
@@ -47,31 +107,163 @@ def generate_random_hex(prefix: str = '', randomLength: int = 8):
 @lru_cache(maxsize=None)
 def generate_many_random_hex(count=1, prefix: str = '', randomLength: int = 8):
     "Generate many random hex, but with persistence within a session"
-    if count==0: return []
-    return generate_many_random_hex(count-1, prefix)+[generate_random_hex(prefix, randomLength)]
+    return [generate_random_hex(prefix, randomLength) for _ in range(count)]
+
+
+class SharedStore:
+    """A json file backed key-value store, shared by every worker process of a test run.
+    
+    Read-modify-write sequences must hold the lock, it is a plain lock file so it works wherever the suite does."""
+    path = shared_store_path()
+    
+    @classmethod
+    @contextmanager
+    def lock(cls, timeout: float = 30):
+        lockPath = cls.path + '.lock'
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline: # assume the holder died
+                    os.remove(lockPath)
+                    deadline = time.monotonic() + timeout
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lockPath)
+    
+    @classmethod
+    def _load(cls):
+        if not os.path.exists(cls.path): return {}
+        with open(cls.path) as f:
+            return jsonlib.load(f)
+    
+    @classmethod
+    def get(cls, key: str, default = None):
+        return cls._load().get(key, default)
+    
+    @classmethod
+    def set(cls, key: str, value):
+        data = cls._load()
+        data[key] = value
+        tmpPath = '%s.%s.tmp' % (cls.path, os.getpid())
+        with open(tmpPath, 'w') as f:
+            jsonlib.dump(data, f)
+        os.replace(tmpPath, cls.path)
 
 
 class Session(requests.Session):
-    def __init__(self, *args, credentials: Dict[str, str] | None = None, **kw):
+    """A requests session which logs in with its credentials and logs in again whenever its access token is rejected.
+    
+    With useCache, the tokens of a login are kept for the whole test session and reused by later sessions of the same
+    user, expired access tokens are renewed with the refresh token before falling back to a full login. Logging out
+    such a session keeps the tokens alive, they are revoked by logout_cached at the end of the test session.
+    
+    With shareTokens, the tokens are shared by every worker of a parallel run instead of each worker logging in on its
+    own. The backend keeps a single token row per user, so concurrent logins of the same user would invalidate the
+    refresh tokens of each other."""
+    def __init__(self, *args, credentials: Dict[str, str] | None = None, shareTokens: bool = False, useCache: bool = False, **kw):
         super().__init__(*args, **kw)
         
         self.credentials = credentials
+        self.shareTokens = shareTokens
+        self.useCache = useCache
         self.info = {}
+        self.trafficId = TRAFFIC.session_id()
         if credentials:
             self.login()
     
     def login(self):
-        res = self.request_path('POST', '/user/login', json=self.credentials)
+        if self.useCache and self._cached_login():
+            return True
+        loggedIn = self._shared_login() if self.shareTokens else self._login()
+        if loggedIn and self.useCache:
+            self._cache()
+        return loggedIn
+    
+    def _login(self):
+        self.cookies.pop('refreshToken', None)
+        res = self.request_path('POST', '/user/login', json=self.credentials, _relogin=False)
         if not res.ok: return res.ok
         self.headers['Authorization'] = f'Bearer {res.json()["accessToken"]}'
-        
-        res2 = self.request_path('GET', '/user/self', json=self.credentials)
+        return self._fetch_info()
+    
+    def _fetch_info(self):
+        res2 = self.request_path('GET', '/user/self', _relogin=False)
+        if not res2.ok: return res2.ok
         self.info = res2.json()['user']
         self.info['organisationName'] = self.info['organisationManaged']['name']
         return True
     
+    def _set_tokens(self, access: str, refresh: str):
+        self.headers['Authorization'] = access
+        self.cookies.pop('refreshToken', None)
+        self.cookies.set('refreshToken', refresh)
+    
+    def _shared_login(self):
+        key = 'tokens.%s' % self.credentials['username']
+        with SharedStore.lock():
+            tokens = SharedStore.get(key)
+            if tokens is not None and tokens['access'] != self.headers.get('Authorization'):
+                # Adopt the tokens of another worker, unless these are the ones which just got rejected
+                self._set_tokens(tokens['access'], tokens['refresh'])
+                if self._fetch_info(): return True
+            
+            if not self._login(): return False
+            SharedStore.set(key, {'access': self.headers['Authorization'], 'refresh': self.cookies.get('refreshToken')})
+            return True
+    
+    def _cache_key(self):
+        "Tokens are only reused by sessions with the username, password and role they were logged in with"
+        return jsonlib.dumps({field: self.credentials.get(field) for field in ('username', 'password', 'role')}, sort_keys=True)
+    
+    def _cache(self):
+        # The backend keeps a single token row per user, so the tokens cached for other credentials of the user are gone
+        username = self.credentials['username']
+        for key in [key for key, cached in SESSION_CACHE.items() if cached['username'] == username]:
+            del SESSION_CACHE[key]
+        SESSION_CACHE[self._cache_key()] = {'username': username,
+                                            'access': self.headers['Authorization'], 
+                                            'refresh': self.cookies.get('refreshToken'), 
+                                            'shared': self.shareTokens}
+    
+    def _matches_credentials(self):
+        "Whether the user logged in as still has the username and role of the credentials, another module may have changed them"
+        return self.info.get('username') == self.credentials['username'] and self.info.get('role') == self.credentials.get('role', self.info.get('role'))
+    
+    def _cached_login(self):
+        key = self._cache_key()
+        cached = SESSION_CACHE.get(key)
+        if cached is None: return False
+        
+        rejected = cached['access'] == self.headers.get('Authorization') # The cached access token just got rejected
+        self._set_tokens(cached['access'], cached['refresh'])
+        loggedIn = not rejected and self._fetch_info()
+        if not loggedIn and self.renew() and self._fetch_info():
+            self._cache()
+            loggedIn = True
+        if loggedIn and self._matches_credentials(): return True
+        
+        del SESSION_CACHE[key]
+        self.info = {}
+        return False
+    
+    def renew(self):
+        "Gets a new access token with the refresh token, without the password check of a full login"
+        res = self.request_path('GET', '/user/refreshToken', _relogin=False)
+        if not res.ok: return res.ok
+        self.headers['Authorization'] = f'Bearer {res.json()["accessToken"]}'
+        return True
+    
     def logout(self):
-        res = self.request_path('POST', '/user/logout')
+        if self.shareTokens or self.useCache: # the tokens may still be used by other sessions
+            self.headers['Authorization']=''
+            return True
+        res = self.request_path('POST', '/user/logout', _relogin=False)
         if res.ok or res.status_code==403:
             self.headers['Authorization']=''
             return True
@@ -99,13 +291,14 @@ class Session(requests.Session):
                      stream = None, 
                      verify = None, 
                      cert = None, 
-                     json = None):
+                     json = None,
+                     _relogin: bool = True):
         kw = {"method":method, "url":BASE_URL+str(path), "params":params, "data":data, "headers":headers, "cookies":cookies, 
               "files":files, "auth": auth, "timeout":timeout, "allow_redirects": allow_redirects,
               "proxies":proxies, "hooks":hooks, "stream":stream, "verify":verify, "cert":cert, "json":json}
-        kw = {k:v for k,v in kw.items() if v}
+        kw = {k:v for k,v in kw.items() if v or v is False}
         res = super().request(**kw)
-        if not res.ok:
+        if not res.ok and _relogin:
             try:
                 assert(res.json().get('message') is not None), res.json()
                 if res.json()['message'][:4] in ["E101", "E102"]:
@@ -113,9 +306,156 @@ class Session(requests.Session):
                         res = super().request(**kw)
             except requests.exceptions.JSONDecodeError:
                 pass
+        SERVER_TIMINGS.record(method, path, res.headers.get('Server-Timing'))
+        if TRAFFIC.enabled:
+            content = res.text if 'json' in res.headers.get('Content-Type', '') else ''
+            TRAFFIC.record(self.trafficId, int(self.info.get('role', 0)), method, path, params, json, res.status_code, res.elapsed.total_seconds(), content)
+        return res
+
+
+def logout_cached():
+    "Revokes the tokens kept in SESSION_CACHE, except the ones shared with other workers"
+    for key, cached in list(SESSION_CACHE.items()):
+        del SESSION_CACHE[key]
+        if cached['shared']: continue
+        session = Session()
+        session._set_tokens(cached['access'], cached['refresh'])
+        session.request_path('POST', '/user/logout', _relogin=False)
+
+
+class AsyncResponse:
+    "A small requests.Response look-alike for responses received through AsyncSession"
+    def __init__(self, status_code: int, headers, content: bytes, elapsed: timedelta, url: str = ''):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+        self.url = url
+    
+    @property
+    def ok(self):
+        return self.status_code < 400
+    
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+    
+    def json(self):
+        return jsonlib.loads(self.content)
+    
+    def __repr__(self):
+        return '<AsyncResponse [%s]>' % self.status_code
+
+
+class AsyncSession:
+    """Asyncio counterpart of Session, meant for pushing concurrent traffic at the backend.
+    
+    Connections are pooled (at most `poolSize` open sockets) and at most `concurrency` requests are in flight at once.
+    Must be used within a running event loop, preferably as `async with AsyncSession(...) as session:`."""
+    def __init__(self, credentials: Dict[str, str] | None = None, poolSize: int = 100, concurrency: int = 100, timeout: float = 60):
+        self.credentials = credentials
+        self.info = {}
+        self.headers = {}
+        self.trafficId = TRAFFIC.session_id()
+        self.poolSize = poolSize
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._client: aiohttp.ClientSession | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._login_lock: asyncio.Lock | None = None
+    
+    async def __aenter__(self):
+        await self.open()
+        if self.credentials:
+            await self.login()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def open(self):
+        if self._client is not None: return
+        self._client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.poolSize), 
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout), 
+                                             cookie_jar=aiohttp.CookieJar(unsafe=True)) # unsafe allows cookies for ip hosts
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._login_lock = asyncio.Lock()
+    
+    async def close(self):
+        if self._client is None: return
+        await self._client.close()
+        self._client = None
+    
+    async def login(self):
+        res = await self.request_path('POST', '/user/login', json=self.credentials, _relogin=False)
+        if not res.ok: return res.ok
+        self.headers['Authorization'] = f'Bearer {res.json()["accessToken"]}'
+        
+        res2 = await self.request_path('GET', '/user/self', _relogin=False)
+        self.info = res2.json()['user']
+        self.info['organisationName'] = self.info['organisationManaged']['name']
+        return True
+    
+    async def logout(self):
+        res = await self.request_path('POST', '/user/logout', _relogin=False)
+        if res.ok or res.status_code==403:
+            self.headers['Authorization']=''
+            return True
+        else:
+            return False
+    
+    async def reauth(self):
+        await self.logout()
+        return await self.login()
+    
+    async def _send(self, kw):
+        assert self._client is not None and self._semaphore is not None, "AsyncSession is not opened"
+        headers = {**self.headers, **(kw.pop('headers', None) or {})}
+        async with self._semaphore:
+            start = time.perf_counter()
+            async with self._client.request(headers=headers, **kw) as res:
+                content = await res.read()
+            elapsed = timedelta(seconds=time.perf_counter()-start)
+        return AsyncResponse(res.status, res.headers, content, elapsed, str(res.url))
+    
+    async def request_path(self,
+                           method: str = '', 
+                           path: str = '', 
+                           params = None, 
+                           data = None, 
+                           headers = None, 
+                           cookies = None, 
+                           timeout = None, 
+                           allow_redirects = True, 
+                           json = None,
+                           _relogin: bool = True):
+        kw = {"method":method, "url":BASE_URL+str(path), "params":params, "data":data, "headers":headers, "cookies":cookies, 
+              "allow_redirects": allow_redirects, "json":json}
+        if timeout: kw['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        kw = {k:v for k,v in kw.items() if v or v is False}
+        sentAuthorization = self.headers.get('Authorization')
+        res = await self._send(kw.copy())
+        if not res.ok and _relogin and self.credentials:
+            try:
+                if str(res.json().get('message', ''))[:4] in ["E101", "E102"]:
+                    async with self._login_lock:
+                        # Another request may have already renewed the token while this one waited
+                        relogged = self.headers.get('Authorization') != sentAuthorization or await self.login()
+                    if relogged:
+                        res = await self._send(kw.copy())
+            except (ValueError, AttributeError):
+                pass
+        SERVER_TIMINGS.record(method, path, res.headers.get('Server-Timing'))
+        if TRAFFIC.enabled:
+            content = res.text if 'json' in res.headers.get('Content-Type', '') else ''
+            TRAFFIC.record(self.trafficId, int(self.info.get('role', 0)), method, path, params, json, res.status_code, res.elapsed.total_seconds(), content)
         return res
 
 
+# Arguments of requests which AsyncSession.request_path has no counterpart for
+ASYNC_UNSUPPORTED_KWARGS = {'files', 'auth', 'proxies', 'hooks', 'stream', 'verify', 'cert'}
+
+
 class PreparedTestRequest:
     def __init__(self,
                  method: str, 
@@ -151,18 +491,19 @@ class PreparedTestRequest:
                     files = None, 
                     auth = None, 
                     timeout = None, 
-                    allow_redirects = True, 
+                    allow_redirects = None, 
                     proxies = None, 
                     hooks = None, 
                     stream = None, 
                     verify = None, 
                     cert = None, 
                     json = None):
+        "Overrides the kwargs given, False included (e.g. allow_redirects=False), None and empty values are left out"
         newKw = {"method":method, "path":path, "params":params, "data":data, "headers":headers, "cookies":cookies, 
                  "files":files, "auth": auth, "timeout":timeout, "allow_redirects": allow_redirects,
                  "proxies":proxies, "hooks":hooks, "stream":stream, "verify":verify, "cert":cert, "json":json}
         resKw = oldKwargs.copy()
-        resKw.update({k:v for k,v in newKw.items() if v})
+        resKw.update({k:v for k,v in newKw.items() if v or v is False})
         return resKw
     
     def update(self, *args, **kwargs):
@@ -178,29 +519,118 @@ class PreparedTestRequest:
         "Shorthand for execute"
         return self.execute(*args, _with=_with, _path_formats=_path_formats, **kwargs)
 
+    async def execute_async(self, *args, _with: AsyncSession, _path_formats = dict(), **kwargs):
+        kwargs = self.mergeKwargs(self.kwargs, *args, **kwargs)
+        unsupported = sorted(set(kwargs) & ASYNC_UNSUPPORTED_KWARGS)
+        if unsupported:
+            raise TypeError("%s %s: %s can not be sent through AsyncSession, use execute instead" % (kwargs['method'], kwargs['path'], ', '.join(unsupported)))
+        kwargs['path'] = kwargs['path'] % _path_formats
+        return await _with.request_path(**kwargs)
+
+    async def fan_out(self, count: int, _with: AsyncSession, _path_formats = dict(), _factory: Callable[[int], dict] | None = None, **kwargs) -> List[AsyncResponse]:
+        """Executes the request `count` times concurrently, bounded by the concurrency limit of `_with`.
+        
+        `_factory`, if given, is called with the index of each call and returns per-call keyword arguments
+        (e.g. `json` or `_path_formats`) which override the shared ones. Responses are returned in call order."""
+        def call_kwargs(idx):
+            callKwargs = {'_path_formats': _path_formats, **kwargs}
+            if _factory is not None:
+                callKwargs.update(_factory(idx))
+            return callKwargs
+        return await asyncio.gather(*[self.execute_async(_with=_with, **call_kwargs(idx)) for idx in range(count)])
+
+
+ALL_ROWS = {'all': 'true'} # Query of the list endpoints (GET /ticket, /quota, ...) to get every row in one response
+
+
+def fetch_pages(request: PreparedTestRequest, key: str, _with: Session, params: dict | None = None, limit: int = 100):
+    "Follows the cursors of a paginated list endpoint, returns the rows of every page under `key` and the count of pages"
+    rows, pages, after = [], 0, None
+    while True:
+        pageParams = {**(params or {}), 'limit': limit}
+        if after is not None: pageParams['after'] = after
+        res = request.x(_with=_with, params=pageParams)
+        assert res.ok, (pageParams, res)
+        body = res.json()
+        assert len(body[key]) <= limit
+        rows.extend(body[key])
+        pages += 1
+        if body['nextCursor'] is None: return rows, pages
+        after = body['nextCursor']
+
+
+IMPORT_CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+class ImportBody:
+    """Encodes the rows of a ticket import (the body of /ticket/create without invitationId) as it is sent, so the
+    rows are never held as a whole. Can be iterated again, e.g. when the request is resent after a relogin, as long
+    as `rows` can."""
+    def __init__(self, rows: Iterable[Dict], format: str = 'ndjson'):
+        self.rows = rows
+        self.format = format
+
+    def _lines(self):
+        if self.format == 'ndjson':
+            for row in self.rows:
+                yield jsonlib.dumps(row) + '\n'
+            return
+        yield 'ownerName,email,phone_number\r\n'
+        for row in self.rows:
+            contacts = row.get('ownerContacts') or {}
+            fields = [row.get('ownerName'), contacts.get('email'), contacts.get('phone_number')]
+            yield ','.join('"%s"' % str(field).replace('"', '""') if field is not None else '' for field in fields) + '\r\n'
+
+    def __iter__(self):
+        chunk = []
+        for line in self._lines():
+            chunk.append(line)
+            if len(chunk) >= 500:
+                yield ''.join(chunk).encode()
+                chunk = []
+        if chunk: yield ''.join(chunk).encode()
+
+
+def import_tickets(session: Session, invitationId: str, rows: Iterable[Dict], format: str = 'ndjson'):
+    "Uploads the rows through /ticket/import/:invitationId, streamed in chunks"
+    return session.request_path('POST', '/ticket/import/%s' % invitationId, data=ImportBody(rows, format),
+                                headers={'Content-Type': IMPORT_CONTENT_TYPES[format]})
+
 
 class PersistentStore:
-    """A class which provides persistent store for test cases"""
-    def store(self, key: str, value, useGlobal: bool = False):
-        if not useGlobal:
-            key = "%s.%s.%s" % (self.__class__.__module__, self.__class__.__name__, key)
-        PS[key] = value
+    """A class which provides persistent store for test cases
     
-    def get(self, key: str, useGlobal: bool = False):
+    Values are kept per process, values stored with useShared are visible to every worker of a parallel run instead,
+    hence these must be json serializable."""
+    def _key(self, key: str, useGlobal: bool = False):
         if not useGlobal:
             key = "%s.%s.%s" % (self.__class__.__module__, self.__class__.__name__, key)
-        return PS[key]
+        return key
     
-    def update(self, key: str, updater: dict, useGlobal: bool = False):
-        if not useGlobal:
-            key = "%s.%s.%s" % (self.__class__.__module__, self.__class__.__name__, key)
-        PS[key].update(updater)
+    def store(self, key: str, value, useGlobal: bool = False, useShared: bool = False):
+        if useShared:
+            with SharedStore.lock():
+                return SharedStore.set(self._key(key, useGlobal), value)
+        process_store()[self._key(key, useGlobal)] = value
+    
+    def get(self, key: str, useGlobal: bool = False, useShared: bool = False):
+        if useShared:
+            return SharedStore.get(self._key(key, useGlobal))
+        return process_store()[self._key(key, useGlobal)]
+    
+    def update(self, key: str, updater: dict, useGlobal: bool = False, useShared: bool = False):
+        if useShared:
+            with SharedStore.lock():
+                value = SharedStore.get(self._key(key, useGlobal))
+                value.update(updater)
+                return SharedStore.set(self._key(key, useGlobal), value)
+        process_store()[self._key(key, useGlobal)].update(updater)
     
-    def store_set(self, key: str, value, useGlobal: bool = False):
-        return self.store(key, value, useGlobal)
+    def store_set(self, key: str, value, useGlobal: bool = False, useShared: bool = False):
+        return self.store(key, value, useGlobal, useShared)
     
-    def store_get(self, key: str, useGlobal: bool = False):
-        return self.get(key, useGlobal)
+    def store_get(self, key: str, useGlobal: bool = False, useShared: bool = False):
+        return self.get(key, useGlobal, useShared)
     
-    def store_update(self, key: str, updater: dict, useGlobal: bool = False):
-        self.update(key, updater, useGlobal)
+    def store_update(self, key: str, updater: dict, useGlobal: bool = False, useShared: bool = False):
+        self.update(key, updater, useGlobal, useShared)
@@ -1,49 +1,187 @@
+import os
+import uuid
 import commons
+import benchmark
+import resend_stub
 import pytest
+from dataset import Dataset
 
 
+# Suites which are too slow or heavy for a regular run, each is enabled by its own command line flag
+OPTIONAL_SUITES = {
+    'benchmark': 'per-endpoint latency benchmarks',
+    'stress': 'concurrency stress scenarios',
+    'email': 'email dispatch tests against the Resend stand-in (tests/resend_stub.py)',
+    'soak': 'long running soak test tracking the backend for leaks and slowdowns',
+    'scaling': 'dataset size scaling suite of the list endpoints',
+}
+
+# Lines added through the `report` fixture, printed in the terminal summary
+REPORTS_KEY = pytest.StashKey[list]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('invetixia')
+    for name, description in OPTIONAL_SUITES.items():
+        group.addoption('--%s' % name, action='store_true', default=False, help='Run %s.' % description)
+    
+    group.addoption('--benchmark-size', type=int, default=200, help='Requests (and seeded records) per benchmarked route.')
+    group.addoption('--benchmark-concurrency', type=int, default=20, help='Concurrent requests while benchmarking.')
+    group.addoption('--benchmark-threshold', type=float, default=0.2, help='Allowed slowdown against the baseline, 0.2 = 20%%.')
+    group.addoption('--benchmark-baseline', default=benchmark.DEFAULT_BASELINE_PATH, help='Baseline results to compare against.')
+    group.addoption('--benchmark-output', default=benchmark.DEFAULT_RESULTS_PATH, help='Where the results of this run are saved.')
+    group.addoption('--benchmark-save-baseline', action='store_true', default=False, help='Store the results of this run as the new baseline.')
+    
+    group.addoption('--stress-requests', type=int, default=500, help='Requests fired per stress scenario.')
+    group.addoption('--stress-concurrency', type=int, default=100, help='Concurrent requests while stressing.')
+    group.addoption('--server-timing', action='store_true', default=False, help='Collect the Server-Timing breakdown of every endpoint, needs the backend started with ENABLE_SERVER_TIMING=1.')
+    group.addoption('--server-timing-output', default=None, help='Where the Server-Timing breakdowns are saved as json, implies --server-timing.')
+    group.addoption('--soak-duration', type=float, default=3600, help='Seconds the soak test runs for.')
+    group.addoption('--soak-interval', type=float, default=30, help='Seconds between samples of the soak test.')
+    group.addoption('--soak-rate', type=float, default=50, help='Requests per second sent by the soak test.')
+    group.addoption('--soak-threshold', type=float, default=0.1, help='Growth of a metric over the soak run flagged as a leak, 0.1 = 10%%.')
+    group.addoption('--soak-pid', type=int, default=None, help='Pid of the backend, found through its port when running on this host.')
+    group.addoption('--soak-output', default=None, help='Appends every soak sample to this json lines file.')
+    group.addoption('--scaling-sizes', default='100,1000,10000', help='Comma separated ticket counts the scaling suite measures at, e.g. up to 1000000.')
+    group.addoption('--scaling-repeats', type=int, default=5, help='Requests per endpoint and size, the median is kept.')
+    group.addoption('--scaling-max-exponent', type=float, default=1.2, help='Largest growth exponent (latency ~ size^exponent) allowed for the list endpoints.')
+    group.addoption('--record-traffic', default=None, help='Appends every request sent by the suite to this log, replayed with tests/replay.py.')
+    group.addoption('--resend-port', type=int, default=resend_stub.DEFAULT_PORT, help='Port of the Resend stand-in, the backend must be started with RESEND_BASE_URL pointing at it.')
+    group.addoption('--email-tickets', type=int, default=300, help='Tickets mailed by the email dispatch benchmark.')
+    group.addoption('--stress-scanners', default='1,4,16,32', help='Comma separated counts of concurrent gate scanners to simulate.')
+
+
+# Tests of a module run in order and share module scoped fixtures, so a module must stay within a single worker
+PARALLEL_DIST_MODES = ['loadfile', 'loadscope', 'loadgroup']
+
+
+def pytest_configure(config):
+    config.stash[REPORTS_KEY] = []
+    commons.SERVER_TIMINGS.enabled = bool(config.getoption('server_timing') or config.getoption('server_timing_output'))
+    isController = getattr(config.option, 'dist', 'no') != 'no' and not hasattr(config, 'workerinput')
+    if config.getoption('record_traffic') and not isController: # the controller of a parallel run sends nothing
+        commons.TRAFFIC.open(commons.namespaced(config.getoption('record_traffic'), '.'))
+    for name, description in OPTIONAL_SUITES.items():
+        config.addinivalue_line('markers', '%s: %s, only ran with --%s' % (name, description, name))
+    
+    # Ran by the controller of a parallel run (pytest-xdist), workers have a workerinput
+    dist = getattr(config.option, 'dist', 'no')
+    if dist == 'no' or hasattr(config, 'workerinput'): return
+    if dist not in PARALLEL_DIST_MODES:
+        raise pytest.UsageError('Tests must be distributed with one of %s, got --dist %s' % (', '.join(PARALLEL_DIST_MODES), dist))
+    if config.option.testrunuid is None: # Pinned to find the shared store of the workers afterwards
+        config.option.testrunuid = uuid.uuid4().hex
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    lines = config.stash.get(REPORTS_KEY, [])
+    if lines:
+        terminalreporter.section('invetixia reports')
+        for line in lines:
+            terminalreporter.write_line(line)
+    
+    timings = commons.SERVER_TIMINGS.summary_lines()
+    if timings:
+        terminalreporter.section('server timings (slowest endpoints)')
+        for line in timings:
+            terminalreporter.write_line(line)
+
+
+def pytest_sessionfinish(session):
+    output = session.config.getoption('server_timing_output')
+    if output and commons.SERVER_TIMINGS.endpoints:
+        commons.SERVER_TIMINGS.dump(commons.namespaced_path(output))
+
+
+def pytest_unconfigure(config):
+    commons.TRAFFIC.close()
+    testrunuid = getattr(config.option, 'testrunuid', None)
+    if testrunuid is None or hasattr(config, 'workerinput'): return
+    for path in [commons.shared_store_path(testrunuid), commons.shared_store_path(testrunuid) + '.lock']:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def pytest_generate_tests(metafunc):
+    if 'scanners' in metafunc.fixturenames:
+        metafunc.parametrize('scanners', [int(count) for count in metafunc.config.getoption('stress_scanners').split(',')])
+
+
+def pytest_collection_modifyitems(config, items):
+    for name in OPTIONAL_SUITES:
+        if config.getoption(name): continue
+        skip = pytest.mark.skip(reason='needs --%s to run' % name)
+        for item in items:
+            if name in item.keywords:
+                item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def session_cache():
+    "Logins are reused by every module of the session, the tokens are revoked once the session ends"
+    yield commons.SESSION_CACHE
+    
+    commons.logout_cached()
+
+@pytest.fixture(scope="session")
+def accounts(session_cache):
+    "Users of the role fixtures, shared by every module and recreated by role_session whenever a module deleted them"
+    _accounts = {}
+    
+    yield _accounts
+    
+    if _accounts:
+        superuser = commons.Session(credentials=commons.SUPERUSER_CREDENTIALS, shareTokens=commons.IS_PARALLEL, useCache=True)
+        superuser.request_path("DELETE", '/user/deleteMany', json={'UUIDs': [account['user']['UUID'] for account in _accounts.values()]})
+
+
+def role_session(superuser, accounts, role: commons.Role):
+    "Logs in as the account of the role, with cached tokens when possible, the account is created if it does not exist"
+    account = accounts.get(role)
+    if account is not None:
+        session = commons.Session(credentials=account['credentials'], useCache=True)
+        if session.info.get('role') == role: return session
+    
+    credentials = commons.generate_create_user_input(role=role)
+    res = superuser.request_path("POST", '/user/create', json=credentials)
+    assert res.ok, res
+    accounts[role] = {'credentials': credentials, 'user': res.json()['user']}
+    return commons.Session(credentials=credentials, useCache=True)
+
+
+# The superuser is shared by the workers of a parallel run rather than replaced by an admin per worker: the tests need a
+# SUPER_ADMIN, and /user/create only creates roles below the creator's, so the superuser can not be derived per worker.
+# The admin, organisation manager and observer sessions are created per worker (see role_session).
 @pytest.fixture(scope="module")
-def superuser():
-    superuser = commons.Session(credentials=commons.SUPERUSER_CREDENTIALS)
+def superuser(session_cache):
+    superuser = commons.Session(credentials=commons.SUPERUSER_CREDENTIALS, shareTokens=commons.IS_PARALLEL, useCache=True)
     yield superuser
     
     superuser.logout()
 
 @pytest.fixture(scope="module")
-def admin(superuser):
-    credentials = commons.generate_create_user_input(role=commons.Role.ADMIN)
-    res = superuser.request_path("POST", '/user/create', json=credentials)
-    session = commons.Session(credentials=credentials)
+def admin(superuser, accounts):
+    session = role_session(superuser, accounts, commons.Role.ADMIN)
     
     yield session
     
     session.logout()
-    superuser.request_path("DELETE", '/user/delete', json=res.json()['user'])
-    superuser.logout()
 
 @pytest.fixture(scope="module")
-def organisation_manager(superuser):
-    credentials = commons.generate_create_user_input(role=commons.Role.ORGANISATION_MANAGER)
-    res = superuser.request_path("POST", '/user/create', json=credentials)
-    session = commons.Session(credentials=credentials)
+def organisation_manager(superuser, accounts):
+    session = role_session(superuser, accounts, commons.Role.ORGANISATION_MANAGER)
     
     yield session
     
     session.logout()
-    superuser.request_path("DELETE", '/user/delete', json=res.json()['user'])
-    superuser.logout()
 
 @pytest.fixture(scope="module")
-def observer(superuser):
-    credentials = commons.generate_create_user_input(role=commons.Role.OBSERVER)
-    res = superuser.request_path("POST", '/user/create', json=credentials)
-    session = commons.Session(credentials=credentials)
+def observer(superuser, accounts):
+    session = role_session(superuser, accounts, commons.Role.OBSERVER)
     
     yield session
     
     session.logout()
-    superuser.request_path("DELETE", '/user/delete', json=res.json()['user'])
-    superuser.logout()
 
 @pytest.fixture(scope="module")
 def public():
@@ -69,6 +207,30 @@ def all_sessions(authenticated_sessions, public):
     yield session_list
 
 
+@pytest.fixture(scope="session")
+def dataset(session_cache):
+    "Bulk-seeded records shared by every module of the session"
+    session = commons.Session(credentials=commons.SUPERUSER_CREDENTIALS, shareTokens=commons.IS_PARALLEL, useCache=True)
+    _dataset = Dataset(session)
+    
+    yield _dataset
+    
+    _dataset.teardown()
+
+@pytest.fixture(scope="session")
+def quota_types(dataset):
+    yield dataset.create_quota_types(20)
+
+@pytest.fixture(scope="module")
+def module_dataset(superuser):
+    "Bulk-seeded records of a single module, torn down at the end of the module"
+    _dataset = Dataset(superuser)
+    
+    yield _dataset
+    
+    _dataset.teardown()
+
+
 @pytest.fixture(scope="module")
 def store():
     _store = {}
@@ -76,3 +238,26 @@ def store():
     yield _store
     
     _store.clear()
+
+
+@pytest.fixture(scope="session")
+def report(request):
+    "Adds a line to the report printed at the end of the run"
+    lines = request.config.stash[REPORTS_KEY]
+    
+    yield lines.append
+
+
+@pytest.fixture(scope="session")
+def benchmark_recorder(request):
+    config = request.config
+    recorder = benchmark.Recorder(size=config.getoption('benchmark_size'), 
+                                  concurrency=config.getoption('benchmark_concurrency'), 
+                                  threshold=config.getoption('benchmark_threshold'), 
+                                  baselinePath=config.getoption('benchmark_baseline'), 
+                                  outputPath=config.getoption('benchmark_output'), 
+                                  saveBaseline=config.getoption('benchmark_save_baseline'))
+    
+    yield recorder
+    
+    recorder.save()
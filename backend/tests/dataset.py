@@ -0,0 +1,130 @@
+import asyncio
+from typing import Dict, List
+
+import commons
+from commons import PreparedTestRequest, Session
+from factory import DEFAULT_FACTORY, Replayable
+
+
+class Endpoint:
+    quota_type_create_many = '/quotaType/createMany'
+    quota_type_delete_many = '/quotaType/deleteMany'
+    organisation_create_many = '/organisation/createMany'
+    organisation_delete_many = '/organisation/deleteMany'
+    invitation_create_many = '/invitation/createMany'
+    invitation_delete_many = '/invitation/deleteMany'
+    user_create = '/user/create'
+    user_delete_many = '/user/deleteMany'
+    ticket_create = '/ticket/create'
+
+class Test:
+    quota_type_create_many = PreparedTestRequest("POST", Endpoint.quota_type_create_many)
+    quota_type_delete_many = PreparedTestRequest("DELETE", Endpoint.quota_type_delete_many)
+    organisation_create_many = PreparedTestRequest("POST", Endpoint.organisation_create_many)
+    organisation_delete_many = PreparedTestRequest("DELETE", Endpoint.organisation_delete_many)
+    invitation_create_many = PreparedTestRequest("POST", Endpoint.invitation_create_many)
+    invitation_delete_many = PreparedTestRequest("DELETE", Endpoint.invitation_delete_many)
+    user_create = PreparedTestRequest("POST", Endpoint.user_create)
+    user_delete_many = PreparedTestRequest("DELETE", Endpoint.user_delete_many)
+    ticket_create = PreparedTestRequest("POST", Endpoint.ticket_create)
+
+
+def generate_ticket_input(invitationId: str):
+    return next(DEFAULT_FACTORY.tickets([invitationId]))
+
+
+class Dataset:
+    """Records seeded in bulk for test modules, everything created through a dataset is torn down in one sweep.
+
+    Quota types, organisations and invitations are each created with a single batched call, tickets (along with their
+    quotas, which come from the invitation's default quotas) are created concurrently."""
+    def __init__(self, session: Session, concurrency: int = 20):
+        self.session = session
+        self.concurrency = concurrency
+        self.quotaTypes: List[Dict] = []
+        self.organisations: List[Dict] = []
+        self.invitations: List[Dict] = []
+        self.tickets: List[Dict] = []
+        self.users: List[Dict] = []
+
+    @property
+    def quotas(self):
+        return [quota for ticket in self.tickets for quota in ticket['quotas']]
+
+    def create_quota_types(self, count: int):
+        jsonData = {'quotaTypes': [{'name': commons.generate_random_hex(randomLength=8)} for _ in range(count)]}
+        res = Test.quota_type_create_many.x(_with=self.session, json=jsonData)
+        assert res.ok, res
+        created = res.json()['quotaTypes']
+        self.quotaTypes.extend(created)
+        return created
+
+    def create_organisations(self, count: int):
+        jsonData = {'names': [commons.generate_random_hex('organisation-', 8) for _ in range(count)]}
+        res = Test.organisation_create_many.x(_with=self.session, json=jsonData)
+        assert res.ok, res
+        created = res.json()['organisations']
+        self.organisations.extend(created)
+        return created
+
+    def create_invitations(self, invitations: List[Dict]):
+        "Each entry takes the fields of /invitation/create, a random name is given to entries without one"
+        jsonData = {'invitations': [{'name': commons.generate_random_hex(randomLength=8), **invitation} for invitation in invitations]}
+        res = Test.invitation_create_many.x(_with=self.session, json=jsonData)
+        assert res.ok, res
+        created = res.json()['invitations']
+        self.invitations.extend(created)
+        return created
+
+    def create_users(self, count: int, role: commons.Role, organisationName: str):
+        "Creates users managing the given organisation, returns their credentials to log in with"
+        credentials = []
+        for _ in range(count):
+            jsonData = commons.generate_create_user_input(role=role)
+            jsonData['organisationName'] = organisationName
+            res = Test.user_create.x(_with=self.session, json=jsonData)
+            assert res.ok, res
+            self.users.append(res.json()['user'])
+            credentials.append({'username': jsonData['username'], 'password': jsonData['password']})
+        return credentials
+
+    def create_tickets(self, invitationIds: List[str]):
+        "Creates a ticket for each entry of invitationIds, in order"
+        async def _create():
+            async with commons.AsyncSession(poolSize=self.concurrency, concurrency=self.concurrency) as session:
+                return await Test.ticket_create.fan_out(len(invitationIds), _with=session, _factory=lambda idx: {'json': generate_ticket_input(invitationIds[idx])})
+
+        responses = asyncio.run(_create())
+        assert all(res.ok for res in responses), [res for res in responses if not res.ok][:5]
+        created = [res.json()['ticket'] for res in responses]
+        self.tickets.extend(created)
+        return created
+
+    def import_tickets(self, invitationId: str, count: int, format: str = 'ndjson'):
+        """Creates `count` tickets through a single streamed /ticket/import, returns its result (counts and per-row
+        errors) as the created tickets are not returned. They are not kept by the dataset, the invitation's deletion
+        cascades to them."""
+        res = commons.import_tickets(self.session, invitationId, Replayable(lambda factory: factory.tickets([invitationId]), count), format)
+        assert res.ok, res
+        return res.json()
+
+    def teardown(self):
+        "Deletes everything created through this dataset, tickets and quotas are cascaded"
+        if self.users:
+            res0 = Test.user_delete_many.x(_with=self.session, json={'UUIDs': [user['UUID'] for user in self.users]})
+            assert res0.ok, res0
+        if self.invitations:
+            res1 = Test.invitation_delete_many.x(_with=self.session, json={'UUIDs': [invitation['UUID'] for invitation in self.invitations]})
+            assert res1.ok, res1
+        if self.organisations:
+            res2 = Test.organisation_delete_many.x(_with=self.session, json={'UUIDs': [organisation['UUID'] for organisation in self.organisations]})
+            assert res2.ok, res2
+        if self.quotaTypes:
+            res3 = Test.quota_type_delete_many.x(_with=self.session, json={'UUIDs': [quotaType['UUID'] for quotaType in self.quotaTypes]})
+            assert res3.ok, res3
+
+        self.quotaTypes.clear()
+        self.organisations.clear()
+        self.invitations.clear()
+        self.tickets.clear()
+        self.users.clear()
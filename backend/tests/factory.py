@@ -0,0 +1,139 @@
+import os
+import random
+import secrets
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence
+
+from faker import Faker
+
+import commons
+
+
+# Length limit of names checked by the backend (nameValidator)
+MAX_NAME_LENGTH = 50
+# Faker values drawn once per factory, records pick from these as calling Faker per record is slow
+POOL_SIZE = 1000
+DEFAULT_SEED = int(os.environ.get("TEST_SEED", 0))
+
+
+def to_base36(value: int):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    encoded = ''
+    while True:
+        value, remainder = divmod(value, 36)
+        encoded = digits[remainder] + encoded
+        if not value: return encoded
+
+
+def take(iterable: Iterable, count: int):
+    "Takes the first `count` items of a (possibly endless) generator as a list"
+    return list(itertools.islice(iterable, count))
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    "Chunks an iterable into lists of at most `size` items, e.g. for the bulk (createMany) routes"
+    iterator = iter(iterable)
+    while batch := take(iterator, size):
+        yield batch
+
+
+class Factory:
+    """Seeded and deterministic generators of test data, two factories with the same seed and namespace stream the
+    exact same records.
+
+    Unique fields (names, usernames, contacts) end with a base36 counter and the namespace of the factory, so they never
+    collide however many records are streamed, unlike FAKE.unique which remembers (and eventually runs out of) every
+    value it gave. Realistic parts are picked from small pools of Faker values, so memory stays constant.
+
+    The generators are endless and lazy, take what is needed with `take` or `batched`. The namespace also carries the
+    worker id when ran in parallel, give a fresh namespace per run when the database is not wiped."""
+    def __init__(self, seed: int = DEFAULT_SEED, namespace: str = ''):
+        self.seed = seed
+        self.namespace = commons.namespaced(namespace, '-').strip('-')
+        self.random = random.Random(seed)
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.firstNames = [fake.first_name() for _ in range(POOL_SIZE)]
+        self.lastNames = [fake.last_name() for _ in range(POOL_SIZE)]
+        self.companies = [fake.company() for _ in range(POOL_SIZE)]
+        self._counter = itertools.count()
+        # Shared by every contacts() generator of the factory, so numbers stay unique across calls
+        self._phones = itertools.count()
+
+    def _suffix(self):
+        return '-'.join(filter(None, [to_base36(next(self._counter)), self.namespace]))
+
+    def _unique(self, base: str, separator: str = ' '):
+        "Appends a unique suffix to base, trimming base so the result fits MAX_NAME_LENGTH"
+        suffix = self._suffix()
+        base = base[:MAX_NAME_LENGTH - len(suffix) - len(separator)].rstrip()
+        return '%s%s%s' % (base, separator, suffix)
+
+    def _hex(self, length: int = 8):
+        return '%0*x' % (length*2, self.random.getrandbits(length*8))
+
+    def name(self):
+        return self._unique('%s %s' % (self.random.choice(self.firstNames), self.random.choice(self.lastNames)))
+
+    def company(self):
+        return self._unique(self.random.choice(self.companies))
+
+    def names(self) -> Iterator[str]:
+        while True:
+            yield self.name()
+
+    def contacts(self) -> Iterator[Dict]:
+        "Email and phone number pairs, the phone numbers are unique for the first 10^11 contacts of a factory"
+        for idx in self._phones:
+            userName = '%s%s' % (self.random.choice(self.firstNames), self.random.choice(self.lastNames))
+            yield {'email': '%s@example.com' % self._unique(userName.lower(), '.').replace(' ', ''),
+                   'phone_number': '08%011d' % (idx % 10**11)}
+
+    def users(self, role: commons.Role, organisationName: str | None = None) -> Iterator[Dict]:
+        "Inputs of /user/create, each user manages its own organisation unless organisationName is given"
+        while True:
+            yield {'username': self.name(),
+                   'password': self._hex(16),
+                   'role': role.value,
+                   'organisationName': organisationName or self.company()}
+
+    def organisations(self) -> Iterator[str]:
+        "Names of organisations, as taken by /organisation/createMany"
+        while True:
+            yield self.company()
+
+    def invitations(self, organisationIds: Sequence[str], usageQuota: int = 1, defaultQuotas: List[Dict] | None = None) -> Iterator[Dict]:
+        "Inputs of /invitation/create, spread over the organisations in turn"
+        for organisationId in itertools.cycle(organisationIds):
+            yield {'name': self._unique('invitation', '-'),
+                   'organisationId': organisationId,
+                   'usageQuota': usageQuota,
+                   'defaultQuotas': defaultQuotas or []}
+
+    def tickets(self, invitationIds: Sequence[str]) -> Iterator[Dict]:
+        "Inputs of /ticket/create, spread over the invitations in turn"
+        contacts = self.contacts()
+        for invitationId in itertools.cycle(invitationIds):
+            yield {'ownerName': self.name(), 'ownerContacts': next(contacts), 'invitationId': invitationId}
+
+
+
+class Replayable:
+    """The first `count` records of a generator of a fresh factory, e.g. `Replayable(lambda factory: factory.tickets(ids), 10**6)`.
+
+    Lazy like the generators, but every iteration yields the exact same records, so a streamed upload of them can be
+    sent again (see commons.ImportBody). Each instance gets a namespace of its own."""
+    def __init__(self, records: Callable[[Factory], Iterator[Dict]], count: int, seed: int = DEFAULT_SEED):
+        self.records = records
+        self.count = count
+        self.seed = seed
+        self.namespace = secrets.token_hex(3)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return itertools.islice(self.records(Factory(self.seed, self.namespace)), self.count)
+
+# Used by the test suite, namespaced per run as the suite does not wipe the database
+DEFAULT_FACTORY = Factory(namespace=secrets.token_hex(3))
@@ -0,0 +1,112 @@
+import time
+import asyncio
+import argparse
+from typing import Dict, List
+
+import commons
+import benchmark
+from traffic import AUTH_PATHS, UUID_PATTERN, find_uuids, read_log, split_sessions
+from server_timing import endpoint_of
+
+
+class Replayer:
+    """Re-issues the traffic recorded with --record-traffic (see traffic.TrafficLog).
+
+    Every recorded session is replayed by its own AsyncSession, logged in with the credentials given for its role.
+    Requests of a session are sent in their recorded order, each waits for the previous one and for its own recorded
+    time (divided by `speed`), so causal order within a session is kept while sessions interleave as they did. At most
+    `concurrency` requests are in flight at once. UUIDs of records created while recording are substituted by the ones
+    created while replaying, as far as the responses line up."""
+    def __init__(self, entries: List[Dict], credentials: Dict[int, Dict], speed: float = 1.0, concurrency: int = 100):
+        # Authentication is handled by the replaying sessions themselves
+        self.sessions = split_sessions([entry for entry in entries if entry['p'].split('?')[0] not in AUTH_PATHS])
+        self.credentials = credentials
+        self.speed = speed
+        self.concurrency = concurrency
+        self.idMap: Dict[str, str] = {}
+        self._replayedIds = set()
+        self.results: List[tuple] = []
+
+    def _substitute(self, value):
+        # A single scan per string whatever the count of ids, the recorded ids are UUIDs found by the same pattern
+        if isinstance(value, str):
+            return UUID_PATTERN.sub(lambda match: self.idMap.get(match.group(0), match.group(0)), value)
+        if isinstance(value, list):
+            return [self._substitute(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._substitute(item) for key, item in value.items()}
+        return value
+
+    def _map_ids(self, entry: Dict, res):
+        recordedIds = [uuid for uuid in entry.get('ids', []) if uuid not in self.idMap]
+        if not recordedIds or 'json' not in res.headers.get('Content-Type', ''): return
+        replayedIds = [uuid for uuid in find_uuids(res.text) if uuid not in self._replayedIds]
+        if len(recordedIds) == len(replayedIds):
+            self.idMap.update(zip(recordedIds, replayedIds))
+            self._replayedIds.update(replayedIds)
+
+    async def _replay_session(self, entries: List[Dict], start: float, semaphore: asyncio.Semaphore):
+        role = max(entry['r'] for entry in entries) # requests sent while logging in are recorded without a role
+        async with commons.AsyncSession(credentials=self.credentials.get(role), poolSize=1, concurrency=1) as session:
+            for entry in entries:
+                delay = start + entry['t']/self.speed - time.perf_counter()
+                if delay > 0: await asyncio.sleep(delay)
+                async with semaphore:
+                    res = await session.request_path(entry['m'], self._substitute(entry['p']), params=self._substitute(entry.get('q')), json=self._substitute(entry.get('b')))
+                self._map_ids(entry, res)
+                self.results.append((entry, res))
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*[self._replay_session(entries, start, semaphore) for entries in self.sessions.values()])
+        return time.perf_counter() - start
+
+    def summary(self, wallTime: float):
+        "Latency summary per endpoint, along with the requests whose status differs from the recorded one"
+        perEndpoint: Dict[str, List] = {}
+        for entry, res in self.results:
+            perEndpoint.setdefault(endpoint_of(entry['m'], entry['p']), []).append(res)
+        mismatches = [(entry, res) for entry, res in self.results if (entry['st'] < 400) != res.ok]
+        return {name: benchmark.summarize(responses, wallTime) for name, responses in perEndpoint.items()}, mismatches
+
+
+def create_accounts(superuser: commons.Session, roles: List[int]):
+    "Users to replay the sessions of each role with, the superuser replays its own sessions"
+    credentials = {int(commons.Role.SUPER_ADMIN): commons.SUPERUSER_CREDENTIALS}
+    users = []
+    for role in roles:
+        if role in credentials or role == commons.Role.PUBLIC: continue
+        jsonData = commons.generate_create_user_input(role=commons.Role(role))
+        res = superuser.request_path('POST', '/user/create', json=jsonData)
+        assert res.ok, res
+        users.append(res.json()['user'])
+        credentials[role] = {'username': jsonData['username'], 'password': jsonData['password']}
+    return credentials, users
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replays traffic recorded by `python -m pytest --record-traffic <log>` against the backend at %s' % commons.BASE_URL)
+    parser.add_argument('log')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed, e.g. 10 replays 10 times faster than recorded.')
+    parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once.')
+    args = parser.parse_args()
+
+    entries = list(read_log(args.log))
+    superuser = commons.Session(credentials=commons.SUPERUSER_CREDENTIALS)
+    credentials, users = create_accounts(superuser, sorted({entry['r'] for entry in entries}))
+    try:
+        replayer = Replayer(entries, credentials, speed=args.speed, concurrency=args.concurrency)
+        wallTime = asyncio.run(replayer.run())
+        summaries, mismatches = replayer.summary(wallTime)
+    finally:
+        superuser.request_path('DELETE', '/user/deleteMany', json={'UUIDs': [user['UUID'] for user in users]})
+        superuser.logout()
+
+    print('Replayed %d requests of %d sessions in %.1fs (%.0fx)' % (len(replayer.results), len(replayer.sessions), wallTime, args.speed))
+    for name, summary in sorted(summaries.items(), key=lambda item: -item[1]['p95']):
+        print('%-45s %6d  p50 %8.1fms  p95 %8.1fms  p99 %8.1fms  errors %d' % (name, summary['count'], summary['p50'], summary['p95'], summary['p99'], summary['errors']))
+    if mismatches:
+        print('%d requests got a different outcome than recorded, e.g.:' % len(mismatches))
+        for entry, res in mismatches[:10]:
+            print('  %s %s: recorded %s, replayed %s' % (entry['m'], entry['p'], entry['st'], res.status_code))
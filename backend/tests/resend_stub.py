@@ -0,0 +1,147 @@
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from typing import Dict, List
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_PORT = 3010
+
+
+class ResendStub:
+    """A local stand-in for the endpoints of the Resend API used by the backend (GET /domains, POST /emails and
+    POST /emails/batch), the backend uses it when started with RESEND_BASE_URL pointing at it.
+
+    Every accepted email is recorded along with the id it was given. `latency` (seconds per request) and
+    `latencyPerEmail` (seconds per email of a request) delay the responses, `failureRate` is the chance of a request
+    failing with a 500, `failNext` makes the next requests fail regardless."""
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, domain: str = 'example.com',
+                 latency: float = 0, latencyPerEmail: float = 0, failureRate: float = 0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.domain = domain
+        self.latency = latency
+        self.latencyPerEmail = latencyPerEmail
+        self.failureRate = failureRate
+        self.failNext = 0
+        self.random = random.Random(seed)
+        self.emails: List[Dict] = []
+        self.requests: List[Dict] = []
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % (self.host, self.port)
+
+    def start(self):
+        stub = self
+        class Handler(StubRequestHandler):
+            pass
+        Handler.stub = stub
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is None: return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset(self, **config):
+        "Forgets every recorded request, config overrides latency, latencyPerEmail, failureRate or failNext"
+        with self._lock:
+            self.emails.clear()
+            self.requests.clear()
+            self.failNext = 0
+            for key, value in config.items():
+                setattr(self, key, value)
+
+    def sent_to(self, address: str):
+        "Recorded emails addressed to address"
+        with self._lock:
+            return [email for email in self.emails if address in email.get('to', [])]
+
+    def _should_fail(self):
+        with self._lock:
+            if self.failNext:
+                self.failNext -= 1
+                return True
+            return self.random.random() < self.failureRate
+
+    def handle(self, method: str, path: str, body):
+        "Returns the status and the json payload answering a request"
+        emails = body if isinstance(body, list) else [body]
+        with self._lock:
+            self.requests.append({'method': method, 'path': path, 'at': time.time(), 'size': len(emails)})
+
+        if method == 'GET' and path == '/domains':
+            return 200, {'data': [{'id': str(uuid.uuid4()), 'name': self.domain, 'status': 'verified', 'region': 'us-east-1'}]}
+        if method == 'GET' and path == '/_stub/emails':
+            with self._lock:
+                return 200, {'data': list(self.emails)}
+        if method != 'POST' or path not in ['/emails', '/emails/batch']:
+            return 404, {'statusCode': 404, 'name': 'not_found', 'message': 'Route not found'}
+
+        time.sleep(self.latency + self.latencyPerEmail*len(emails))
+        if self._should_fail():
+            return 500, {'statusCode': 500, 'name': 'internal_server_error', 'message': 'Injected failure'}
+
+        created = [{**email, 'id': str(uuid.uuid4())} for email in emails]
+        with self._lock:
+            self.emails.extend(created)
+        if path == '/emails':
+            return 200, {'id': created[0]['id']}
+        return 200, {'data': [{'id': email['id']} for email in created]}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    stub: ResendStub
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'null')
+        status, payload = self.stub.handle(self.command, self.path.split('?')[0], body)
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the Resend stand-in, start the backend with RESEND_BASE_URL=http://<host>:<port>')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every request.')
+    parser.add_argument('--latency-per-email', type=float, default=0, help='Seconds added per email of a request.')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Chance of a request failing, 0.1 = 10%%.')
+    args = parser.parse_args()
+
+    stub = ResendStub(args.host, args.port, latency=args.latency, latencyPerEmail=args.latency_per_email, failureRate=args.failure_rate)
+    print('Resend stub listening on %s' % stub.url)
+    stub.start()
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,84 @@
+import re
+import json
+import threading
+from typing import Dict
+
+
+# Path segments which identify a record, replaced so requests are grouped per endpoint
+ID_SEGMENT = re.compile(r'/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)')
+
+
+def endpoint_of(method: str, path: str):
+    "e.g. ('GET', '/ticket/info/<uuid>?x=1') -> 'GET /ticket/info/:UUID'"
+    return '%s %s' % (method.upper(), ID_SEGMENT.sub('/:UUID', path.split('?')[0]))
+
+
+def parse_server_timing(header: str):
+    "Parses a Server-Timing header into (name, duration in ms, description) tuples"
+    metrics = []
+    for metric in filter(None, (part.strip() for part in header.split(','))):
+        name, *params = [param.strip() for param in metric.split(';')]
+        duration, description = 0.0, ''
+        for param in params:
+            key, _, value = param.partition('=')
+            if key == 'dur': duration = float(value)
+            elif key == 'desc': description = value.strip('"')
+        metrics.append((name, duration, description))
+    return metrics
+
+
+class ServerTimingCollector:
+    """Aggregates the Server-Timing headers of responses per endpoint (backend started with ENABLE_SERVER_TIMING=1).
+
+    Each endpoint gets a breakdown per metric, e.g. 'db:Ticket.aggregate', 'log:Create Ticket', 'auth' or 'total', with
+    the count of requests and the total, mean and max of the time spent, a metric measured several times during a
+    single request (e.g. two queries of the same kind) adds up within that request."""
+    def __init__(self):
+        self.enabled = False
+        self.endpoints: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, path: str, header: str | None):
+        if not self.enabled or not header: return
+        perRequest: Dict[str, float] = {}
+        for name, duration, description in parse_server_timing(header):
+            key = '%s:%s' % (name, description) if description else name
+            perRequest[key] = perRequest.get(key, 0.0) + duration
+
+        with self._lock:
+            endpoint = self.endpoints.setdefault(endpoint_of(method, path), {'requests': 0, 'metrics': {}})
+            endpoint['requests'] += 1
+            for key, duration in perRequest.items():
+                metric = endpoint['metrics'].setdefault(key, {'count': 0, 'total': 0.0, 'max': 0.0})
+                metric['count'] += 1
+                metric['total'] += duration
+                metric['max'] = max(metric['max'], duration)
+
+    def breakdown(self):
+        "Returns the endpoints with the mean of each metric, slowest metrics first"
+        result = {}
+        with self._lock:
+            for name, endpoint in self.endpoints.items():
+                metrics = {key: {**metric, 'mean': metric['total']/metric['count']} for key, metric in endpoint['metrics'].items()}
+                result[name] = {'requests': endpoint['requests'],
+                                'metrics': dict(sorted(metrics.items(), key=lambda item: -item[1]['total']))}
+        return result
+
+    def summary_lines(self, top: int = 10):
+        "Human readable lines of the endpoints with the highest mean total time"
+        breakdown = self.breakdown()
+        endpoints = sorted(breakdown.items(), key=lambda item: -item[1]['metrics'].get('total', {}).get('mean', 0.0))
+        lines = []
+        for name, endpoint in endpoints[:top]:
+            lines.append('%s (%d requests)' % (name, endpoint['requests']))
+            for key, metric in endpoint['metrics'].items():
+                lines.append('  %-50s mean %8.2fms  max %8.2fms  (%d)' % (key, metric['mean'], metric['max'], metric['count']))
+        return lines
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.breakdown(), f, indent=2)
+
+    def clear(self):
+        with self._lock:
+            self.endpoints.clear()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import random
+import asyncio
+import statistics
+from datetime import timedelta
+from typing import Callable, Dict, List, Tuple
+
+import commons
+import benchmark
+from commons import PreparedTestRequest
+
+
+# Metrics of a sample which should stay flat over a soak run
+TRACKED_METRICS = ['rss', 'data', 'fds', 'dbConnections', 'p50', 'p95', 'loopLag']
+
+
+def _socket_inodes(pid: int):
+    inodes = set()
+    for fd in os.listdir('/proc/%d/fd' % pid):
+        try:
+            target = os.readlink('/proc/%d/fd/%s' % (pid, fd))
+        except OSError: # closed meanwhile
+            continue
+        if target.startswith('socket:['):
+            inodes.add(target[8:-1])
+    return inodes
+
+
+def _tcp_sockets(pid: int | str = 'self'):
+    "Yields (local port, remote port, state, inode) of the tcp sockets in the network namespace of pid"
+    for name in ['tcp', 'tcp6']:
+        path = '/proc/%s/net/%s' % (pid, name)
+        if not os.path.exists(path): continue
+        with open(path) as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                yield int(fields[1].rsplit(':', 1)[1], 16), int(fields[2].rsplit(':', 1)[1], 16), fields[3], fields[9]
+
+
+def find_listening_pid(port: int):
+    "Pid of the process listening on the tcp port, None when it is not visible from here"
+    LISTEN = '0A'
+    inodes = {inode for localPort, _, state, inode in _tcp_sockets() if localPort == port and state == LISTEN}
+    if not inodes: return None
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit(): continue
+        try:
+            if inodes & _socket_inodes(int(entry)): return int(entry)
+        except (PermissionError, FileNotFoundError):
+            continue
+    return None
+
+
+class ProcessSampler:
+    """Samples a local process through /proc: resident memory (`rss`) and its peak so far (`peak`), data segment (`data`,
+    where the V8 heap lives, so it follows heap growth), open file descriptors and established connections to the
+    database port."""
+    def __init__(self, pid: int, dbPort: int = 5432):
+        self.pid = pid
+        self.dbPort = dbPort
+
+    def sample(self):
+        status = {}
+        with open('/proc/%d/status' % self.pid) as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                status[key] = value.strip()
+        ESTABLISHED = '01'
+        inodes = _socket_inodes(self.pid)
+        dbConnections = sum(1 for _, remotePort, state, inode in _tcp_sockets(self.pid) if remotePort == self.dbPort and state == ESTABLISHED and inode in inodes)
+        return {'rss': int(status['VmRSS'].split()[0]), # kB
+                'peak': int(status['VmHWM'].split()[0]), # kB
+                'data': int(status['VmData'].split()[0]), # kB
+                'fds': len(os.listdir('/proc/%d/fd' % self.pid)),
+                'dbConnections': dbConnections}
+
+
+def detect_growth(samples: List[Dict], metric: str, windows: int = 6, threshold: float = 0.1):
+    """Flags a metric growing through the whole run: the medians of consecutive windows of samples never decrease and
+    the last window is more than `threshold` (0.1 = 10%) above the first. Returns a description or None."""
+    values = [sample[metric] for sample in samples if sample.get(metric) is not None]
+    if len(values) < windows*2: return None
+    size = len(values)//windows
+    medians = [statistics.median(values[idx*size:(idx+1)*size]) for idx in range(windows)]
+    if not medians[0]: return None
+    growth = medians[-1]/medians[0] - 1
+    if all(a <= b for a, b in zip(medians, medians[1:])) and growth > threshold:
+        return '%s grew %.1f%% monotonically (window medians: %s)' % (metric, growth*100, ', '.join('%g' % median for median in medians))
+    return None
+
+
+class SoakRunner:
+    """Drives a steady, weighted mix of requests at `rate` requests per second for `duration` seconds, and takes a
+    sample every `interval` seconds: latency of the requests sent since the previous sample, the latency of a trivial
+    route which does not touch the database (`loopLag`, a proxy of event loop delay) and, when the backend runs
+    locally, the metrics of its process (see ProcessSampler).
+
+    The `loopLag` probe goes through a session of its own, a single kept-alive connection, so it never waits for a
+    connection or a concurrency slot of the load: its latency is the backend's, not the harness' queueing."""
+    def __init__(self, mix: List[Tuple[float, PreparedTestRequest, Callable[[], dict]]], duration: float, interval: float,
+                 rate: float, sampler: ProcessSampler | None = None, credentials: Dict | None = None, output: str | None = None):
+        self.mix = mix
+        self.duration = duration
+        self.interval = interval
+        self.rate = rate
+        self.sampler = sampler
+        self.credentials = credentials
+        self.output = output
+        self.samples: List[Dict] = []
+        self._window: List = []
+        self.random = random.Random(0)
+
+    async def _send(self, session: commons.AsyncSession, semaphore: asyncio.Semaphore):
+        request, kwargsFactory = self.random.choices([(request, factory) for _, request, factory in self.mix], weights=[weight for weight, _, _ in self.mix])[0]
+        start = time.perf_counter()
+        try:
+            self._window.append(await request.execute_async(_with=session, **kwargsFactory()))
+        except Exception as e: # timeouts and dropped connections count as errors
+            self._window.append(commons.AsyncResponse(599, {}, str(e).encode(), timedelta(seconds=time.perf_counter()-start)))
+        finally:
+            semaphore.release()
+
+    async def _sample(self, probeSession: commons.AsyncSession, start: float):
+        probe = await probeSession.request_path('GET', '/user/roles')
+        window, self._window = self._window, []
+        summary = benchmark.summarize(window, self.interval)
+        sample = {'at': round(time.perf_counter() - start, 1), 'requests': summary['count'], 'errors': summary['errors'],
+                  'p50': summary['p50'], 'p95': summary['p95'], 'loopLag': probe.elapsed.total_seconds()*1000}
+        if self.sampler is not None:
+            sample.update(self.sampler.sample())
+        self.samples.append(sample)
+        if self.output:
+            with open(self.output, 'a') as f:
+                f.write(json.dumps(sample) + '\n')
+
+    async def run(self):
+        # Requests which are not done in time are not piled up indefinitely, the rate drops instead
+        semaphore = asyncio.Semaphore(max(1, int(self.rate*10)))
+        async with commons.AsyncSession(credentials=self.credentials, poolSize=100, concurrency=100) as session, \
+                   commons.AsyncSession(credentials=self.credentials, poolSize=1, concurrency=1) as probeSession:
+            start = time.perf_counter()
+            nextSample = start + self.interval
+            sent = 0
+            tasks = set()
+            while (now := time.perf_counter()) - start < self.duration:
+                if now >= nextSample:
+                    await self._sample(probeSession, start)
+                    nextSample += self.interval
+                await semaphore.acquire()
+                task = asyncio.create_task(self._send(session, semaphore))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sent += 1
+                delay = start + sent/self.rate - time.perf_counter()
+                if delay > 0: await asyncio.sleep(delay)
+            await asyncio.gather(*tasks)
+            await self._sample(probeSession, start)
+        return self.samples
+
+    def growths(self, threshold: float = 0.1):
+        return list(filter(None, (detect_growth(self.samples, metric, threshold=threshold) for metric in TRACKED_METRICS)))
@@ -0,0 +1,173 @@
+import time
+import uuid
+import asyncio
+import statistics
+import pytest
+import commons
+import benchmark
+from commons import PreparedTestRequest
+from dataset import generate_ticket_input
+from server_timing import parse_server_timing
+
+import test_ticket
+import test_quota
+import test_invitation
+import test_organisation
+import test_event
+
+
+pytestmark = pytest.mark.benchmark
+
+# Concurrent ticket creations racing for the same invitation, as when registration opens
+CONTENTION_LEVELS = [1, 10, 100]
+
+
+class Endpoint:
+    render_ticket = '/render/ticket/%s'
+    render_stats = '/render/stats'
+
+class Test:
+    render_ticket = PreparedTestRequest("GET", Endpoint.render_ticket)
+    render_stats = PreparedTestRequest("GET", Endpoint.render_stats)
+
+# /event may be this much slower (p95) while /render is saturated, or RENDER_LOAD_SLACK ms if that is more
+RENDER_LOAD_FACTOR = 3
+RENDER_LOAD_SLACK = 50
+
+
+async def run_benchmark(recorder, request, concurrency: int | None = None, **kwargs):
+    concurrency = concurrency or recorder.concurrency
+    async with commons.AsyncSession(credentials=commons.SUPERUSER_CREDENTIALS, poolSize=concurrency, concurrency=concurrency) as session:
+        return await benchmark.measure(request, recorder.size, _with=session, **kwargs)
+
+
+def db_operations(res):
+    "Database operations ran for the request, as reported by the Server-Timing header (backend started with ENABLE_SERVER_TIMING=1)"
+    header = res.headers.get('Server-Timing')
+    if header is None: return None
+    return sum(1 for name, _, _ in parse_server_timing(header) if name == 'db')
+
+
+def check(recorder, name, responses, summary):
+    failed = [res for res in responses if not res.ok]
+    assert not failed, (name, failed[:5])
+    regressions = recorder.record(name, summary)
+    assert not regressions, regressions
+
+
+@pytest.fixture(scope="module")
+def benchmark_dataset(module_dataset, benchmark_recorder):
+    "An organisation with `size` tickets, each with a single consumable quota, and a spare invitation for ticket creation"
+    size = benchmark_recorder.size
+    [organisation] = module_dataset.create_organisations(1)
+    [quota_type] = module_dataset.create_quota_types(1)
+    seeded, spare = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 
+                                                        'usageQuota': size, 
+                                                        'defaultQuotas': [{'quotaTypeId': quota_type['UUID'], 'value': 1}]}]*2)
+    tickets = module_dataset.create_tickets([seeded['UUID']]*size)
+    
+    yield {'organisation': organisation, 'quotaType': quota_type, 'invitations': {'seeded': seeded, 'create': spare}, 'tickets': tickets}
+    # Deletion handled by module_dataset fixture
+
+
+def test_ticket_create(benchmark_recorder, benchmark_dataset):
+    invitationId = benchmark_dataset['invitations']['create']['UUID']
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_ticket.Test.create, _factory=lambda _: {'json': generate_ticket_input(invitationId)}))
+    check(benchmark_recorder, 'POST /ticket/create', responses, summary)
+
+
+
+@pytest.mark.parametrize('concurrency', CONTENTION_LEVELS)
+def test_ticket_create_contention(benchmark_recorder, benchmark_dataset, module_dataset, report, concurrency):
+    [invitation] = module_dataset.create_invitations([{'organisationId': benchmark_dataset['organisation']['UUID'], 
+                                                       'usageQuota': benchmark_recorder.size, 
+                                                       'defaultQuotas': [{'quotaTypeId': benchmark_dataset['quotaType']['UUID'], 'value': 1}]}])
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_ticket.Test.create, concurrency=concurrency, 
+                                                   _factory=lambda _: {'json': generate_ticket_input(invitation['UUID'])}))
+    operations = [count for count in map(db_operations, responses) if count is not None]
+    if operations: summary['dbOperations'] = statistics.mean(operations)
+    report("POST /ticket/create, %3d concurrent: p50 %.1fms, p95 %.1fms, %.0f tickets/s%s" % (
+        concurrency, summary['p50'], summary['p95'], summary['throughput'], 
+        ', %.1f db operations per ticket' % summary['dbOperations'] if operations else ''))
+    check(benchmark_recorder, 'POST /ticket/create (%d concurrent)' % concurrency, responses, summary)
+
+
+# The same tickets as /ticket/create, uploaded at once: throughput is comparable with the creation benchmarks above
+@pytest.mark.parametrize('format', ['ndjson', 'csv'])
+def test_ticket_import(benchmark_recorder, benchmark_dataset, module_dataset, report, format):
+    count = benchmark_recorder.size*10
+    [invitation] = module_dataset.create_invitations([{'organisationId': benchmark_dataset['organisation']['UUID'], 
+                                                       'usageQuota': count, 
+                                                       'defaultQuotas': [{'quotaTypeId': benchmark_dataset['quotaType']['UUID'], 'value': 1}]}])
+    start = time.perf_counter()
+    result = module_dataset.import_tickets(invitation['UUID'], count, format)
+    wallTime = time.perf_counter() - start
+    assert result['created'] == count, result['errors'][:5]
+    
+    summary = {'count': count, 'errors': result['failed'], 'wallTime': wallTime, 'throughput': count/wallTime}
+    report("POST /ticket/import/:invitationId (%s): %d tickets in %.2fs, %.0f tickets/s" % (format, count, wallTime, summary['throughput']))
+    benchmark_recorder.record('POST /ticket/import/:invitationId (%s)' % format, summary)
+
+def test_ticket_public(benchmark_recorder, benchmark_dataset):
+    tickets = benchmark_dataset['tickets']
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_ticket.Test.public, _factory=lambda idx: {'_path_formats': tickets[idx%len(tickets)]['UUID']}))
+    check(benchmark_recorder, 'GET /ticket/public/:UUID', responses, summary)
+
+
+def test_render_ticket(benchmark_recorder, benchmark_dataset):
+    tickets = benchmark_dataset['tickets']
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, Test.render_ticket, _factory=lambda idx: {'_path_formats': tickets[idx%len(tickets)]['UUID']}))
+    check(benchmark_recorder, 'GET /render/ticket/:UUID', responses, summary)
+
+
+async def event_under_render_load(recorder):
+    """Measures /event while /render/ticket/:UUID is flooded with UUIDs never rendered before, so that every render
+    misses the cache and keeps the worker pool busy (unknown UUIDs are not cached, see utils/qrImages). Returns the /event responses and summary, and the render responses."""
+    concurrency = recorder.concurrency
+    async with commons.AsyncSession(poolSize=concurrency, concurrency=concurrency) as flood, \
+               commons.AsyncSession(poolSize=concurrency, concurrency=concurrency) as session:
+        renders = asyncio.ensure_future(Test.render_ticket.fan_out(recorder.size*10, _with=flood, _factory=lambda _: {'_path_formats': str(uuid.uuid4())}))
+        await asyncio.sleep(0.5) # Lets the flood fill the pool
+        responses, summary = await benchmark.measure(test_event.Test.base, recorder.size, _with=session)
+        return responses, summary, await renders
+
+
+def test_event_info_under_render_load(benchmark_recorder, superuser, report):
+    "The landing page keeps its latency while QR codes are rendered, as the rendering is off the event loop"
+    _, baseline = asyncio.run(run_benchmark(benchmark_recorder, test_event.Test.base))
+    before = Test.render_stats.x(_with=superuser).json()['pool']
+    responses, summary, renders = asyncio.run(event_under_render_load(benchmark_recorder))
+    after = Test.render_stats.x(_with=superuser).json()['pool']
+
+    # A full pool queue answers 503, any other failure is one
+    assert all(res.ok or res.status_code == 503 for res in renders), [res for res in renders if not res.ok][:5]
+    rendered = after['completed'] - before['completed']
+    report("GET /event under /render load: p95 %.1fms (%.1fms unloaded), %d renders (%d rejected), %.1fms mean pool wait" % (
+        summary['p95'], baseline['p95'], rendered, after['rejected'] - before['rejected'],
+        (after['waitTime'] - before['waitTime'])/rendered if rendered else 0.0))
+    check(benchmark_recorder, 'GET /event (under /render load)', responses, summary)
+    if after['size'] > 0:
+        assert summary['p95'] <= max(baseline['p95']*RENDER_LOAD_FACTOR, baseline['p95'] + RENDER_LOAD_SLACK), (summary, baseline)
+
+
+def test_organisation_info(benchmark_recorder, benchmark_dataset):
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_organisation.Test.info, _path_formats=benchmark_dataset['organisation']['UUID']))
+    check(benchmark_recorder, 'GET /organisation/info/:UUID', responses, summary)
+
+
+def test_invitation_public(benchmark_recorder, benchmark_dataset):
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_invitation.Test.public, _path_formats=benchmark_dataset['invitations']['seeded']['UUID']))
+    check(benchmark_recorder, 'GET /invitation/public/:UUID', responses, summary)
+
+
+def test_event_info(benchmark_recorder):
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_event.Test.base))
+    check(benchmark_recorder, 'GET /event', responses, summary)
+
+
+# Exhausts every seeded quota, hence ran last
+def test_quota_consume(benchmark_recorder, benchmark_dataset):
+    quotas = [quota for ticket in benchmark_dataset['tickets'] for quota in ticket['quotas']]
+    assert len(quotas) >= benchmark_recorder.size
+    responses, summary = asyncio.run(run_benchmark(benchmark_recorder, test_quota.Test.consume, _factory=lambda idx: {'json': {'UUID': quotas[idx]['UUID']}}))
+    check(benchmark_recorder, 'POST /quota/consume', responses, summary)
@@ -29,45 +29,12 @@ def defaults_store():
 
 
 @pytest.fixture(scope="module")
-def quota_types(superuser):
-    quota_types_store = []
+def invitations(manager_sessions, module_dataset):
+    generated_invitations = [{'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1000} for client in manager_sessions]
+    created_invitations = module_dataset.create_invitations(generated_invitations)
     
-    quota_type_create_route = PreparedTestRequest("POST", '/quotaType/create')
-    quota_type_delete_route = PreparedTestRequest("DELETE", '/quotaType/delete')
-    for _ in range(20):
-        jsonData = {'name': commons.generate_random_hex(randomLength=8)}
-        res = quota_type_create_route(_with=superuser, json=jsonData)
-        assert res.ok
-        jsonData.update(res.json()['quotaType'])
-        quota_types_store.append(jsonData.copy())
-    
-    yield quota_types_store
-    
-    for quota_type in quota_types_store:
-        res2 = quota_type_delete_route(_with=superuser, json=quota_type)
-        assert res2.ok
-
-
-@pytest.fixture(scope="module")
-def invitations(manager_sessions, superuser):
-    invitations_store = {}
-    
-    invitation_create_route = PreparedTestRequest("POST", '/invitation/create')
-    invitation_delete_route = PreparedTestRequest("DELETE", '/invitation/delete')
-    
-    for client in manager_sessions:
-        client_role = commons.Role(client.info['role'])
-        generated_invitation = {'name': commons.generate_random_hex(randomLength=8), 'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1000}
-        res1 = invitation_create_route.x(_with=client, json=generated_invitation)
-        assert res1.ok
-        generated_invitation.update(res1.json()['invitation'])
-        invitations_store[client_role] = generated_invitation
-    
-    yield invitations_store
-    
-    for invitation in invitations_store.values():
-        res3 = invitation_delete_route.x(_with=superuser, json=invitation)
-        assert res3.ok
+    yield {commons.Role(client.info['role']): invitation for client, invitation in zip(manager_sessions, created_invitations)}
+    # Deletion handled by module_dataset fixture
 
 
 @pytest.fixture(scope="module")
@@ -76,12 +43,11 @@ def ticket(superuser):
     
     ticket_create_route = PreparedTestRequest("POST", '/ticket/create')
     ticket_info_route = PreparedTestRequest("POST", '/ticket/info/%s')
-    ticket_delete_route = PreparedTestRequest("POST", '/ticket/delete')
     
     class Ticket:
         @staticmethod
         def create(invitationId):
-            jsonData = {'ownerName': commons.FAKE.unique.name(), 
+            jsonData = {'ownerName': commons.generate_unique_name(), 
                         'ownerContacts': {'email': commons.FAKE.unique.email(), 'phone_number': commons.FAKE.unique.msisdn()}, 
                         'invitationId': invitationId}
             res = ticket_create_route.x(_with=superuser, json=jsonData)
@@ -97,9 +63,7 @@ def ticket(superuser):
             return res.json()['ticket']
     
     yield Ticket
-    
-    for ticket in created_tickets:
-        res = ticket_delete_route.x(_with=superuser, json=ticket)
+    # Deletion cascaded from the invitations, which are handled by module_dataset fixture
 
 
 # Create
@@ -0,0 +1,226 @@
+import asyncio
+import html
+import time
+import uuid
+import pytest
+import commons
+from commons import PreparedTestRequest
+from resend_stub import ResendStub
+
+import test_ticket
+
+
+pytestmark = pytest.mark.email
+
+
+class Endpoint:
+    base = '/email'
+    auth = '%s/auth' % base
+    send_invitation = '%s/sendInvitation' % base
+    send_tickets = '%s/sendTickets' % base
+    send_ticket = '%s/sendTicket' % base
+    jobs = '%s/jobs' % base
+    job = '%s/jobs/{}' % base
+    cancel_job = '%s/jobs/{}/cancel' % base
+
+class Test:
+    auth = PreparedTestRequest("POST", Endpoint.auth)
+    send_invitation = PreparedTestRequest("POST", Endpoint.send_invitation)
+    send_tickets = PreparedTestRequest("POST", Endpoint.send_tickets)
+    send_ticket = PreparedTestRequest("POST", Endpoint.send_ticket)
+    get_jobs = PreparedTestRequest("GET", Endpoint.jobs)
+    create_job = PreparedTestRequest("POST", Endpoint.jobs)
+    get_job = PreparedTestRequest("GET", Endpoint.job)
+    cancel_job = PreparedTestRequest("POST", Endpoint.cancel_job)
+
+
+# Largest batch sent by /email/sendTickets
+BATCH_SIZE = 100
+
+
+@pytest.fixture(scope="module")
+def resend(request):
+    with ResendStub(port=request.config.getoption('resend_port')) as stub:
+        yield stub
+
+
+@pytest.fixture(scope="module")
+def authenticated(superuser, resend):
+    res = Test.auth.x(_with=superuser, json={'apiKey': 're_stub'})
+    assert res.ok, "%s, is the backend started with RESEND_BASE_URL=%s?" % (res, resend.url)
+    yield
+
+
+@pytest.fixture(scope="module")
+def invitation(superuser, module_dataset):
+    [invitation] = module_dataset.create_invitations([{'organisationId': superuser.info['organisationManaged']['UUID'], 'usageQuota': 100000}])
+    yield invitation
+    # Deletion handled by module_dataset fixture
+
+
+def send_all_tickets(client, resend, tickets):
+    "Calls /email/sendTickets until every ticket got mailed or nothing is left, returns the elapsed seconds"
+    pending = {ticket['ownerContacts']['email'] for ticket in tickets}
+    start = time.perf_counter()
+    while pending:
+        res = Test.send_tickets.x(_with=client, json={'limit': BATCH_SIZE})
+        if not res.ok: break
+        pending -= {address for email in resend.emails[-BATCH_SIZE:] for address in email['to']}
+    return time.perf_counter() - start
+
+
+def wait_for_job(client, UUID, timeout=120):
+    "Polls the mail job until it is no longer running, returns it"
+    deadline = time.monotonic() + timeout
+    while True:
+        res = Test.get_job.x(_with=client, _path_formats=UUID)
+        assert res.ok, res
+        job = res.json()['job']
+        if job['status'] != 'running' or time.monotonic() > deadline:
+            return job
+        time.sleep(0.2)
+
+
+def assert_sent_email(client, resend, ticket):
+    "The id Resend gave to the email of the ticket is written back to the ticket"
+    [email] = resend.sent_to(ticket['ownerContacts']['email'])
+    res = test_ticket.Test.info.x(_with=client, _path_formats=ticket['UUID'])
+    assert res.ok, res
+    assert res.json()['ticket']['sentEmail'] == email['id'], (ticket, email)
+    assert html.escape(ticket['ownerName']) in email['html']
+    assert '/ticket/%s' % ticket['UUID'] in email['html']
+
+
+def test_auth(all_sessions, resend, subtests):
+    for client in all_sessions:
+        client_role = commons.Role(client.info['role'])
+        with subtests.test(msg="'%s': Authenticating email client" % client_role.name):
+            res = Test.auth.x(_with=client, json={'apiKey': 're_stub'})
+            if client_role >= commons.Role.ADMIN:
+                assert res.ok, res
+            else:
+                assert not res.ok
+
+
+def test_send_ticket(superuser, authenticated, resend, module_dataset, invitation):
+    [ticket] = module_dataset.create_tickets([invitation['UUID']])
+    resend.reset()
+    res = Test.send_ticket.x(_with=superuser, json={'UUID': ticket['UUID']})
+    assert res.ok, res
+    assert_sent_email(superuser, resend, ticket)
+
+
+def test_send_ticket_failure(superuser, authenticated, resend, module_dataset, invitation):
+    [ticket] = module_dataset.create_tickets([invitation['UUID']])
+    resend.reset(failNext=1)
+    res = Test.send_ticket.x(_with=superuser, json={'UUID': ticket['UUID']})
+    assert not res.ok, res
+    
+    res2 = test_ticket.Test.info.x(_with=superuser, _path_formats=ticket['UUID'])
+    assert res2.json()['ticket']['sentEmail'] == ''
+
+
+def test_send_tickets_failure(superuser, authenticated, resend, module_dataset, invitation):
+    tickets = module_dataset.create_tickets([invitation['UUID']]*3)
+    resend.reset(failNext=1)
+    res = Test.send_tickets.x(_with=superuser, json={'limit': BATCH_SIZE})
+    assert not res.ok, res
+    
+    # Nothing was sent, nothing is marked as sent
+    for ticket in tickets:
+        res2 = test_ticket.Test.info.x(_with=superuser, _path_formats=ticket['UUID'])
+        assert res2.json()['ticket']['sentEmail'] == ''
+    
+    send_all_tickets(superuser, resend, tickets)
+
+
+# Mails every ticket without an email sent yet, not only the ones created here
+@pytest.mark.parametrize('latency', [0, 0.5])
+def test_send_tickets_throughput(superuser, authenticated, resend, module_dataset, invitation, report, request, latency):
+    tickets = module_dataset.create_tickets([invitation['UUID']]*request.config.getoption('email_tickets'))
+    resend.reset(latency=latency)
+    elapsed = send_all_tickets(superuser, resend, tickets)
+    
+    report("email/sendTickets resend latency=%.2fs: %d emails in %d requests, %.1fs, %.0f tickets/min" % 
+           (latency, len(resend.emails), len(resend.requests), elapsed, len(resend.emails)/elapsed*60))
+    for ticket in tickets:
+        assert_sent_email(superuser, resend, ticket)
+
+
+def test_mail_job_permissions(all_sessions, subtests):
+    for client in all_sessions:
+        client_role = commons.Role(client.info['role'])
+        with subtests.test(msg="'%s': Listing mail jobs" % client_role.name):
+            res = Test.get_jobs.x(_with=client)
+            if client_role >= commons.Role.ADMIN:
+                assert res.ok, res
+            else:
+                assert res.status_code == 403, res
+
+
+# Mails every ticket without an email sent yet, not only the ones created here
+def test_mail_job(superuser, authenticated, resend, module_dataset, invitation, report):
+    tickets = module_dataset.create_tickets([invitation['UUID']]*250)
+    resend.reset()
+    start = time.perf_counter()
+    res = Test.create_job.x(_with=superuser)
+    assert res.status_code == 201, res
+    job = wait_for_job(superuser, res.json()['job']['UUID'])
+    elapsed = time.perf_counter() - start
+
+    assert job['status'] == 'done', job
+    assert job['sent'] >= len(tickets), job
+    assert all(request['size'] <= BATCH_SIZE for request in resend.requests if request['path'] == '/emails/batch')
+    report("email/jobs: %d emails in %d requests, %.1fs" % (len(resend.emails), len(resend.requests), elapsed))
+    for ticket in tickets:
+        assert_sent_email(superuser, resend, ticket)
+
+
+def test_mail_job_retry(superuser, authenticated, resend, module_dataset, invitation):
+    tickets = module_dataset.create_tickets([invitation['UUID']]*5)
+    resend.reset(failNext=2)
+    res = Test.create_job.x(_with=superuser)
+    assert res.status_code == 201, res
+    job = wait_for_job(superuser, res.json()['job']['UUID'])
+
+    assert job['status'] == 'done', job
+    # The failed requests are retried, each ticket is still mailed once
+    for ticket in tickets:
+        assert_sent_email(superuser, resend, ticket)
+
+
+def test_mail_job_cancel(superuser, authenticated, resend, module_dataset, invitation):
+    module_dataset.create_tickets([invitation['UUID']]*300)
+    resend.reset(latency=0.5)
+
+    # A double click, or two admins at once: a single job is started
+    async def start_jobs():
+        async with commons.AsyncSession(credentials=commons.SUPERUSER_CREDENTIALS, poolSize=5, concurrency=5) as session:
+            return await Test.create_job.fan_out(5, _with=session)
+    responses = asyncio.run(start_jobs())
+    assert sorted(res.status_code for res in responses) == [201, 409, 409, 409, 409], responses
+    [UUID] = [res.json()['job']['UUID'] for res in responses if res.status_code == 201]
+
+    # sendTickets would mail the tickets of the job too
+    res = Test.send_tickets.x(_with=superuser, json={'limit': BATCH_SIZE})
+    assert res.status_code == 409, res
+
+    res = Test.cancel_job.x(_with=superuser, _path_formats=UUID)
+    assert res.ok, res
+    job = res.json()['job']
+    assert job['status'] == 'cancelled', job
+    assert job['sent'] < job['total'], job
+
+    res = Test.get_job.x(_with=superuser, _path_formats=UUID)
+    assert res.ok, res
+    assert not res.json()['active'], res.json()
+    assert res.json()['job']['sent'] == job['sent']
+
+    # The tickets left go to the next job
+    resend.reset()
+    res = Test.create_job.x(_with=superuser)
+    assert res.status_code == 201, res
+    assert wait_for_job(superuser, res.json()['job']['UUID'])['status'] == 'done'
+
+    res = Test.get_job.x(_with=superuser, _path_formats=str(uuid.uuid4()))
+    assert res.status_code == 404, res
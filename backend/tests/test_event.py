@@ -1,11 +1,19 @@
 import pytest
+import commons
 from commons import PreparedTestRequest
+from server_timing import parse_server_timing
 
 class Endpoint:
     base = '/event'
+    get = base + '/get'
+    update = base + '/update'
+    cache = base + '/cache'
 
 class Test:
     base = PreparedTestRequest("GET", Endpoint.base)
+    get = PreparedTestRequest("GET", Endpoint.get)
+    update = PreparedTestRequest("PATCH", Endpoint.update)
+    cache = PreparedTestRequest("GET", Endpoint.cache)
 
 def test_superuser_get_info(superuser):
     res = Test.base.x(_with=superuser)
@@ -22,3 +30,43 @@ def test_organisation_manager_get_info(organisation_manager):
 def test_public_get_info(public):
     res = Test.base.x(_with=public)
     assert (res.ok)
+
+
+def test_get_info_cached(superuser, public):
+    "Once cached, the landing page is served without querying the database"
+    assert Test.base.x(_with=public).ok
+    before = Test.cache.x(_with=superuser).json()['cache']
+    res = Test.base.x(_with=public)
+    assert res.ok
+    after = Test.cache.x(_with=superuser).json()['cache']
+    if before['ttl'] <= 0: pytest.skip("Config cache disabled (CONFIG_CACHE_TTL=0)")
+
+    # Per key, as other workers read and update configs meanwhile. test_update_invalidates_cache may drop
+    # event_socials between the two reads, so it is only checked to have been looked up.
+    hits = lambda stats, name: stats['keys'].get(name, {}).get('hits', 0)
+    lookups = lambda stats, name: hits(stats, name) + stats['keys'].get(name, {}).get('misses', 0)
+    assert hits(after, 'event_info') - hits(before, 'event_info') >= 1
+    assert lookups(after, 'event_socials') - lookups(before, 'event_socials') >= 1
+    header = res.headers.get('Server-Timing')
+    if header is not None:
+        assert not [name for name, _, _ in parse_server_timing(header) if name == 'db']
+
+
+def test_update_invalidates_cache(superuser, public):
+    socials = Test.get.x(_with=superuser, params={'name': 'event_socials'}).json()['config']
+    assert Test.base.x(_with=public).ok # Caches the current value
+
+    marker = commons.generate_random_hex()
+    try:
+        assert Test.update.x(_with=superuser, json={'name': 'event_socials', 'value': {**socials, 'marker': marker}}).ok
+        assert Test.base.x(_with=public).json()['event']['socials']['marker'] == marker
+    finally:
+        assert Test.update.x(_with=superuser, json={'name': 'event_socials', 'value': socials}).ok
+    assert 'marker' not in Test.base.x(_with=public).json()['event']['socials']
+
+
+def test_cache_stats_permissions(superuser, admin, organisation_manager, observer, public):
+    assert Test.cache.x(_with=superuser).ok
+    assert Test.cache.x(_with=admin).ok
+    for client in (organisation_manager, observer, public):
+        assert Test.cache.x(_with=client).status_code == 403
@@ -0,0 +1,21 @@
+from factory import Factory, take
+
+
+def records(factory: Factory, count: int = 50):
+    "Tickets generated the way generate_ticket_input does, a new generator per ticket"
+    return [next(factory.tickets(['invitation'])) for _ in range(count)]
+
+
+def test_deterministic():
+    assert records(Factory(seed=1, namespace='a')) == records(Factory(seed=1, namespace='a'))
+    assert records(Factory(seed=1, namespace='a')) != records(Factory(seed=2, namespace='a'))
+
+
+def test_unique():
+    factory = Factory(seed=1, namespace='a')
+    tickets = records(factory) + take(factory.tickets(['invitation']), 50)
+    contacts = [ticket['ownerContacts'] for ticket in tickets]
+    assert len({ticket['ownerName'] for ticket in tickets}) == len(tickets)
+    assert len({contact['email'] for contact in contacts}) == len(tickets)
+    assert len({contact['phone_number'] for contact in contacts}) == len(tickets)
+    assert len(set(take(factory.names(), 50)) | {ticket['ownerName'] for ticket in tickets}) == len(tickets) + 50
@@ -1,3 +1,6 @@
+import io
+import csv
+import json
 import pytest
 import random
 import commons
@@ -11,6 +14,7 @@ class Endpoint:
     info = '%s/info/%s' % (base, '%s')
     
     info_tickets = '%s/info/%s/tickets' % (base, '%s')
+    info_tickets_export = '%s/info/%s/tickets/export' % (base, '%s')
     info_defaults = '%s/info/%s/defaultQuotas' % (base, '%s')
     
     create = '%s/create' % (base)
@@ -25,6 +29,7 @@ class Test:
     info = PreparedTestRequest("GET", Endpoint.info)
     
     info_tickets = PreparedTestRequest("GET", Endpoint.info_tickets)
+    info_tickets_export = PreparedTestRequest("GET", Endpoint.info_tickets_export)
     info_defaults = PreparedTestRequest("GET", Endpoint.info_defaults)
     
     create = PreparedTestRequest("POST", Endpoint.create)
@@ -51,48 +56,12 @@ def tickets_store():
 
 
 @pytest.fixture(scope="module")
-def quota_types(superuser):
-    quota_types_store = []
-    
-    quota_type_create_route = PreparedTestRequest("POST", '/quotaType/create')
-    quota_type_delete_route = PreparedTestRequest("DELETE", '/quotaType/delete')
-    for _ in range(20):
-        jsonData = {'name': commons.generate_random_hex(randomLength=8)}
-        res = quota_type_create_route(_with=superuser, json=jsonData)
-        assert res.ok
-        jsonData.update(res.json()['quotaType'])
-        quota_types_store.append(jsonData.copy())
-    
-    yield quota_types_store
-    
-    for quota_type in quota_types_store:
-        res2 = quota_type_delete_route(_with=superuser, json=quota_type)
-        assert res2.ok
-
-
-@pytest.fixture(scope="module")
-def tickets_generator(superuser):
-    created_tickets = []
-    
-    ticket_create_route = PreparedTestRequest("POST", '/ticket/create')
-    ticket_delete_route = PreparedTestRequest("DELETE", '/ticket/delete')
-    
+def tickets_generator(module_dataset):
     def _creator(invitationId, count=1):
-        ress = []
-        for _ in range(count):
-            jsonData = {'ownerName': commons.FAKE.unique.name(), 
-                        'ownerContacts': {'email': commons.FAKE.unique.email(), 'phone_number': commons.FAKE.unique.msisdn()}, 
-                        'invitationId': invitationId}
-            res = ticket_create_route.x(_with=superuser, json=jsonData)
-            if res.ok:
-                created_tickets.append(res.json()['ticket'])
-            ress.append(res)
-        return ress
-
-    yield _creator
+        return module_dataset.create_tickets([invitationId]*count)
     
-    for ticket in created_tickets:
-        res = ticket_delete_route.x(_with=superuser, json=ticket)
+    yield _creator
+    # Deletion cascaded from the invitations, which are deleted by the tests or by module_dataset fixture
 
 
 # Create
@@ -121,8 +90,7 @@ def test_create(all_sessions, invitations_store, tickets_store, quota_types, sub
                 assert not res.ok
                 continue
             
-            res2_list = tickets_generator(res.json()['invitation']['UUID'], random.randint(4,10))
-            tickets_store[client_role] = [res2.json()['ticket'] for res2 in res2_list]
+            tickets_store[client_role] = tickets_generator(res.json()['invitation']['UUID'], random.randint(4,10))
             for ticket in tickets_store[client_role]:
                 assert ticket['ownerAffiliationId'] == jsonData['organisationId']
                 
@@ -150,6 +118,24 @@ def test_get_all(all_sessions, subtests):
                 continue
 
 
+# Get all, a page at a time
+def test_get_all_paginated(superuser, manager_sessions, subtests):
+    for client in manager_sessions:
+        client_role = commons.Role(client.info['role'])
+        organisationId = client.info['organisationManaged']['UUID']
+        with subtests.test(msg="'%s': Paginating invitations of an organisation" % client_role.name):
+            params = {'organisationId': organisationId, 'sort': 'usageLeft', 'order': 'desc'}
+            res = Test.base.x(_with=superuser, params={**params, **commons.ALL_ROWS})
+            assert res.ok
+            everything = res.json()['invitations']
+            assert all(invitation['organisationId'] == organisationId for invitation in everything)
+            
+            rows, _ = commons.fetch_pages(Test.base, 'invitations', superuser, params, limit=2)
+            assert [invitation['UUID'] for invitation in rows] == [invitation['UUID'] for invitation in everything]
+            usagesLeft = [invitation['usageLeft'] for invitation in rows]
+            assert usagesLeft == sorted(usagesLeft, reverse=True)
+
+
 # Get one (public)
 def test_get_one_public(all_sessions, subtests, invitations_store):
     for client in all_sessions:
@@ -204,6 +190,41 @@ def test_get_tickets(all_sessions, subtests, invitations_store):
                         assert not res.ok
 
 
+# Export createdTickets
+def test_export_tickets(all_sessions, subtests, invitations_store):
+    for client in all_sessions:
+        client_role = commons.Role(client.info['role'])
+        with subtests.test(msg="'%s': Exporting invitation's createdTickets" % client_role.name):
+            for creator_role, invitations in invitations_store.items():
+                for invitation in invitations:
+                    res = Test.info_tickets_export.x(_with=client, _path_formats=invitation['UUID'])
+                    
+                    if not (client_role >= commons.Role.ADMIN or (creator_role == client_role and client_role >= commons.Role.ORGANISATION_MANAGER)):
+                        assert not res.ok
+                        continue
+                    
+                    assert res.ok
+                    assert res.headers['Content-Type'].startswith('application/x-ndjson')
+                    tickets = [json.loads(line) for line in res.text.splitlines()]
+                    expected = Test.info_tickets.x(_with=client, _path_formats=invitation['UUID']).json()['tickets']
+                    assert sorted(ticket['UUID'] for ticket in tickets) == sorted(ticket['UUID'] for ticket in expected)
+                    for ticket in tickets:
+                        assert ticket['invitationId'] == invitation['UUID']
+                        assert all([k in ticket for k in ['ownerName', 'ownerContacts', 'ownerAffiliation', 'invitation', 'createdTime', 'sentEmail', 'quotas']])
+                    
+                    res = Test.info_tickets_export.x(_with=client, _path_formats=invitation['UUID'], params={'format': 'csv'})
+                    assert res.ok
+                    assert res.headers['Content-Type'].startswith('text/csv')
+                    rows = list(csv.DictReader(io.StringIO(res.text)))
+                    assert sorted(row['UUID'] for row in rows) == sorted(ticket['UUID'] for ticket in expected)
+
+
+def test_export_tickets_invalid_format(superuser, invitations_store):
+    invitation = next(invitation for invitations in invitations_store.values() for invitation in invitations)
+    res = Test.info_tickets_export.x(_with=superuser, _path_formats=invitation['UUID'], params={'format': 'xml'})
+    assert res.status_code == 400
+
+
 # Get defaultQuotas
 def test_get_defaults(all_sessions, subtests, invitations_store):
     for client in all_sessions:
@@ -0,0 +1,137 @@
+import time
+from datetime import datetime
+
+import pytest
+import commons
+from commons import PreparedTestRequest
+
+class Endpoint:
+    base = '/log'
+    rollup = base + '/rollup'
+    stats = base + '/stats'
+    prune = base + '/prune'
+
+class Test:
+    base = PreparedTestRequest("GET", Endpoint.base)
+    rollup = PreparedTestRequest("GET", Endpoint.rollup)
+    stats = PreparedTestRequest("GET", Endpoint.stats)
+    prune = PreparedTestRequest("POST", Endpoint.prune)
+
+
+LOG_WAIT = 15 # seconds to wait for queued log events to be written, well above LOG_FLUSH_INTERVAL
+TICKET_COUNT = 50
+
+
+def own_logs(session, since: str, logged: dict):
+    "The CONSUME and CREATE logs since `since` of the records of the `logged` fixture, other workers' logs are left out"
+    invitationId = logged['invitation']['UUID']
+    ticketIds = {ticket['UUID'] for ticket in logged['tickets']}
+    own = {'CONSUME': [], 'CREATE': []}
+    for action in own:
+        logs, _ = commons.fetch_pages(Test.base, 'logs', session, params={'action': action, 'from': since})
+        for log in logs:
+            # CONSUME logs name the invitation, the CREATE logs of the tickets hold the ticket
+            if action == 'CONSUME' and invitationId in log['description']: own[action].append(log)
+            if action == 'CREATE' and (any(UUID in log['description'] for UUID in ticketIds)
+                                       or logged['organisation']['UUID'] in log['description']
+                                       or log['summary'] == 'Create Many Invitation' and invitationId in log['description']):
+                own[action].append(log)
+    return own
+
+
+def wait_for_logs(session, since: str, logged: dict):
+    "Polls the logs until every event of the `logged` records was written, returns them"
+    deadline = time.monotonic() + LOG_WAIT
+    while True:
+        own = own_logs(session, since, logged)
+        if (len(own['CONSUME']) >= TICKET_COUNT and len(own['CREATE']) >= TICKET_COUNT + 2) or time.monotonic() > deadline:
+            return own
+        time.sleep(0.2)
+
+
+@pytest.fixture(scope="module")
+def logged(superuser, module_dataset):
+    "Creates TICKET_COUNT tickets, each logging a CONSUME and a CREATE event, and waits for their logs to be written"
+    before = Test.stats.x(_with=superuser).json()
+    organisation, = module_dataset.create_organisations(1)
+    invitation, = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 'usageQuota': TICKET_COUNT}])
+    tickets = module_dataset.create_tickets([invitation['UUID']] * TICKET_COUNT)
+
+    logged = {'since': before['now'], 'before': before, 'organisation': organisation, 'invitation': invitation, 'tickets': tickets}
+    logged['logs'] = wait_for_logs(superuser, before['now'], logged)
+    logged['after'] = Test.stats.x(_with=superuser).json()
+    yield logged
+
+
+def test_permissions(superuser, admin, organisation_manager, observer, public):
+    for request in (Test.base, Test.rollup, Test.stats):
+        assert request.x(_with=superuser).ok
+        assert request.x(_with=admin).ok
+        for client in (organisation_manager, observer, public):
+            assert request.x(_with=client).status_code == 403
+    for client in (organisation_manager, observer, public):
+        assert Test.prune.x(_with=client, json={'before': '2000-01-01T00:00:00Z'}).status_code == 403
+
+
+@pytest.mark.parametrize('request_, params', [
+    (Test.base, {'limit': 0}),
+    (Test.base, {'after': 'not-an-id'}),
+    (Test.base, {'action': 'READ'}),
+    (Test.rollup, {'from': '2024-01-01T00:00:00Z', 'to': '2024-02-01T00:00:00Z'}),
+    (Test.stats, {'since': 'yesterday-ish'}),
+])
+def test_invalid_query(superuser, request_, params):
+    assert request_.x(_with=superuser, params=params).status_code == 400
+
+
+def test_every_event_is_written(logged):
+    "Whether the queue writes them in batches or not"
+    before, after, logs = logged['before'], logged['after'], logged['logs']
+    assert len(logs['CONSUME']) == TICKET_COUNT
+    # A CREATE per ticket, the organisation and the invitation too
+    for ticket in logged['tickets']:
+        assert sum(ticket['UUID'] in log['description'] for log in logs['CREATE']) == 1, ticket
+    assert len(logs['CREATE']) == TICKET_COUNT + 2, [log['summary'] for log in logs['CREATE']]
+    assert after['queue']['dropped'] == before['queue']['dropped']
+    if after['queue']['mode'] == 'buffered':
+        assert after['queue']['written'] - before['queue']['written'] >= 2 * TICKET_COUNT + 2
+
+
+def test_get_all_paginated(superuser, logged):
+    params = {'action': 'CONSUME', 'from': logged['since']}
+    logs, pages = commons.fetch_pages(Test.base, 'logs', superuser, params=params, limit=7)
+    assert len(logs) >= TICKET_COUNT
+    assert pages == -(-len(logs) // 7)
+    assert len({log['id'] for log in logs}) == len(logs)
+    assert all(log['logAction']['name'] == 'CONSUME' for log in logs)
+    times = [datetime.fromisoformat(log['at'].replace('Z', '+00:00')) for log in logs]
+    assert times == sorted(times, reverse=True)
+    assert times[-1] >= datetime.fromisoformat(logged['since'].replace('Z', '+00:00'))
+
+
+def test_get_all_ordered_by_action(superuser, logged):
+    logs, _ = commons.fetch_pages(Test.base, 'logs', superuser, params={'from': logged['since']}, limit=50)
+    actions = [log['logAction']['name'] for log in logs]
+    # Grouped by action: once the next action starts, the previous one does not come back
+    assert len(actions) >= 2 * TICKET_COUNT
+    assert [action for idx, action in enumerate(actions) if idx == 0 or actions[idx - 1] != action] == list(dict.fromkeys(actions))
+
+
+def test_rollup(superuser, logged):
+    res = Test.rollup.x(_with=superuser, params={'from': logged['since']})
+    assert res.ok, res
+    rollup = res.json()['rollup']
+    assert sum(bucket['count'] for bucket in rollup if bucket['action'] == 'CONSUME') >= TICKET_COUNT
+    assert all(datetime.fromisoformat(bucket['minute'].replace('Z', '+00:00')).second == 0 for bucket in rollup)
+
+    res = Test.rollup.x(_with=superuser, params={'from': logged['since'], 'action': 'CONSUME'})
+    assert res.ok, res
+    assert {bucket['action'] for bucket in res.json()['rollup']} == {'CONSUME'}
+
+
+def test_prune(superuser):
+    "Only rows older than `before` go, none are that old in a test database"
+    res = Test.prune.x(_with=superuser, json={'before': '2000-01-01T00:00:00Z'})
+    assert res.ok, res
+    assert res.json() == {'removed': 0}
+    assert Test.prune.x(_with=superuser, json={}).status_code == 400
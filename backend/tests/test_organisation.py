@@ -1,3 +1,6 @@
+import io
+import csv
+import json
 import pytest
 import commons
 from commons import PreparedTestRequest
@@ -9,6 +12,7 @@ class Endpoint:
     infoManagers = '%s/info/%s/managers' % (base, '%s')
     infoInvitations = '%s/info/%s/invitations' % (base, '%s')
     infoTickets = '%s/info/%s/tickets' % (base, '%s')
+    infoTicketsExport = '%s/info/%s/tickets/export' % (base, '%s')
     create = '%s/create' % base
     update = '%s/update' % base
     delete = '%s/delete' % base
@@ -19,30 +23,44 @@ class Test:
     infoManagers = PreparedTestRequest("GET", Endpoint.infoManagers) # TBA
     infoInvitations = PreparedTestRequest("GET", Endpoint.infoInvitations) # TBA
     infoTickets = PreparedTestRequest("GET", Endpoint.infoTickets) # TBA
+    infoTicketsExport = PreparedTestRequest("GET", Endpoint.infoTicketsExport)
     create = PreparedTestRequest("POST", Endpoint.create)
     update = PreparedTestRequest("PATCH", Endpoint.update)
     delete = PreparedTestRequest("DELETE", Endpoint.delete)
 
 
+@pytest.fixture(scope="module")
+def exported_organisation(module_dataset):
+    "An organisation with tickets of two invitations, each ticket with a quota"
+    [organisation] = module_dataset.create_organisations(1)
+    [quota_type] = module_dataset.create_quota_types(1)
+    invitations = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 'usageQuota': 5,
+                                                      'defaultQuotas': [{'quotaTypeId': quota_type['UUID'], 'value': 2}]}]*2)
+    tickets = module_dataset.create_tickets([invitation['UUID'] for invitation in invitations for _ in range(5)])
+    
+    yield {'organisation': organisation, 'tickets': tickets, 'quotaType': quota_type}
+    # Deletion handled by module_dataset fixture
+
+
 # Create
 def test_superuser_create_organisation(superuser, store):
-    res = Test.create.execute(_with=superuser, json={'name':commons.FAKE.unique.company()})
+    res = Test.create.execute(_with=superuser, json={'name':commons.generate_unique_company()})
     assert res.ok
     store['org1'] = res.json()['organisation']
 
 def test_admin_create_organisation(admin, store):
-    res = Test.create.execute(_with=admin, json={'name':commons.FAKE.unique.company()})
+    res = Test.create.execute(_with=admin, json={'name':commons.generate_unique_company()})
     assert res.ok
     store['org2'] = res.json()['organisation']
 
 @pytest.mark.xfail(reason="Admins only")
 def test_organisation_manager_create_organisation(organisation_manager):
-    res = Test.create.execute(_with=organisation_manager, json={'name':commons.FAKE.unique.company()})
+    res = Test.create.execute(_with=organisation_manager, json={'name':commons.generate_unique_company()})
     assert res.ok
 
 @pytest.mark.xfail(reason="Unauthorized")
 def test_public_create_organisation(public):
-    res = Test.create.execute(_with=public, json={'name':commons.FAKE.unique.company()})
+    res = Test.create.execute(_with=public, json={'name':commons.generate_unique_company()})
     assert res.ok
 
 
@@ -66,6 +84,18 @@ def test_public_get_all(public):
     res = Test.base.x(_with=public)
     assert res.ok
 
+def test_get_all_paginated(superuser, store):
+    res = Test.base.x(_with=superuser, params=commons.ALL_ROWS)
+    assert res.ok
+    everything = res.json()['organisations']
+    assert {store['org1']['UUID'], store['org2']['UUID']} <= {organisation['UUID'] for organisation in everything}
+    
+    rows, pages = commons.fetch_pages(Test.base, 'organisations', superuser, limit=2)
+    assert pages >= 2
+    # Other workers may create or delete organisations meanwhile, only those of this one are compared
+    assert [organisation['UUID'] for organisation in rows if commons.in_namespace(organisation['name'])] \
+        == [organisation['UUID'] for organisation in everything if commons.in_namespace(organisation['name'])]
+
 
 # Get one - self
 def test_superuser_get_one_self(superuser):
@@ -101,44 +131,71 @@ def test_public_get_one_other(public, superuser):
     assert res.ok
 
 
+# Export tickets
+def test_superuser_export_tickets(superuser, exported_organisation):
+    res = Test.infoTicketsExport.x(_with=superuser, _path_formats=exported_organisation['organisation']['UUID'])
+    assert res.ok
+    tickets = [json.loads(line) for line in res.text.splitlines()]
+    assert sorted(ticket['UUID'] for ticket in tickets) == sorted(ticket['UUID'] for ticket in exported_organisation['tickets'])
+    for ticket in tickets:
+        assert ticket['ownerAffiliationId'] == exported_organisation['organisation']['UUID']
+        assert [(quota['quotaTypeId'], quota['usageLeft']) for quota in ticket['quotas']] == [(exported_organisation['quotaType']['UUID'], 2)]
+
+def test_admin_export_tickets_csv(admin, exported_organisation):
+    res = Test.infoTicketsExport.x(_with=admin, _path_formats=exported_organisation['organisation']['UUID'], params={'format': 'csv'})
+    assert res.ok
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert sorted(row['UUID'] for row in rows) == sorted(ticket['UUID'] for ticket in exported_organisation['tickets'])
+    assert all(row['quotas'] == '%s=2' % exported_organisation['quotaType']['name'] for row in rows)
+
+@pytest.mark.xfail(reason="Admins only")
+def test_organisation_manager_export_tickets_other(organisation_manager, exported_organisation):
+    res = Test.infoTicketsExport.x(_with=organisation_manager, _path_formats=exported_organisation['organisation']['UUID'])
+    assert res.ok
+
+def test_export_tickets_unknown_organisation(superuser):
+    res = Test.infoTicketsExport.x(_with=superuser, _path_formats='00000000-0000-0000-0000-000000000000')
+    assert res.status_code == 404
+
+
 # Update - self
 def test_superuser_update_self(superuser):
-    jsonData = {'UUID': superuser.info['organisationManaged']['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': superuser.info['organisationManaged']['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=superuser, json=jsonData)
     assert res.ok
 
 def test_admin_update_self(admin):
-    jsonData = {'UUID': admin.info['organisationManaged']['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': admin.info['organisationManaged']['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=admin, json=jsonData)
     assert res.ok
 
 @pytest.mark.xfail(reason="Only admins can manage organisation")
 def test_organisation_manager_update_self(organisation_manager):
-    jsonData = {'UUID': organisation_manager.info['organisationManaged']['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': organisation_manager.info['organisationManaged']['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=organisation_manager, json=jsonData)
     assert res.ok
 
 
 # Update - other
 def test_superuser_update_other(superuser, admin):
-    jsonData = {'UUID': admin.info['organisationManaged']['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': admin.info['organisationManaged']['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=superuser, json=jsonData)
     assert res.ok
 
 def test_admin_update_other(admin, organisation_manager):
-    jsonData = {'UUID': organisation_manager.info['organisationManaged']['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': organisation_manager.info['organisationManaged']['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=admin, json=jsonData)
     assert res.ok
 
 @pytest.mark.xfail(reason="Only admins can manage organisation")
 def test_organisation_manager_update_other(organisation_manager, admin):
-    jsonData = {'UUID': admin.info['organisationManaged']['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': admin.info['organisationManaged']['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=organisation_manager, json=jsonData)
     assert res.ok
 
 @pytest.mark.xfail(reason="Unauthorized")
 def test_public_update_other(public, store):
-    jsonData = {'UUID': store.get('org1')['UUID'],'newName': commons.FAKE.unique.company()}
+    jsonData = {'UUID': store.get('org1')['UUID'],'newName': commons.generate_unique_company()}
     res = Test.update.x(_with=public, json=jsonData)
     assert res.ok
 
@@ -35,65 +35,20 @@ def quotas_store():
 
 
 @pytest.fixture(scope="module")
-def quota_types(superuser):
-    quota_types_store = []
+def invitations(manager_sessions, module_dataset):
+    generated_invitations = [{'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1} for client in manager_sessions]
+    created_invitations = module_dataset.create_invitations(generated_invitations)
     
-    quota_type_create_route = PreparedTestRequest("POST", '/quotaType/create')
-    quota_type_delete_route = PreparedTestRequest("DELETE", '/quotaType/delete')
-    for _ in range(20):
-        jsonData = {'name': commons.generate_random_hex(randomLength=8)}
-        res = quota_type_create_route(_with=superuser, json=jsonData)
-        assert res.ok
-        jsonData.update(res.json()['quotaType'])
-        quota_types_store.append(jsonData.copy())
-    
-    yield quota_types_store
-    
-    for quota_type in quota_types_store:
-        res2 = quota_type_delete_route(_with=superuser, json=quota_type)
-        assert res2.ok
-
-
-@pytest.fixture(scope="module")
-def invitations(manager_sessions, superuser):
-    invitations_store = {}
-    
-    invitation_create_route = PreparedTestRequest("POST", '/invitation/create')
-    invitation_delete_route = PreparedTestRequest("DELETE", '/invitation/delete')
-    
-    for client in manager_sessions:
-        client_role = commons.Role(client.info['role'])
-        generated_invitation = {'name': commons.generate_random_hex(randomLength=8), 'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1}
-        res1 = invitation_create_route.x(_with=client, json=generated_invitation)
-        assert res1.ok
-        generated_invitation.update(res1.json()['invitation'])
-        invitations_store[client_role] = generated_invitation
-    
-    yield invitations_store
-    
-    for invitation in invitations_store.values():
-        res3 = invitation_delete_route.x(_with=superuser, json=invitation)
-        assert res3.ok
+    yield {commons.Role(client.info['role']): invitation for client, invitation in zip(manager_sessions, created_invitations)}
+    # Deletion handled by module_dataset fixture
 
 
 @pytest.fixture(scope="module")
-def tickets(superuser, invitations):
-    tickets_store = {}
-    
-    ticket_create_route = PreparedTestRequest("POST", '/ticket/create')
-    
-    for creator_role, invitation in invitations.items():
-        jsonData = {'ownerName': commons.FAKE.unique.name(), 
-                    'ownerContacts': {'email': commons.FAKE.unique.email(), 'phone_number': commons.FAKE.unique.msisdn()}, 
-                    'invitationId': invitation['UUID']}
-        res = ticket_create_route.x(_with=superuser, json=jsonData)
-        assert res.ok
-        
-        jsonData.update(res.json()['ticket'])
-        tickets_store[creator_role] = jsonData
+def tickets(module_dataset, invitations):
+    created_tickets = module_dataset.create_tickets([invitation['UUID'] for invitation in invitations.values()])
     
-    yield tickets_store
-    # Deletion handled by invitations fixture
+    yield dict(zip(invitations.keys(), created_tickets))
+    # Deletion handled by module_dataset fixture
 
 
 # Create
@@ -129,6 +84,25 @@ def test_get_all(all_sessions, subtests):
                 assert not res.ok
 
 
+# Get all, a page at a time
+def test_get_all_paginated(superuser, invitations, quotas_store, subtests):
+    for creator_role, invitation in invitations.items():
+        with subtests.test(msg="'%s': Paginating quotas of an invitation" % creator_role.name):
+            params = {'invitationId': invitation['UUID'], 'sort': 'quotaTypeId'}
+            res = Test.base.x(_with=superuser, params={**params, **commons.ALL_ROWS})
+            assert res.ok
+            everything = res.json()['quotas']
+            assert {quota['UUID'] for quota in everything} == {quota['UUID'] for quota in quotas_store[creator_role]}
+            
+            rows, _ = commons.fetch_pages(Test.base, 'quotas', superuser, params, limit=3)
+            assert [quota['UUID'] for quota in rows] == [quota['UUID'] for quota in everything]
+        
+        with subtests.test(msg="'%s': Filtering quotas by quota type" % creator_role.name):
+            for quota in quotas_store[creator_role]:
+                rows, _ = commons.fetch_pages(Test.base, 'quotas', superuser, {'invitationId': invitation['UUID'], 'quotaTypeId': quota['quotaTypeId']})
+                assert [row['UUID'] for row in rows] == [quota['UUID']]
+
+
 # Get one (always public)
 def test_get_one_public(all_sessions, quotas_store, subtests):
     for client in all_sessions:
@@ -0,0 +1,151 @@
+import re
+import uuid
+import zlib
+
+import pytest
+from commons import PreparedTestRequest
+
+class Endpoint:
+    base = '/render'
+    invitation = base + '/invitation/%s'
+    ticket = base + '/ticket/%s'
+    sheet = base + '/sheet'
+    stats = base + '/stats'
+
+class Test:
+    invitation = PreparedTestRequest("GET", Endpoint.invitation)
+    ticket = PreparedTestRequest("GET", Endpoint.ticket)
+    sheet = PreparedTestRequest("GET", Endpoint.sheet)
+    sheet_of = PreparedTestRequest("POST", Endpoint.sheet)
+    stats = PreparedTestRequest("GET", Endpoint.stats)
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+BADGES_PER_PAGE = 12
+SHEET_TICKETS = 30
+
+
+def sheet_contents(pdf: bytes):
+    "The page count of a badge sheet and the ticket UUIDs printed on it, in order"
+    assert pdf.startswith(b'%PDF-') and pdf.rstrip().endswith(b'%%EOF')
+    pages = int(re.search(rb'/Type /Pages /Kids \[[^\]]*\] /Count (\d+)', pdf).group(1))
+    UUIDs = []
+    for match in re.finditer(rb'/Length (\d+) /Filter /FlateDecode >>\nstream\n', pdf):
+        content = zlib.decompress(pdf[match.end():match.end() + int(match.group(1))]).decode('latin1')
+        UUIDs.extend(re.findall(r'\(([0-9a-f-]{36})\) Tj', content))
+    return pages, UUIDs
+
+
+@pytest.fixture(scope="module")
+def rendered(module_dataset):
+    "An invitation and a ticket of it, with the request rendering the QR code of each"
+    organisation, = module_dataset.create_organisations(1)
+    invitation, = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 'usageQuota': 1}])
+    ticket, = module_dataset.create_tickets([invitation['UUID']])
+    yield [(Test.invitation, invitation['UUID']), (Test.ticket, ticket['UUID'])]
+
+
+@pytest.fixture(scope="module")
+def sheet_tickets(module_dataset):
+    "An organisation with an invitation of SHEET_TICKETS tickets"
+    organisation, = module_dataset.create_organisations(1)
+    invitation, = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 'usageQuota': SHEET_TICKETS}])
+    tickets = module_dataset.create_tickets([invitation['UUID']] * SHEET_TICKETS)
+    yield {'organisation': organisation, 'invitation': invitation, 'tickets': tickets}
+
+
+def test_png(public, rendered):
+    for request, UUID in rendered:
+        res = request.x(_with=public, _path_formats=UUID, headers={'Accept-Encoding': 'gzip'})
+        assert res.ok, res
+        assert res.headers['Content-Type'] == 'image/png'
+        assert 'Content-Encoding' not in res.headers # PNGs skip compression
+        assert 'immutable' in res.headers['Cache-Control']
+        assert res.content.startswith(PNG_SIGNATURE)
+
+        again = request.x(_with=public, _path_formats=UUID)
+        assert again.headers['ETag'] == res.headers['ETag']
+        assert again.content == res.content
+
+
+def test_svg(public, rendered):
+    for request, UUID in rendered:
+        res = request.x(_with=public, _path_formats=UUID, params={'format': 'svg'})
+        assert res.ok, res
+        assert res.headers['Content-Type'].startswith('image/svg+xml')
+        assert '<svg' in res.text
+        assert res.headers['ETag'] != request.x(_with=public, _path_formats=UUID).headers['ETag']
+
+
+def test_not_modified(public, rendered):
+    for request, UUID in rendered:
+        etag = request.x(_with=public, _path_formats=UUID).headers['ETag']
+        res = request.x(_with=public, _path_formats=UUID, headers={'If-None-Match': etag})
+        assert res.status_code == 304
+        assert not res.content
+
+
+def test_unknown(public, rendered):
+    "UUIDs which do not exist are rendered but kept by no cache, so made up ones can not fill them"
+    for request, _ in rendered:
+        res = request.x(_with=public, _path_formats=str(uuid.uuid4()))
+        assert res.ok, res
+        assert res.content.startswith(PNG_SIGNATURE)
+        assert 'immutable' not in res.headers['Cache-Control']
+
+
+def test_invalid(public, rendered):
+    for request, UUID in rendered:
+        assert request.x(_with=public, _path_formats='not-a-uuid').status_code == 400
+        assert request.x(_with=public, _path_formats=UUID, params={'format': 'gif'}).status_code == 400
+
+
+def test_stats(superuser, admin, organisation_manager, observer, public, rendered):
+    request, UUID = rendered[1]
+    assert request.x(_with=public, _path_formats=UUID, params={'format': 'svg'}).ok
+    res = Test.stats.x(_with=superuser)
+    assert res.ok, res
+    stats = res.json()
+    assert stats['cache']['size'] >= 1
+    if stats['pool']['size'] > 0:
+        assert stats['pool']['completed'] >= 1
+    assert Test.stats.x(_with=admin).ok
+    for client in (organisation_manager, observer, public):
+        assert Test.stats.x(_with=client).status_code == 403
+
+
+def test_sheet(superuser, sheet_tickets):
+    expected = sorted(ticket['UUID'] for ticket in sheet_tickets['tickets'])
+    for params in ({'invitationId': sheet_tickets['invitation']['UUID']}, {'organisationId': sheet_tickets['organisation']['UUID']}):
+        res = Test.sheet.x(_with=superuser, params=params)
+        assert res.ok, res
+        assert res.headers['Content-Type'] == 'application/pdf'
+        pages, UUIDs = sheet_contents(res.content)
+        assert pages == -(-SHEET_TICKETS // BADGES_PER_PAGE)
+        assert UUIDs == expected
+
+
+def test_sheet_of_tickets(superuser, organisation_manager, sheet_tickets):
+    chosen = [ticket['UUID'] for ticket in sheet_tickets['tickets'][:5]]
+    res = Test.sheet_of.x(_with=superuser, json={'UUIDs': chosen})
+    assert res.ok, res
+    assert sheet_contents(res.content) == (1, sorted(chosen))
+
+    # Tickets of other organisations are left out
+    res = Test.sheet_of.x(_with=organisation_manager, json={'UUIDs': chosen})
+    assert res.ok, res
+    assert sheet_contents(res.content) == (1, [])
+
+
+def test_sheet_permissions(organisation_manager, observer, public, sheet_tickets):
+    params = {'invitationId': sheet_tickets['invitation']['UUID']}
+    for client in (organisation_manager, observer, public):
+        assert Test.sheet.x(_with=client, params=params).status_code == 403
+
+
+def test_sheet_invalid(superuser, sheet_tickets):
+    assert Test.sheet.x(_with=superuser).status_code == 400
+    assert Test.sheet.x(_with=superuser, params={'invitationId': sheet_tickets['invitation']['UUID'], 'organisationId': sheet_tickets['organisation']['UUID']}).status_code == 400
+    assert Test.sheet.x(_with=superuser, params={'invitationId': 'not-a-uuid'}).status_code == 400
+    assert Test.sheet_of.x(_with=superuser, json={'UUIDs': []}).status_code == 400
+    assert Test.sheet.x(_with=superuser, params={'invitationId': '00000000-0000-4000-8000-000000000000'}).status_code == 404
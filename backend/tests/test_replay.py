@@ -0,0 +1,61 @@
+import json as jsonlib
+import uuid
+import asyncio
+from datetime import timedelta
+
+import commons
+from replay import Replayer
+from traffic import TrafficLog, read_log
+
+
+class FakeSession:
+    "Stands in for commons.AsyncSession, answers like the backend would with fresh UUIDs"
+    sent = []
+
+    def __init__(self, *args, **kwargs):
+        self.created = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def request_path(self, method, path, params=None, json=None, **kwargs):
+        FakeSession.sent.append((method, path, params, json))
+        if path == '/ticket/create':
+            content = {'ticket': {'UUID': str(uuid.uuid4()), 'invitationId': json['invitationId']}}
+        else:
+            content = {'ok': True}
+        return commons.AsyncResponse(200, {'Content-Type': 'application/json'}, jsonlib.dumps(content).encode(), timedelta(0))
+
+
+
+def test_round_trip(tmp_path, monkeypatch):
+    "Records a ticket creation and requests on the ticket, replays them against the UUID created while replaying"
+    invitationId, recordedId = str(uuid.uuid4()), str(uuid.uuid4())
+    log = TrafficLog()
+    log.open(str(tmp_path / 'traffic.jsonl'))
+    session = log.session_id()
+    role = int(commons.Role.SUPER_ADMIN)
+    log.record(session, role, 'POST', '/user/login', None, {'username': 'superuser', 'password': 'secret'}, 200, 0.01, '')
+    log.record(session, role, 'POST', '/ticket/create', None, {'invitationId': invitationId, 'ownerName': 'a b'}, 200, 0.01,
+               jsonlib.dumps({'ticket': {'UUID': recordedId, 'invitationId': invitationId}}))
+    log.record(session, role, 'GET', '/ticket/info/%s' % recordedId, {'ticketId': recordedId}, None, 200, 0.01, '')
+    log.record(session, role, 'PATCH', '/ticket/update', None, {'UUID': recordedId, 'nested': [recordedId]}, 200, 0.01, '')
+    log.close()
+
+    entries = list(read_log(str(tmp_path / 'traffic.jsonl')))
+    assert 'secret' not in (tmp_path / 'traffic.jsonl').read_text()
+    FakeSession.sent = []
+    monkeypatch.setattr(commons, 'AsyncSession', FakeSession)
+    replayer = Replayer(entries, {role: commons.SUPERUSER_CREDENTIALS}, speed=1000)
+    asyncio.run(replayer.run())
+
+    # The login is left to the replaying session, the rest is sent in order with the replayed ticket's UUID
+    assert [(method, path.split('/')[1]) for method, path, _, _ in FakeSession.sent] == [('POST', 'ticket'), ('GET', 'ticket'), ('PATCH', 'ticket')]
+    replayedId = replayer.idMap[recordedId]
+    createBody = FakeSession.sent[0][3]
+    assert createBody['invitationId'] == invitationId # Not created while recording, left as is
+    assert FakeSession.sent[1][1:3] == ('/ticket/info/%s' % replayedId, {'ticketId': replayedId})
+    assert FakeSession.sent[2][3] == {'UUID': replayedId, 'nested': [replayedId]}
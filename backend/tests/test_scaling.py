@@ -0,0 +1,93 @@
+import json
+import statistics
+import pytest
+import commons
+import benchmark
+from urllib.parse import urlparse
+from soak import ProcessSampler, find_listening_pid
+
+import test_ticket
+import test_quota
+import test_invitation
+import test_organisation
+
+
+pytestmark = pytest.mark.scaling
+
+# Endpoints returning every row, along with the rows within their response
+ENDPOINTS = {
+    'GET /ticket?all': (test_ticket.Test.base, lambda data: {'params': commons.ALL_ROWS}, lambda res: res.json()['tickets']),
+    'GET /quota?all': (test_quota.Test.base, lambda data: {'params': commons.ALL_ROWS}, lambda res: res.json()['quotas']),
+    'GET /invitation?all': (test_invitation.Test.base, lambda data: {'params': commons.ALL_ROWS}, lambda res: res.json()['invitations']),
+    'GET /organisation/info/:UUID': (test_organisation.Test.info, lambda data: {'_path_formats': data['organisation']['UUID']}, lambda res: res.json()['organisation']['createdTickets']),
+    'GET /invitation/info/:UUID/tickets': (test_invitation.Test.info_tickets, lambda data: {'_path_formats': data['invitation']['UUID']}, lambda res: res.json()['tickets']),
+    'GET /invitation/info/:UUID/tickets/export': (test_invitation.Test.info_tickets_export, lambda data: {'_path_formats': data['invitation']['UUID']}, lambda res: res.text.splitlines()),
+}
+
+
+@pytest.fixture(scope="module")
+def sizes(request):
+    yield sorted(int(size) for size in request.config.getoption('scaling_sizes').split(','))
+
+
+@pytest.fixture(scope="module")
+def scaling_dataset(module_dataset, sizes):
+    "An organisation with an invitation taking every seeded ticket, each ticket with a quota, topped up by `seed_to`"
+    [organisation] = module_dataset.create_organisations(1)
+    [quota_type] = module_dataset.create_quota_types(1)
+    [invitation] = module_dataset.create_invitations([{'organisationId': organisation['UUID'],
+                                                       'usageQuota': max(sizes),
+                                                       'defaultQuotas': [{'quotaTypeId': quota_type['UUID'], 'value': 1}]}])
+    data = {'organisation': organisation, 'invitation': invitation, 'count': 0}
+
+    def seed_to(size: int):
+        if data['count'] >= size: return
+        result = module_dataset.import_tickets(invitation['UUID'], size - data['count'])
+        assert result['created'] == size - data['count'], result['errors'][:5]
+        data['count'] = size
+
+    data['seed_to'] = seed_to
+    yield data
+    # Deletion handled by module_dataset fixture
+
+
+@pytest.fixture(scope="module")
+def sampler():
+    pid = find_listening_pid(urlparse(commons.BASE_URL).port)
+    yield ProcessSampler(pid) if pid is not None else None
+
+
+def test_list_endpoints_scaling(superuser, scaling_dataset, sizes, sampler, report, request):
+    repeats = request.config.getoption('scaling_repeats')
+    maxExponent = request.config.getoption('scaling_max_exponent')
+    measurements = {name: [] for name in ENDPOINTS}
+
+    for size in sizes:
+        scaling_dataset['seed_to'](size)
+        for name, (prepared, kwargsOf, rowsOf) in ENDPOINTS.items():
+            latencies, payload, rows = [], 0, 0
+            for _ in range(repeats):
+                res = prepared.x(_with=superuser, **kwargsOf(scaling_dataset))
+                assert res.ok, (name, size, res)
+                latencies.append(res.elapsed.total_seconds()*1000)
+                payload, rows = len(res.content), len(rowsOf(res))
+            measurement = {'size': size, 'rows': rows, 'latency': statistics.median(latencies), 'payload': payload}
+            if sampler is not None:
+                sample = sampler.sample()
+                measurement.update({'rss': sample['rss'], 'peak': sample['peak']})
+            measurements[name].append(measurement)
+
+    exceeding = []
+    for name, points in measurements.items():
+        # The admin lists also hold rows not seeded here, hence fitted against the rows returned
+        latencyExponent, _ = benchmark.fit_power_law([point['rows'] for point in points], [point['latency'] for point in points])
+        payloadExponent, _ = benchmark.fit_power_law([point['rows'] for point in points], [point['payload'] for point in points])
+        report("%s: latency ~ rows^%.2f, payload ~ rows^%.2f" % (name, latencyExponent, payloadExponent))
+        for point in points:
+            memory = '  rss %dkB, peak %dkB' % (point['rss'], point['peak']) if 'rss' in point else ''
+            report("  %9d rows %10.1fms %12d bytes%s" % (point['rows'], point['latency'], point['payload'], memory))
+        if latencyExponent > maxExponent:
+            exceeding.append((name, latencyExponent))
+
+    request.node.user_properties.append(('scaling', json.dumps(measurements)))
+    assert not exceeding, "Latency grows faster than rows^%s: %s" % (maxExponent, exceeding)
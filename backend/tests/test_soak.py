@@ -0,0 +1,68 @@
+import os
+import asyncio
+import pytest
+import commons
+from urllib.parse import urlparse
+from soak import ProcessSampler, SoakRunner, find_listening_pid, TRACKED_METRICS
+from dataset import generate_ticket_input
+
+import test_ticket
+import test_quota
+import test_invitation
+import test_organisation
+import test_event
+
+
+pytestmark = pytest.mark.soak
+
+
+@pytest.fixture(scope="module")
+def soak_dataset(module_dataset):
+    "An invitation to register on and tickets whose quota does not run out during the run"
+    [organisation] = module_dataset.create_organisations(1)
+    [quota_type] = module_dataset.create_quota_types(1)
+    [invitation] = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 
+                                                       'usageQuota': 10**9, 
+                                                       'defaultQuotas': [{'quotaTypeId': quota_type['UUID'], 'value': 10**9}]}])
+    tickets = module_dataset.create_tickets([invitation['UUID']]*100)
+    
+    yield {'organisation': organisation, 'invitation': invitation, 'tickets': tickets}
+    # Deletion handled by module_dataset fixture
+
+
+@pytest.fixture(scope="module")
+def sampler(request):
+    pid = request.config.getoption('soak_pid') or find_listening_pid(urlparse(commons.BASE_URL).port)
+    if pid is None:
+        yield None # the backend does not run on this host, only latency is tracked
+        return
+    yield ProcessSampler(pid, dbPort=urlparse(os.environ.get('DATABASE_URL', '')).port or 5432)
+
+
+def test_soak(soak_dataset, sampler, report, request):
+    config = request.config
+    tickets, invitation, organisation = soak_dataset['tickets'], soak_dataset['invitation'], soak_dataset['organisation']
+    random = commons.FAKE.random
+    # Mostly attendees viewing their tickets, some registrations, gate scans and dashboard views
+    mix = [
+        (30, test_ticket.Test.public, lambda: {'_path_formats': random.choice(tickets)['UUID']}),
+        (15, test_invitation.Test.public, lambda: {'_path_formats': invitation['UUID']}),
+        (15, test_event.Test.base, lambda: {}),
+        (10, test_ticket.Test.create, lambda: {'json': generate_ticket_input(invitation['UUID'])}),
+        (20, test_quota.Test.consume, lambda: {'json': {'UUID': random.choice(tickets)['quotas'][0]['UUID']}}),
+        (10, test_organisation.Test.info, lambda: {'_path_formats': organisation['UUID']}),
+    ]
+    runner = SoakRunner(mix, duration=config.getoption('soak_duration'), interval=config.getoption('soak_interval'), 
+                        rate=config.getoption('soak_rate'), sampler=sampler, credentials=commons.SUPERUSER_CREDENTIALS, 
+                        output=config.getoption('soak_output'))
+    samples = asyncio.run(runner.run())
+    
+    first, last = samples[0], samples[-1]
+    report("soak: %d samples over %.0fs%s" % (len(samples), last['at'], '' if sampler else ', backend process not found, only latency tracked'))
+    for metric in TRACKED_METRICS:
+        if metric in last:
+            report("  %-14s first %10g  last %10g" % (metric, first[metric], last[metric]))
+    
+    assert sum(sample['errors'] for sample in samples) == 0, [sample for sample in samples if sample['errors']][:5]
+    growths = runner.growths(config.getoption('soak_threshold'))
+    assert not growths, growths
@@ -0,0 +1,81 @@
+import time
+import random
+import asyncio
+import pytest
+import commons
+import benchmark
+from collections import Counter
+from contextlib import AsyncExitStack
+
+import test_quota
+from test_stress_ticket import format_summary
+
+
+pytestmark = pytest.mark.stress
+
+# Usages of each seeded quota, every quota gets scanned once more than this
+QUOTA_VALUE = 2
+
+
+async def simulate_gates(credentials, scans):
+    """Each scanner (an organisation manager session) scans one ticket at a time, taking the next quota off the shared
+    queue of scans, like an entry lane would. Returns the responses in order of the queue."""
+    queue = asyncio.Queue()
+    for idx, quotaId in enumerate(scans):
+        queue.put_nowait((idx, quotaId))
+    responses = [None]*len(scans)
+    
+    async def scanner(session):
+        while not queue.empty():
+            idx, quotaId = queue.get_nowait()
+            responses[idx] = await test_quota.Test.consume.execute_async(_with=session, json={'UUID': quotaId})
+    
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(commons.AsyncSession(credentials=credential, poolSize=1, concurrency=1)) for credential in credentials]
+        await asyncio.gather(*[scanner(session) for session in sessions])
+    return responses
+
+
+@pytest.fixture(scope="module")
+def gate(module_dataset, request):
+    "An organisation and a quota type shared by every scenario, popular quota types are what scanners contend on"
+    [organisation] = module_dataset.create_organisations(1)
+    [quota_type] = module_dataset.create_quota_types(1)
+    scanners = max(int(count) for count in request.config.getoption('stress_scanners').split(','))
+    credentials = module_dataset.create_users(scanners, commons.Role.ORGANISATION_MANAGER, organisation['name'])
+    
+    yield {'organisation': organisation, 'quotaType': quota_type, 'credentials': credentials}
+    # Deletion handled by module_dataset fixture
+
+
+def test_gate_scan(superuser, module_dataset, gate, report, request, scanners):
+    scanCount = request.config.getoption('stress_requests')
+    [invitation] = module_dataset.create_invitations([{'organisationId': gate['organisation']['UUID'], 
+                                                       'usageQuota': scanCount, 
+                                                       'defaultQuotas': [{'quotaTypeId': gate['quotaType']['UUID'], 'value': QUOTA_VALUE}]}])
+    tickets = module_dataset.create_tickets([invitation['UUID']]*max(1, scanCount//(QUOTA_VALUE+1)))
+    quotaIds = [quota['UUID'] for ticket in tickets for quota in ticket['quotas']]
+    
+    # Every quota is scanned once more than it allows, in random order so scanners contend on the same quotas
+    scans = [quotaId for quotaId in quotaIds for _ in range(QUOTA_VALUE+1)]
+    random.shuffle(scans)
+    
+    start = time.perf_counter()
+    responses = asyncio.run(simulate_gates(gate['credentials'][:scanners], scans))
+    wallTime = time.perf_counter() - start
+    
+    consumed = Counter(quotaId for quotaId, res in zip(scans, responses) if res.ok)
+    accepted = [res for res in responses if res.ok]
+    failed = [res for res in responses if not res.ok and res.status_code != 403]
+    summary = benchmark.summarize(responses, wallTime)
+    
+    report("quota/consume scanners=%d: %d consumed, %d rejected, %d failed, %.1f consumes/s" % (scanners, len(accepted), len(responses)-len(accepted)-len(failed), len(failed), len(accepted)/wallTime))
+    report("  all: %s" % format_summary(summary))
+    
+    assert not failed, failed[:5]
+    # Each quota is consumed exactly its value, no more (negative usageLeft) and no less (lost consume)
+    assert all(consumed[quotaId] == QUOTA_VALUE for quotaId in quotaIds), [quotaId for quotaId in quotaIds if consumed[quotaId] != QUOTA_VALUE][:5]
+    for quotaId in quotaIds:
+        res = test_quota.Test.info.x(_with=superuser, _path_formats=quotaId)
+        assert res.ok, res
+        assert res.json()['quota']['usageLeft'] == 0, res.json()
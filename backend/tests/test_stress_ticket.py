@@ -0,0 +1,64 @@
+import time
+import asyncio
+import pytest
+import commons
+import benchmark
+from dataset import generate_ticket_input
+
+import test_ticket
+import test_invitation
+
+
+pytestmark = pytest.mark.stress
+
+
+def format_summary(summary):
+    return "%(count)d requests, %(throughput).1f req/s, p50 %(p50).1fms, p95 %(p95).1fms, p99 %(p99).1fms, max %(max).1fms" % summary
+
+
+async def create_tickets(invitationId: str, count: int, concurrency: int):
+    "Fires `count` ticket creations at the invitation, at most `concurrency` at once, as the public would"
+    async with commons.AsyncSession(poolSize=concurrency, concurrency=concurrency) as session:
+        return await benchmark.measure(test_ticket.Test.create, count, _with=session, _factory=lambda _: {'json': generate_ticket_input(invitationId)})
+
+
+@pytest.fixture(scope="module")
+def stress_options(request):
+    yield {'count': request.config.getoption('stress_requests'), 'concurrency': request.config.getoption('stress_concurrency')}
+
+
+@pytest.fixture(scope="module")
+def organisation(module_dataset):
+    [organisation] = module_dataset.create_organisations(1)
+    yield organisation
+    # Deletion handled by module_dataset fixture
+
+
+# Registration opening, far more registrants than the invitation allows
+@pytest.mark.parametrize('usageQuota', [1, 10, 50])
+def test_create_over_quota(superuser, module_dataset, organisation, stress_options, report, usageQuota):
+    [invitation] = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 'usageQuota': usageQuota}])
+    
+    start = time.perf_counter()
+    responses, summary = asyncio.run(create_tickets(invitation['UUID'], stress_options['count'], stress_options['concurrency']))
+    wallTime = time.perf_counter() - start
+    accepted = [res for res in responses if res.ok]
+    rejected = [res for res in responses if res.status_code == 403]
+    failed = [res for res in responses if not res.ok and res.status_code != 403]
+    
+    report("ticket/create usageQuota=%d: %d accepted, %d rejected, %d failed" % (usageQuota, len(accepted), len(rejected), len(failed)))
+    report("  all: %s" % format_summary(summary))
+    report("  accepted: %s" % format_summary(benchmark.summarize(accepted, wallTime)))
+    
+    # Neither collapses nor overbooks
+    assert not failed, failed[:5]
+    assert len(accepted) == min(usageQuota, stress_options['count']), (len(accepted), usageQuota)
+    
+    res = test_invitation.Test.info_tickets.x(_with=superuser, _path_formats=invitation['UUID'])
+    assert res.ok, res
+    assert len(res.json()['tickets']) == len(accepted)
+    
+    res2 = test_invitation.Test.info.x(_with=superuser, _path_formats=invitation['UUID'])
+    assert res2.ok, res2
+    assert res2.json()['invitation']['usageLeft'] == usageQuota - len(accepted)
+    assert res2.json()['invitation']['createdTicketCount'] == len(accepted)
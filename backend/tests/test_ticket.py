@@ -1,6 +1,7 @@
 import pytest
 import commons
 from commons import PreparedTestRequest
+from dataset import generate_ticket_input
 
 
 class Endpoint:
@@ -8,6 +9,7 @@ class Endpoint:
     public = '%s/public/%s' % (base, '%s')
     info = '%s/info/%s' % (base, '%s')
     create = '%s/create' % (base)
+    import_many = '%s/import/%s' % (base, '%s')
     consume = '%s/consume' % (base)
     update = '%s/update' % (base)
     delete = '%s/delete' % (base)
@@ -20,10 +22,15 @@ class Test:
     info = PreparedTestRequest("GET", Endpoint.info)
     
     create = PreparedTestRequest("POST", Endpoint.create)
+    import_many = PreparedTestRequest("POST", Endpoint.import_many)
     update = PreparedTestRequest("PATCH", Endpoint.update)
     delete = PreparedTestRequest("DELETE", Endpoint.delete)
 
 
+# Row errors listed by /ticket/import at most
+MAX_IMPORT_ERRORS = 1000
+
+
 @pytest.fixture(scope="module")
 def tickets_store():
     store = {role: [] for role in commons.Role}
@@ -34,45 +41,22 @@ def tickets_store():
 
 
 @pytest.fixture(scope="module")
-def quota_types(superuser):
-    quota_types_store = []
-    
-    quota_type_create_route = PreparedTestRequest("POST", '/quotaType/create')
-    quota_type_delete_route = PreparedTestRequest("DELETE", '/quotaType/delete')
-    for _ in range(10):
-        jsonData = {'name': commons.generate_random_hex(randomLength=8)}
-        res = quota_type_create_route(_with=superuser, json=jsonData)
-        assert res.ok
-        jsonData.update(res.json()['quotaType'])
-        quota_types_store.append(jsonData.copy())
+def invitations(manager_sessions, module_dataset):
+    generated_invitations = [{'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1000} for client in manager_sessions]
+    created_invitations = module_dataset.create_invitations(generated_invitations)
     
-    yield quota_types_store
-    
-    for quota_type in quota_types_store:
-        res2 = quota_type_delete_route(_with=superuser, json=quota_type)
-        assert res2.ok
+    yield {commons.Role(client.info['role']): invitation for client, invitation in zip(manager_sessions, created_invitations)}
+    # Deletion handled by module_dataset fixture
 
 
 @pytest.fixture(scope="module")
-def invitations(manager_sessions, superuser):
-    invitations_store = {}
-    
-    invitation_create_route = PreparedTestRequest("POST", '/invitation/create')
-    invitation_delete_route = PreparedTestRequest("DELETE", '/invitation/delete')
+def import_invitations(manager_sessions, module_dataset):
+    "Kept apart from `invitations`, whose tickets are checked against tickets_store"
+    generated_invitations = [{'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1000} for client in manager_sessions]
+    created_invitations = module_dataset.create_invitations(generated_invitations)
     
-    for client in manager_sessions:
-        client_role = commons.Role(client.info['role'])
-        generated_invitation = {'name': commons.generate_random_hex(randomLength=8), 'organisationId': client.info['organisationManaged']['UUID'], 'usageQuota': 1000}
-        res1 = invitation_create_route.x(_with=client, json=generated_invitation)
-        assert res1.ok
-        generated_invitation.update(res1.json()['invitation'])
-        invitations_store[client_role] = generated_invitation
-    
-    yield invitations_store
-    
-    for invitation in invitations_store.values():
-        res3 = invitation_delete_route.x(_with=superuser, json=invitation)
-        assert res3.ok
+    yield {commons.Role(client.info['role']): invitation for client, invitation in zip(manager_sessions, created_invitations)}
+    # Deletion handled by module_dataset fixture
 
 
 # Create
@@ -81,7 +65,7 @@ def test_create(all_sessions, tickets_store, subtests, invitations):
         client_role = commons.Role(client.info['role'])
         with subtests.test(msg="'%s': Creating ticket" % client_role.name):
             for creator_role, invitation in invitations.items():
-                jsonData = {'ownerName': commons.FAKE.unique.name(), 
+                jsonData = {'ownerName': commons.generate_unique_name(), 
                             'ownerContacts': {'email': commons.FAKE.unique.email(), 'phone_number': commons.FAKE.unique.msisdn()}, 
                             'invitationId': invitation['UUID']}
                 res = Test.create.x(_with=client, json=jsonData)
@@ -90,6 +74,74 @@ def test_create(all_sessions, tickets_store, subtests, invitations):
                 tickets_store[creator_role].append(res.json()['ticket'])
 
 
+# Import
+@pytest.mark.parametrize('format', ['ndjson', 'csv'])
+def test_import(all_sessions, import_invitations, subtests, format):
+    for client in all_sessions:
+        client_role = commons.Role(client.info['role'])
+        with subtests.test(msg="'%s': Importing tickets as %s" % (client_role.name, format)):
+            for creator_role, invitation in import_invitations.items():
+                rows = [generate_ticket_input(invitation['UUID']) for _ in range(5)]
+                res = commons.import_tickets(client, invitation['UUID'], rows, format)
+                
+                if not (client_role >= commons.Role.ADMIN or (creator_role==client_role and client_role >= commons.Role.ORGANISATION_MANAGER)):
+                    assert not res.ok
+                    continue
+                
+                assert res.ok, res
+                result = res.json()
+                assert result['created'] == len(rows) and result['errors'] == [], result
+                imported, _ = commons.fetch_pages(Test.base, 'tickets', client, {'invitationId': invitation['UUID']})
+                importedNames = {ticket['ownerName']: ticket for ticket in imported}
+                for row in rows:
+                    assert importedNames[row['ownerName']]['ownerContacts'] == row['ownerContacts']
+
+
+def test_import_row_errors(superuser, module_dataset):
+    [organisation] = module_dataset.create_organisations(1)
+    [invitation] = module_dataset.create_invitations([{'organisationId': organisation['UUID'], 'usageQuota': 3}])
+    [existing] = module_dataset.create_tickets([invitation['UUID']])
+    rows = [generate_ticket_input(invitation['UUID']) for _ in range(4)]
+    rows[1]['ownerName'] = 'ab' # too short
+    rows[2]['ownerName'] = existing['ownerName'] # taken
+    rows.insert(3, dict(rows[0])) # duplicate within the import
+    
+    res = commons.import_tickets(superuser, invitation['UUID'], rows)
+    assert res.ok, res
+    result = res.json()
+    # 2 usages are left for rows 1 and 5, row 2 is invalid, 3 taken, 4 a duplicate of row 1
+    assert result['created'] == 2 and result['usageLeft'] == 0, result
+    assert [(error['row'], sorted(error['errors'])) for error in result['errors']] == [(2, ['name']), (3, ['name']), (4, ['name'])]
+    assert result['errors'][1]['errors']['name'] == 'Name is already taken'
+    assert result['failed'] == 3 and result['errorsOmitted'] == 0
+    
+    res = commons.import_tickets(superuser, invitation['UUID'], [generate_ticket_input(invitation['UUID'])])
+    assert res.ok
+    assert res.json()['created'] == 0
+    assert res.json()['errors'][0]['errors'] == {'row': 'Invitation has no usage left'}
+
+
+def test_import_errors_capped(superuser, import_invitations):
+    "Past MAX_IMPORT_ERRORS, row errors are counted but not listed"
+    invitation = import_invitations[commons.Role.SUPER_ADMIN]
+    rows = [{**generate_ticket_input(invitation['UUID']), 'ownerName': 'ab'} for _ in range(MAX_IMPORT_ERRORS + 10)]
+    res = commons.import_tickets(superuser, invitation['UUID'], rows)
+    assert res.ok, res
+    result = res.json()
+    assert result['created'] == 0 and result['failed'] == len(rows), {key: value for key, value in result.items() if key != 'errors'}
+    assert len(result['errors']) == MAX_IMPORT_ERRORS and result['errorsOmitted'] == 10
+
+
+def test_import_invalid_body(superuser, import_invitations):
+    invitation = import_invitations[commons.Role.SUPER_ADMIN]
+    res = Test.import_many.x(_with=superuser, _path_formats=invitation['UUID'], json=[generate_ticket_input(invitation['UUID'])])
+    assert res.status_code == 415
+    
+    res = Test.import_many.x(_with=superuser, _path_formats=invitation['UUID'], data=b'{"ownerName": \n', headers={'Content-Type': 'application/x-ndjson'})
+    assert res.ok
+    assert res.json()['errors'] == [{'row': 1, 'errors': {'row': 'Invalid JSON'}}]
+
+
 # Get all
 def test_get_all(all_sessions, subtests):
     for client in all_sessions:
@@ -103,6 +155,52 @@ def test_get_all(all_sessions, subtests):
                 assert not res.ok
 
 
+# Get all, a page at a time
+def test_get_all_paginated(superuser, invitations, tickets_store, subtests):
+    for creator_role, invitation in invitations.items():
+        with subtests.test(msg="'%s': Paginating tickets of an invitation" % creator_role.name):
+            params = {'invitationId': invitation['UUID'], 'sort': 'createdTime', 'order': 'desc'}
+            res = Test.base.x(_with=superuser, params={**params, **commons.ALL_ROWS})
+            assert res.ok
+            assert res.json()['nextCursor'] is None
+            everything = res.json()['tickets']
+            assert {ticket['UUID'] for ticket in everything} == {ticket['UUID'] for ticket in tickets_store[creator_role]}
+            
+            rows, pages = commons.fetch_pages(Test.base, 'tickets', superuser, params, limit=2)
+            assert [ticket['UUID'] for ticket in rows] == [ticket['UUID'] for ticket in everything]
+            assert pages >= len(everything)//2
+            assert all(ticket['invitationId'] == invitation['UUID'] for ticket in rows)
+            createdTimes = [ticket['createdTime'] for ticket in rows]
+            assert createdTimes == sorted(createdTimes, reverse=True)
+        
+        with subtests.test(msg="'%s': Filtering tickets by email status" % creator_role.name):
+            unsent, _ = commons.fetch_pages(Test.base, 'tickets', superuser, {'invitationId': invitation['UUID'], 'sentEmail': 'unsent'})
+            sent, _ = commons.fetch_pages(Test.base, 'tickets', superuser, {'invitationId': invitation['UUID'], 'sentEmail': 'sent'})
+            assert all(ticket['sentEmail'] == '' for ticket in unsent)
+            assert all(ticket['sentEmail'] != '' for ticket in sent)
+            assert len(unsent) + len(sent) == len(tickets_store[creator_role])
+
+
+def test_get_all_by_quota_type(superuser, module_dataset):
+    [organisation] = module_dataset.create_organisations(1)
+    [quotaType, otherQuotaType] = module_dataset.create_quota_types(2)
+    [invitation, otherInvitation] = module_dataset.create_invitations([
+        {'organisationId': organisation['UUID'], 'usageQuota': 3, 'defaultQuotas': [{'quotaTypeId': quotaType['UUID'], 'value': 1}]},
+        {'organisationId': organisation['UUID'], 'usageQuota': 2, 'defaultQuotas': [{'quotaTypeId': otherQuotaType['UUID'], 'value': 1}]}
+    ])
+    tickets = module_dataset.create_tickets([invitation['UUID']]*3)
+    module_dataset.create_tickets([otherInvitation['UUID']]*2)
+
+    rows, _ = commons.fetch_pages(Test.base, 'tickets', superuser, {'organisationId': organisation['UUID'], 'quotaTypeId': quotaType['UUID']})
+    assert {ticket['UUID'] for ticket in rows} == {ticket['UUID'] for ticket in tickets}
+
+
+@pytest.mark.parametrize('params', [{'limit': 0}, {'limit': 'x'}, {'after': 'not-a-cursor'}, {'sort': 'ownerContacts'}, {'sentEmail': 'maybe'}, {'quotaTypeId': 'not-a-uuid'}])
+def test_get_all_invalid_query(superuser, params):
+    res = Test.base.x(_with=superuser, params=params)
+    assert res.status_code == 400, res
+
+
 # Get one (always public)
 def test_get_one(all_sessions, tickets_store, subtests):
     for client in all_sessions:
@@ -122,7 +220,7 @@ def test_update(all_sessions, tickets_store, subtests):
             for tickets in tickets_store.values():
                 for ticket in tickets:
                     jsonData = ticket.copy()
-                    jsonData['ownerName'] = commons.FAKE.unique.name()
+                    jsonData['ownerName'] = commons.generate_unique_name()
                     jsonData['ownerContacts'] = {'email': commons.FAKE.unique.email(), 'phone_number': commons.FAKE.unique.msisdn()}
                     res = Test.update.x(_with=client, json=jsonData)
                     assert res.ok
@@ -75,7 +75,7 @@ def test_get_all(all_sessions, subtests):
     for client in all_sessions:
         client_role = commons.Role(client.info['role'])
         with subtests.test(msg="'%s': Get all" % client_role.name):
-            res = Test.base.x(_with=client)
+            res = Test.base.x(_with=client, params=commons.ALL_ROWS)
             if client_role < commons.Role.ADMIN:
                 assert not res.ok
                 pytest.xfail(reason="Requires at least admin privileges. (client_role='%s')" % (client_role.name))
@@ -85,6 +85,24 @@ def test_get_all(all_sessions, subtests):
                     assert user['role']<client_role, user
 
 
+# Get all, a page at a time
+def test_get_all_paginated(superuser, users_store, subtests):
+    for role, users in users_store.items():
+        if not users: continue
+        with subtests.test(msg="'%s': Paginating users of a role" % commons.Role(role).name):
+            params = {'role': role, 'sort': 'username'}
+            res = Test.base.x(_with=superuser, params={**params, **commons.ALL_ROWS})
+            assert res.ok
+            everything = res.json()['users']
+            assert {user['UUID'] for user in users} <= {user['UUID'] for user in everything}
+            assert all(user['role'] == role for user in everything)
+            
+            # Other workers may create or delete users meanwhile, only those of this one are compared
+            rows, _ = commons.fetch_pages(Test.base, 'users', superuser, params, limit=2)
+            assert [user['UUID'] for user in rows if commons.in_namespace(user['username'])] \
+                == [user['UUID'] for user in everything if commons.in_namespace(user['username'])]
+
+
 # Get one
 def test_get_one(all_sessions, superuser, admin, users_store, subtests):
     for client in all_sessions:
@@ -153,7 +171,7 @@ def test_update_username(all_sessions, superuser, users_store, subtests):
                 target_original_role = commons.Role(target['role'])
                 
                 jsonData = target.copy()
-                jsonData['username'] = commons.FAKE.unique.name()
+                jsonData['username'] = commons.generate_unique_name()
                 res = Test.update.x(_with=client, json=jsonData)
                 
                 if client_role < commons.Role.ADMIN or client_role <= target_original_role:
@@ -196,7 +214,7 @@ def test_update_organisation(all_sessions, superuser, users_store, subtests):
                 target_original_role = commons.Role(target['role'])
                 
                 jsonData = target.copy()
-                jsonData['organisationName'] = commons.FAKE.unique.company()
+                jsonData['organisationName'] = commons.generate_unique_company()
                 res = Test.update.x(_with=client, json=jsonData)
                 
                 if client_role < commons.Role.ADMIN or client_role <= target_original_role:
@@ -238,11 +256,12 @@ def test_delete_all_users(all_sessions, subtests):
     for client in all_sessions:
         client_role = commons.Role(client.info['role'])
         with subtests.test(msg="'%s': Deleting users" % client_role.name):
-            get_all_res = Test.base.x(_with=client)
+            get_all_res = Test.base.x(_with=client, params=commons.ALL_ROWS)
             if client_role < commons.Role.ADMIN:
                 assert not get_all_res.ok
                 continue
             
             for user in get_all_res.json()['users']:
+                if not commons.in_namespace(user['username']): continue # Belongs to another worker
                 del_res = Test.delete.x(_with=client, json={'UUID': user['UUID']})
                 assert del_res.ok, (user, del_res)
@@ -0,0 +1,85 @@
+import re
+import json
+import time
+import secrets
+import itertools
+import threading
+from typing import Dict, Iterator, List
+
+
+# Never written to the log, passwords are replaced by random ones so the requests can still be replayed
+SECRET_KEYS = ['password', 'newPassword', 'apiKey']
+AUTH_PATHS = ['/user/login', '/user/logout', '/user/refreshToken']
+UUID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+
+def redact(body):
+    if isinstance(body, list):
+        return [redact(item) for item in body]
+    if isinstance(body, dict):
+        return {key: secrets.token_hex(8) if key in SECRET_KEYS else redact(value) for key, value in body.items()}
+    return body
+
+
+def find_uuids(content: str):
+    "UUIDs in order of first appearance"
+    return list(dict.fromkeys(UUID_PATTERN.findall(content)))
+
+
+class TrafficLog:
+    """Append-only json lines log of the requests sent by the test sessions, for tests/replay.py.
+
+    Each line is a request with short keys: `t` seconds since the recording started, `s` id of the session which sent
+    it, `r` role of that session, `m` method, `p` path, `q` query params, `b` json body, `st` status, `d` duration (ms)
+    and `ids` the UUIDs found in the response, which let the replayer map records created while recording to the ones
+    created while replaying. Credentials and tokens are never written."""
+    def __init__(self):
+        self.path: str | None = None
+        self._file = None
+        self._start = 0.0
+        self._sessionIds = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def open(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', buffering=1)
+        self._start = time.time()
+
+    def close(self):
+        if self._file is None: return
+        self._file.close()
+        self._file = None
+
+    def session_id(self):
+        return next(self._sessionIds)
+
+    def record(self, sessionId: int, role: int, method: str, path: str, params, body, status: int, duration: float, content: str):
+        if self._file is None: return
+        entry = {'t': round(time.time() - duration - self._start, 4), 's': sessionId, 'r': role,
+                 'm': method.upper(), 'p': path, 'st': status, 'd': round(duration*1000, 2)}
+        if params: entry['q'] = params
+        if body is not None and path.split('?')[0] not in AUTH_PATHS: entry['b'] = redact(body)
+        ids = find_uuids(content)
+        if ids: entry['ids'] = ids
+        line = json.dumps(entry, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+
+
+def read_log(path: str) -> Iterator[Dict]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def split_sessions(entries: List[Dict]) -> Dict[int, List[Dict]]:
+    "Groups the entries per recorded session, each group in the order it was sent"
+    sessions: Dict[int, List[Dict]] = {}
+    for entry in sorted(entries, key=lambda entry: entry['t']):
+        sessions.setdefault(entry['s'], []).append(entry)
+    return sessions
@@ -0,0 +1,105 @@
+import { Prisma } from "@prisma/client";
+import { Response } from "../types";
+import { BADGES_PER_PAGE, Badge, PAGE_HEIGHT, PAGE_WIDTH } from "../workers/badgePage";
+import { qrKinds } from "./qrImages";
+import { ticketChunks } from "./ticketExport";
+import { cpuPool } from "./workerPool";
+
+// Tickets of a sheet given by UUID at most, larger sheets are better asked for by invitation or organisation
+export const MAX_SHEET_TICKETS = 10000
+
+// Objects written before the pages, the page tree is written last as only then are its pages known
+const CATALOG = 1
+const PAGES = 2
+const FONT = 3
+
+
+// Writes a PDF object by object, keeping only the byte offset of each for the cross-reference table at the end
+class PdfStream {
+    private offset = 0
+    private offsets: number[] = []
+    private pages: number[] = []
+
+    constructor(private res: Response) { }
+
+    get pageCount() {
+        return this.pages.length
+    }
+
+    // Resolves once the response can take more, so pages are only rendered as fast as the client reads them
+    private write(chunk: string | Buffer) {
+        const buffer = typeof chunk === 'string' ? Buffer.from(chunk, 'latin1') : chunk
+        this.offset += buffer.length
+        if (this.res.write(buffer) || this.res.destroyed) return Promise.resolve()
+        return new Promise<void>((resolve) => {
+            const done = () => {
+                this.res.off('drain', done)
+                this.res.off('close', done)
+                resolve()
+            }
+            this.res.on('drain', done)
+            this.res.on('close', done)
+        })
+    }
+
+    private async object(id: number, body: string | Buffer[]) {
+        this.offsets[id] = this.offset
+        if (typeof body === 'string') return await this.write(`${id} 0 obj\n${body}\nendobj\n`)
+        for (const part of [Buffer.from(`${id} 0 obj\n`), ...body, Buffer.from('\nendobj\n')]) await this.write(part)
+    }
+
+    async begin() {
+        await this.write('%PDF-1.4\n%\xE2\xE3\xCF\xD3\n')
+        await this.object(CATALOG, `<< /Type /Catalog /Pages ${PAGES} 0 R >>`)
+        await this.object(FONT, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    }
+
+    // content is the deflated content stream of the page
+    async page(content: Buffer) {
+        const contents = this.offsets.length
+        const page = contents + 1
+        await this.object(contents, [Buffer.from(`<< /Length ${content.length} /Filter /FlateDecode >>\nstream\n`), content, Buffer.from('\nendstream')])
+        await this.object(page, `<< /Type /Page /Parent ${PAGES} 0 R /MediaBox [0 0 ${PAGE_WIDTH} ${PAGE_HEIGHT}] /Resources << /Font << /F1 ${FONT} 0 R >> >> /Contents ${contents} 0 R >>`)
+        this.pages.push(page)
+    }
+
+    async end() {
+        await this.object(PAGES, `<< /Type /Pages /Kids [${this.pages.map((page) => `${page} 0 R`).join(' ')}] /Count ${this.pages.length} >>`)
+        const xref = this.offset
+        const entries = Array.from(this.offsets, (offset) => `${String(offset).padStart(10, '0')} 00000 n \n`)
+        await this.write(`xref\n0 ${this.offsets.length}\n0000000000 65535 f \n${entries.slice(1).join('')}`)
+        await this.write(`trailer\n<< /Size ${this.offsets.length} /Root ${CATALOG} 0 R >>\nstartxref\n${xref}\n%%EOF\n`)
+    }
+}
+
+
+// Streams a printable PDF of badges, a QR code with the owner's name and ticket UUID each, for the tickets matching
+// where. The tickets are read a chunk at a time (see utils/ticketExport) and each page is rendered by the worker pool
+// once the previous one was sent, so memory stays bounded by a chunk whatever the count of tickets.
+export const streamBadgeSheet = async (res: Response, where: Prisma.TicketWhereInput, filename: string) => {
+    res.status(200)
+    res.set('Content-Type', 'application/pdf')
+    res.set('Content-Disposition', `attachment; filename="${filename}.pdf"`)
+    const pdf = new PdfStream(res)
+
+    try {
+        await pdf.begin()
+        let badges: Badge[] = []
+        for await (const chunk of ticketChunks(where)) {
+            if (res.destroyed) return
+            badges.push(...chunk.map(({ UUID, ownerName }) => ({ UUID, ownerName, content: `${qrKinds.ticket}/${UUID}` })))
+            while (badges.length >= BADGES_PER_PAGE) {
+                await pdf.page(await cpuPool.run('badgePage', badges.slice(0, BADGES_PER_PAGE)))
+                badges = badges.slice(BADGES_PER_PAGE)
+            }
+        }
+        // A PDF needs a page, an empty one tells there were no tickets
+        if (badges.length || !pdf.pageCount) await pdf.page(await cpuPool.run('badgePage', badges))
+        await pdf.end()
+        res.end()
+    } catch (e) {
+        console.log(e)
+        // Headers are already sent, cutting the response short is the only way to tell the client it is incomplete
+        res.destroy(e as Error)
+    }
+}
@@ -0,0 +1,82 @@
+import { addTiming } from "./serverTiming";
+
+type CacheEntry<V> = { value: V, expiresAt: number }
+
+
+// An in-process cache of at most maxEntries values, each kept for ttl ms after being loaded, the least recently used
+// is evicted first. Concurrent misses of a key share a single load. Each lookup adds a 'cache' Server-Timing entry
+// telling whether it hit.
+//
+// Every backend process has its own cache: delete() only reaches the process it is called in, the others see the
+// change once their copy expires.
+//
+// With countKeys, keyStats also counts the hits and misses of each key, kept across deletes and evictions, so only
+// for caches of a few fixed keys.
+export class TTLCache<V> {
+    private entries = new Map<string, CacheEntry<V>>()
+    private loading = new Map<string, Promise<V>>()
+    readonly stats = { hits: 0, misses: 0, evictions: 0 }
+    readonly keyStats = new Map<string, { hits: number, misses: number }>()
+
+    constructor(readonly name: string, readonly ttl: number, readonly maxEntries: number = 1000, readonly countKeys: boolean = false) { }
+
+    get size() {
+        return this.entries.size
+    }
+
+    // The cached value of key, or the value load resolves to, which is cached unless load throws
+    async get(key: string, load: () => Promise<V>): Promise<V> {
+        const entry = this.entries.get(key)
+        if (entry && entry.expiresAt > Date.now()) {
+            // Moves the key to the back of the Map, which keeps the keys in least recently used order
+            this.entries.delete(key)
+            this.entries.set(key, entry)
+            this.stats.hits++
+            if (this.countKeys) this.keyStat(key).hits++
+            addTiming('cache', 0, `${this.name} hit`)
+            return entry.value
+        }
+
+        this.stats.misses++
+        if (this.countKeys) this.keyStat(key).misses++
+        addTiming('cache', 0, `${this.name} miss`)
+        let pending = this.loading.get(key)
+        if (!pending) {
+            pending = load().then((value) => {
+                // A delete() while loading means value may already be stale
+                if (this.loading.get(key) === pending) this.set(key, value)
+                return value
+            }).finally(() => {
+                if (this.loading.get(key) === pending) this.loading.delete(key)
+            })
+            this.loading.set(key, pending)
+        }
+        return await pending
+    }
+
+    private keyStat(key: string) {
+        let stat = this.keyStats.get(key)
+        if (!stat) this.keyStats.set(key, stat = { hits: 0, misses: 0 })
+        return stat
+    }
+
+    set(key: string, value: V) {
+        if (this.ttl <= 0) return
+        this.entries.delete(key)
+        this.entries.set(key, { value, expiresAt: Date.now() + this.ttl })
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value as string)
+            this.stats.evictions++
+        }
+    }
+
+    delete(key: string) {
+        this.entries.delete(key)
+        this.loading.delete(key)
+    }
+
+    clear() {
+        this.entries.clear()
+        this.loading.clear()
+    }
+}
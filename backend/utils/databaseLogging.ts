@@ -1,4 +1,20 @@
+import { env } from "process";
 import { prismaClient, logActionT } from "../services/database";
+import { measure } from "./serverTiming";
+
+// LOG_WRITE_MODE=immediate writes each event before logEvent resolves, the default (buffered) queues the events and
+// writes them in batches, see LogQueue.
+const {
+    LOG_WRITE_MODE = 'buffered',
+    LOG_BATCH_SIZE = '200',
+    LOG_FLUSH_INTERVAL = '500',
+    LOG_QUEUE_LIMIT = '10000',
+    LOG_OVERFLOW = 'block',
+    LOG_WRITE_ATTEMPTS = '5'
+} = env;
+
+// Delay before writing again after a failed write, the events stay queued meanwhile
+const RETRY_INTERVAL = 2000
 
 interface logEventArgs {
     event: logActionT,
@@ -6,14 +22,142 @@ interface logEventArgs {
     description?: string
 }
 
-export const logEvent = async ({ event, summary, description="" }: logEventArgs) => {
-    return await prismaClient.log.create({
-        data: {
-            summary: summary,
-            description: description,
-            logAction: {
-                connect: { name: event }
+type QueuedLog = { logActionId: number, summary: string, description: string, at: Date }
+
+
+// LogAction ids by name, the actions are seeded once and never change
+const logActionIds = new Map<string, number>()
+
+export const getLogActionId = async (name: logActionT) => {
+    if (!logActionIds.has(name)) {
+        const logActions = await prismaClient.logAction.findMany({ select: { id: true, name: true } })
+        logActions.forEach(({ id, name }) => logActionIds.set(name, id))
+    }
+    const id = logActionIds.get(name)
+    if (id === undefined) throw new Error(`Unknown LogAction '${name}', is the database seeded?`)
+    return id
+}
+
+
+// A bounded in-process queue of log events, written with a single createMany per batch: once batchSize events are
+// queued, or flushInterval ms after the first event of a batch was queued, whichever comes first. Each event keeps the
+// time it was logged at.
+//
+// When the queue holds limit events (e.g. the database is slow or down), overflow decides: 'block' makes logEvent wait
+// for room, slowing down the requests which log instead of growing the queue, 'drop' discards the event and counts it.
+// Failed writes are retried every RETRY_INTERVAL ms, up to maxAttempts writes of a batch in all. The events of a batch
+// given up on are then written one at a time, and those which still fail are dropped and counted, so a bad event can
+// not hold up the queue (and, with 'block', every request which logs) for good. Queued events are lost if the process
+// dies before they are written, flushLogs writes them on shutdown (see index.ts).
+export class LogQueue {
+    private queue: QueuedLog[] = []
+    private flushing: Promise<void> | null = null
+    private timer: NodeJS.Timeout | null = null
+    private waiting: (() => void)[] = []
+    // Failed writes of the batch at the head of the queue
+    private attempts = 0
+    readonly stats = { queued: 0, written: 0, dropped: 0, failedWrites: 0, lastWriteAt: null as Date | null, lastError: null as string | null }
+
+    constructor(readonly batchSize: number, readonly flushInterval: number, readonly limit: number, readonly overflow: 'block' | 'drop',
+                readonly maxAttempts: number = 5) { }
+
+    get pending() {
+        return this.queue.length
+    }
+
+    async push(entry: QueuedLog) {
+        while (this.queue.length >= this.limit) {
+            if (this.overflow === 'drop') {
+                this.stats.dropped++
+                return
             }
+            await new Promise<void>((resolve) => this.waiting.push(resolve))
         }
-    })
+
+        this.queue.push(entry)
+        this.stats.queued++
+        if (this.queue.length >= this.batchSize) this.flush()
+        else this.schedule(this.flushInterval)
+    }
+
+    private schedule(delay: number) {
+        if (this.timer) return
+        this.timer = setTimeout(() => {
+            this.timer = null
+            this.flush()
+        }, delay)
+        this.timer.unref()
+    }
+
+    // Resolves once the queue is empty, or once a write failed (a retry is then scheduled)
+    flush() {
+        if (!this.flushing) this.flushing = this.drain().finally(() => { this.flushing = null })
+        return this.flushing
+    }
+
+    private async drain() {
+        while (this.queue.length) {
+            const batch = this.queue.slice(0, this.batchSize)
+            let written = batch.length
+            try {
+                await measure('log', () => prismaClient.log.createMany({ data: batch }), `${batch.length} events`)
+            } catch (e) {
+                console.log(e)
+                this.stats.failedWrites++
+                this.stats.lastError = String(e)
+                if (++this.attempts < this.maxAttempts) {
+                    this.schedule(RETRY_INTERVAL)
+                    return
+                }
+                written = await this.writeEach(batch)
+            }
+            this.attempts = 0
+            // Events queued meanwhile are behind the batch
+            this.queue.splice(0, batch.length)
+            this.stats.written += written
+            this.stats.lastWriteAt = new Date()
+            this.waiting.splice(0, this.limit - this.queue.length).forEach((resolve) => resolve())
+        }
+    }
+
+    // Writes the events of a batch given up on one at a time, drops those which fail, returns the count written
+    private async writeEach(batch: QueuedLog[]) {
+        let written = 0
+        for (const entry of batch) {
+            try {
+                await prismaClient.log.create({ data: entry })
+                written++
+            } catch (e) {
+                this.stats.dropped++
+                this.stats.lastError = String(e)
+            }
+        }
+        if (written < batch.length) console.log(`Dropped ${batch.length - written} audit log events after ${this.maxAttempts} failed writes`)
+        return written
+    }
+}
+
+export const logQueue = new LogQueue(parseInt(LOG_BATCH_SIZE), parseInt(LOG_FLUSH_INTERVAL), parseInt(LOG_QUEUE_LIMIT), LOG_OVERFLOW === 'drop' ? 'drop' : 'block',
+    Math.max(1, parseInt(LOG_WRITE_ATTEMPTS)))
+export const logWriteMode = LOG_WRITE_MODE === 'immediate' ? 'immediate' : 'buffered'
+
+
+export const logEvent = async ({ event, summary, description="" }: logEventArgs) => {
+    const entry = { logActionId: await getLogActionId(event), summary, description, at: new Date() }
+    if (logWriteMode === 'immediate') {
+        await measure('log', () => prismaClient.log.create({ data: entry }), summary)
+        return
+    }
+    await logQueue.push(entry)
+}
+
+
+// Writes every queued event, gives up after timeout ms (e.g. the database is unreachable), returns the events left
+export const flushLogs = async (timeout: number = 10000) => {
+    const deadline = Date.now() + timeout
+    while (logQueue.pending && Date.now() < deadline) {
+        await logQueue.flush()
+        if (logQueue.pending) await new Promise((resolve) => setTimeout(resolve, 100))
+    }
+    return logQueue.pending
 }
@@ -0,0 +1,20 @@
+import { env } from "process";
+import { Prisma } from "@prisma/client";
+import { prismaClient } from "../services/database";
+import { TTLCache } from "./cache";
+
+// How long a config value is served from memory, 0 reads it from the database every time
+const { CONFIG_CACHE_TTL = '60000' } = env;
+
+export const configCache = new TTLCache<Prisma.JsonValue>('config', parseInt(CONFIG_CACHE_TTL), 1000, true)
+
+
+// The value of the INTERNALS_InvetixiaConfig row named name, throws as findUniqueOrThrow does if there is none
+export const getConfig = (name: string) => configCache.get(name, async () => {
+    const { value } = await prismaClient.iNTERNALS_InvetixiaConfig.findUniqueOrThrow({ where: { name } })
+    return value
+})
+
+
+// To be called on every write to the config, so this process serves the new value from then on
+export const invalidateConfig = (name: string) => configCache.delete(name)
@@ -0,0 +1,84 @@
+import { env } from "process";
+import { prismaClient } from "../services/database";
+
+// LOG_RETENTION_DAYS=0 (the default) keeps the logs forever, LOG_RETENTION_ARCHIVE=1 moves the old rows to LogArchive
+// instead of deleting them.
+const {
+    LOG_RETENTION_DAYS = '0',
+    LOG_RETENTION_ARCHIVE = '0',
+    LOG_RETENTION_INTERVAL = '3600000'
+} = env;
+
+// Rows removed per statement, each batch is its own short transaction so writers to Log are never held up for long
+export const RETENTION_BATCH_SIZE = 5000
+// Pause between batches, leaves the database some room while a large backlog is pruned
+const RETENTION_BATCH_PAUSE = 50
+
+const DAY = 24 * 60 * 60 * 1000
+
+
+const deleteBatch = async (before: Date) => {
+    const [{ count }] = await prismaClient.$queryRaw<{ count: number }[]>`
+        WITH old AS (
+            SELECT id FROM "Log" WHERE "at" < ${before} ORDER BY "at" LIMIT ${RETENTION_BATCH_SIZE} FOR UPDATE SKIP LOCKED
+        ), deleted AS (
+            DELETE FROM "Log" WHERE id IN (SELECT id FROM old) RETURNING id
+        )
+        SELECT COUNT(*)::int AS count FROM deleted
+    `
+    return count
+}
+
+const archiveBatch = async (before: Date) => {
+    const [{ count }] = await prismaClient.$queryRaw<{ count: number }[]>`
+        WITH old AS (
+            SELECT id FROM "Log" WHERE "at" < ${before} ORDER BY "at" LIMIT ${RETENTION_BATCH_SIZE} FOR UPDATE SKIP LOCKED
+        ), deleted AS (
+            DELETE FROM "Log" WHERE id IN (SELECT id FROM old) RETURNING *
+        ), archived AS (
+            INSERT INTO "LogArchive" (id, summary, description, "logAction", "at")
+            SELECT deleted.id, deleted.summary, deleted.description, "LogAction".name, deleted."at"
+            FROM deleted LEFT JOIN "LogAction" ON "LogAction".id = deleted."logActionId"
+            ON CONFLICT (id) DO NOTHING
+            RETURNING id
+        )
+        SELECT COUNT(*)::int AS count FROM deleted
+    `
+    return count
+}
+
+
+// Deletes (or archives) the log rows older than before, batch by batch, oldest first. Returns the rows removed.
+export const pruneLogs = async (before: Date, archive: boolean = parseInt(LOG_RETENTION_ARCHIVE) > 0) => {
+    const removeBatch = archive ? archiveBatch : deleteBatch
+    let removed = 0
+    while (true) {
+        const count = await removeBatch(before)
+        removed += count
+        if (count < RETENTION_BATCH_SIZE) return removed
+        await new Promise((resolve) => setTimeout(resolve, RETENTION_BATCH_PAUSE))
+    }
+}
+
+
+// Prunes the rows older than LOG_RETENTION_DAYS every LOG_RETENTION_INTERVAL ms, does nothing if retention is off
+export const scheduleLogRetention = () => {
+    const days = parseFloat(LOG_RETENTION_DAYS)
+    if (!(days > 0)) return
+
+    let running = false
+    const run = async () => {
+        if (running) return
+        running = true
+        try {
+            const removed = await pruneLogs(new Date(Date.now() - days * DAY))
+            if (removed) console.log(`Log retention removed ${removed} rows older than ${days} days`)
+        } catch (e) {
+            console.log(e)
+        } finally {
+            running = false
+        }
+    }
+    run()
+    setInterval(run, parseInt(LOG_RETENTION_INTERVAL)).unref()
+}
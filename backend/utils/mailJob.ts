@@ -0,0 +1,260 @@
+import { env } from "process";
+import os from "os";
+import { randomBytes } from "crypto";
+import { prismaClient } from "../services/database";
+import { composeTicketEmails, EmailTicket, getResend, getTicketEmailEvent, markSent, onResendAuth, TicketEmailEvent, ticketEmailAddress } from "../services/email";
+
+// Resend takes at most 100 emails per batch request, and 2 requests per second unless the account's limit was raised
+const {
+    MAIL_BATCH_SIZE = '100',
+    MAIL_CONCURRENCY = '2',
+    MAIL_RATE_LIMIT = '2',
+    MAIL_RETRY_ATTEMPTS = '5',
+    MAIL_JOB_LEASE = '60000'
+} = env;
+
+const BATCH_SIZE = Math.min(100, parseInt(MAIL_BATCH_SIZE))
+const CONCURRENCY = Math.max(1, parseInt(MAIL_CONCURRENCY))
+const REQUEST_INTERVAL = 1000 / parseFloat(MAIL_RATE_LIMIT)
+const RETRY_ATTEMPTS = Math.max(1, parseInt(MAIL_RETRY_ATTEMPTS))
+// Delay before the first retry, doubled for each following one
+const RETRY_DELAY = 1000
+// ms a process holds a job for without renewing it, it renews every third of it while running the job
+const LEASE = Math.max(3000, parseInt(MAIL_JOB_LEASE))
+// Names this process in the leases it holds
+const PROCESS_ID = `${os.hostname()}:${process.pid}:${randomBytes(4).toString('hex')}`
+
+type BatchResult = { sent: number, failed: number, lastError: string }
+type Batch = { last: string, done: boolean, settled: Promise<void> }
+type RunningJob = { stopping: boolean, finished: Promise<void> }
+
+// Jobs ran by this process, by UUID
+const runningJobs = new Map<string, RunningJob>()
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+
+// Spaces the requests to Resend REQUEST_INTERVAL ms apart, whichever batch sends them
+let nextRequestAt = 0
+const rateLimit = async () => {
+    const now = Date.now()
+    const at = Math.max(now, nextRequestAt)
+    nextRequestAt = at + REQUEST_INTERVAL
+    if (at > now) await sleep(at - now)
+}
+
+
+// Writes the deliveries, retried as the emails are already sent: losing them would mail the tickets again
+const markSentWithRetry = async (deliveries: { UUID: string, sentEmail: string }[]) => {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            return await markSent(deliveries)
+        } catch (e) {
+            if (attempt >= RETRY_ATTEMPTS) throw e
+            await sleep(RETRY_DELAY * 2 ** (attempt - 1))
+        }
+    }
+}
+
+
+// Sends the emails of the tickets in a single batch request, then again for those Resend did not accept, with an
+// exponential backoff (and jitter, so parallel batches do not retry in step), up to RETRY_ATTEMPTS times in all.
+// Tickets without an email address, and those still not accepted after that, are given up on.
+const sendBatch = async (tickets: EmailTicket[], event: TicketEmailEvent): Promise<BatchResult> => {
+    const deliveries: { UUID: string, sentEmail: string }[] = []
+    let pending = tickets.filter((ticket) => ticketEmailAddress(ticket))
+    const unaddressed = tickets.length - pending.length
+    let lastError = unaddressed ? 'Tickets without an email address' : ''
+    const emails = new Map<string, Awaited<ReturnType<typeof composeTicketEmails>>[number]>()
+
+    for (let attempt = 1; pending.length && attempt <= RETRY_ATTEMPTS; attempt++) {
+        if (attempt > 1) await sleep(RETRY_DELAY * 2 ** (attempt - 2) * (0.5 + Math.random()))
+        try {
+            const resend = getResend()
+            if (!resend) throw new Error('Resend is not authenticated')
+            if (!emails.size) {
+                const composed = await composeTicketEmails(pending, event)
+                pending.forEach((ticket, idx) => emails.set(ticket.UUID, composed[idx]))
+            }
+
+            await rateLimit()
+            const { data, error } = await resend.batch.send(pending.map((ticket) => emails.get(ticket.UUID)!))
+            if (error) throw new Error(error.message)
+
+            const rejected: EmailTicket[] = []
+            pending.forEach((ticket, idx) => {
+                const id = data?.data[idx]?.id
+                if (id) deliveries.push({ UUID: ticket.UUID, sentEmail: id })
+                else rejected.push(ticket)
+            })
+            if (rejected.length) lastError = `Resend did not accept ${rejected.length} emails`
+            pending = rejected
+        } catch (e) {
+            lastError = e instanceof Error ? e.message : String(e)
+        }
+    }
+
+    await markSentWithRetry(deliveries)
+    return { sent: deliveries.length, failed: pending.length + unaddressed, lastError }
+}
+
+
+// Mails every ticket without an email yet, in batches of BATCH_SIZE, CONCURRENCY at a time, reading the tickets in
+// UUID order. The job's cursor only moves past a batch once it and every batch before it are done, so a job resumed
+// after a restart carries on from the cursor: the tickets mailed meanwhile are skipped as their sentEmail is set, and
+// the ones in batches cut short are mailed then.
+const run = async (UUID: string, runningJob: RunningJob) => {
+    const job = await prismaClient.mailJob.findUniqueOrThrow({ where: { UUID } })
+    if (job.status !== 'running') return
+
+    const event = await getTicketEmailEvent()
+    let readCursor = job.cursor
+    let cursor = job.cursor
+    let exhausted = false
+    let failure: unknown = undefined
+    const inFlight: Batch[] = []
+
+    try {
+        while (!runningJob.stopping) {
+            // Left running, resumed once /email/auth is called (see resumeMailJobs)
+            if (!getResend()) break
+            const pending = inFlight.filter((batch) => !batch.done)
+            if (pending.length >= CONCURRENCY) {
+                await Promise.race(pending.map((batch) => batch.settled))
+                continue
+            }
+
+            const tickets = await prismaClient.ticket.findMany({
+                where: { sentEmail: "", UUID: { gt: readCursor } },
+                select: { UUID: true, ownerName: true, ownerContacts: true },
+                orderBy: { UUID: 'asc' },
+                take: BATCH_SIZE
+            })
+            if (!tickets.length) {
+                exhausted = true
+                break
+            }
+            readCursor = tickets[tickets.length - 1].UUID
+
+            const batch: Batch = { last: readCursor, done: false, settled: Promise.resolve() }
+            batch.settled = sendBatch(tickets, event).then(async ({ sent, failed, lastError }) => {
+                batch.done = true
+                while (inFlight.length && inFlight[0].done) cursor = (inFlight.shift() as Batch).last
+                await prismaClient.mailJob.update({
+                    where: { UUID },
+                    data: { cursor, sent: { increment: sent }, failed: { increment: failed }, ...(lastError ? { lastError } : {}) }
+                })
+            }).catch((e) => {
+                // The cursor stays before the batch, so a resumed job mails its tickets again if they were not marked
+                failure = e
+                runningJob.stopping = true
+            })
+            inFlight.push(batch)
+        }
+    } finally {
+        // Also when reading the tickets failed, the batches in flight are written before the job is let go
+        await Promise.all(inFlight.map((batch) => batch.settled))
+    }
+    if (failure) throw failure
+    if (exhausted) {
+        // A cancellation meanwhile is kept
+        await prismaClient.mailJob.updateMany({ where: { UUID, status: 'running' }, data: { status: 'done', finishedTime: new Date() } })
+    }
+}
+
+
+// Key of the advisory lock taken to start a job, any number no other lock of the database uses
+const START_LOCK = 240524
+
+// A job for every ticket without an email yet, or null when a job is running already. The check and the creation hold
+// an advisory lock, so concurrent requests, on this process or another, cannot both start a job and mail the same
+// tickets twice.
+export const createMailJob = () => prismaClient.$transaction(async (tx) => {
+    await tx.$executeRaw`SELECT pg_advisory_xact_lock(${START_LOCK})`
+    if (await tx.mailJob.count({ where: { status: 'running' } })) return null
+    return await tx.mailJob.create({ data: { total: await tx.ticket.count({ where: { sentEmail: "" } }) } })
+})
+
+export const hasRunningMailJob = async () => (await prismaClient.mailJob.count({ where: { status: 'running' } })) > 0
+
+
+// Takes or renews the lease of a running job, false when another process holds it or the job is no longer running
+const claim = async (UUID: string) => {
+    const now = new Date()
+    const { count } = await prismaClient.mailJob.updateMany({
+        where: { UUID, status: 'running', OR: [{ owner: PROCESS_ID }, { owner: "" }, { leaseUntil: { lt: now } }] },
+        data: { owner: PROCESS_ID, leaseUntil: new Date(now.getTime() + LEASE) }
+    })
+    return count > 0
+}
+
+const release = (UUID: string) => prismaClient.mailJob.updateMany({ where: { UUID, owner: PROCESS_ID }, data: { owner: "", leaseUntil: null } })
+
+
+// Runs the job in the background, unless this process or another one already does. The job is leased to a single
+// process at a time: the lease is renewed while the job runs, and once it can not be (the job was cancelled, by
+// any process, or another process took it over after the lease lapsed) no further batch is sent.
+export const runMailJob = (UUID: string) => {
+    if (runningJobs.has(UUID)) return
+    const runningJob: RunningJob = { stopping: false, finished: Promise.resolve() }
+    runningJobs.set(UUID, runningJob)
+    runningJob.finished = (async () => {
+        if (!await claim(UUID)) return
+        const heartbeat = setInterval(() => {
+            claim(UUID).then((held) => { if (!held) runningJob.stopping = true }).catch((e) => console.log(e))
+        }, LEASE / 3)
+        heartbeat.unref()
+        try {
+            await run(UUID, runningJob)
+        } finally {
+            clearInterval(heartbeat)
+            await release(UUID).catch((e) => console.log(e))
+        }
+    })()
+        .catch(async (e) => {
+            console.log(e)
+            // Left running and released, resumed by scheduleMailJobs
+            await prismaClient.mailJob.update({ where: { UUID }, data: { lastError: String(e) } }).catch(() => {})
+        })
+        .finally(() => runningJobs.delete(UUID))
+}
+
+export const isMailJobActive = (UUID: string) => runningJobs.has(UUID)
+
+
+// Stops the job after its batches in flight, its status is left as is
+export const stopMailJob = async (UUID: string) => {
+    const runningJob = runningJobs.get(UUID)
+    if (!runningJob) return
+    runningJob.stopping = true
+    await runningJob.finished
+}
+
+
+// Picks up the running jobs no process holds, those left by a restart or by a process which stopped renewing its
+// lease. Safe to call from any count of processes at once, as only the process taking the lease runs a job.
+export const resumeMailJobs = async () => {
+    if (!getResend()) return
+    const jobs = await prismaClient.mailJob.findMany({
+        where: { status: 'running', OR: [{ owner: "" }, { leaseUntil: { lt: new Date() } }] },
+        select: { UUID: true }
+    })
+    jobs.forEach(({ UUID }) => runMailJob(UUID))
+}
+
+// Resumes the jobs now and every LEASE ms, so the jobs of a process which stopped (or crashed) are taken over
+export const scheduleMailJobs = () => {
+    const resume = () => resumeMailJobs().catch((e) => console.log(e))
+    resume()
+    setInterval(resume, LEASE).unref()
+}
+
+// Lets the batches in flight finish, so their deliveries are written, gives up after timeout ms
+export const stopMailJobs = (timeout: number = 30000) => Promise.race([
+    Promise.all(Array.from(runningJobs.keys(), stopMailJob)),
+    sleep(timeout)
+])
+
+onResendAuth(() => {
+    resumeMailJobs().catch((e) => console.log(e))
+})
@@ -0,0 +1,48 @@
+import { z } from "zod";
+
+export const DEFAULT_PAGE_SIZE = 100
+export const MAX_PAGE_SIZE = 1000
+
+const UUIDValidator = z.string().uuid({ message: 'Invalid UUID' })
+
+
+// Query of a paginated list: ?limit=<rows>&after=<nextCursor of the previous page>&sort=<field>&order=asc|desc
+// ?all=true returns every row in one response, as the lists did before being paginated
+export const pageQueryValidator = <F extends string>(sortFields: [F, ...F[]]) => z.object({
+    all: z.enum(['true', 'false']).optional().transform((all) => all === 'true'),
+    limit: z.coerce.number().int().min(1).max(MAX_PAGE_SIZE).default(DEFAULT_PAGE_SIZE),
+    after: UUIDValidator.optional(),
+    sort: z.enum(sortFields).default(sortFields[0]),
+    order: z.enum(['asc', 'desc']).default('asc')
+})
+
+export const filterValidators = {
+    UUID: UUIDValidator.optional(),
+    sentEmail: z.enum(['sent', 'unsent']).optional(),
+    role: z.coerce.number().int().optional()
+}
+
+type PageQuery = { all: boolean, limit: number, after?: string, sort: string, order: 'asc' | 'desc' }
+
+
+// Arguments of findMany for the page, the UUID breaks ties between equal sort values so the order is total.
+// Prisma turns the cursor into a keyset condition on the sort values of the cursor's row, hence pages stay cheap
+// however deep they are, and rows inserted or deleted meanwhile do not shift the following pages.
+export const pageArgs = ({ all, limit, after, sort, order }: PageQuery) => {
+    const orderBy: Record<string, 'asc' | 'desc'>[] = sort === 'UUID' ? [{ UUID: order }] : [{ [sort]: order }, { UUID: order }]
+    if (all) return { orderBy }
+
+    return {
+        orderBy,
+        take: limit + 1, // One more row tells whether there is a next page
+        ...(after ? { cursor: { UUID: after }, skip: 1 } : {})
+    }
+}
+
+
+export const toPage = <T extends { UUID: string }>(rows: T[], { all, limit }: PageQuery) => {
+    if (all || rows.length <= limit) return { rows, nextCursor: null }
+
+    const page = rows.slice(0, limit)
+    return { rows: page, nextCursor: page[page.length - 1].UUID }
+}
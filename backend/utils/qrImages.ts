@@ -0,0 +1,85 @@
+import { env } from "process";
+import { createHash } from "crypto";
+import { mkdir, readFile, writeFile } from "fs/promises";
+import path from "path";
+import { prismaClient } from "../services/database";
+import { TTLCache } from "./cache";
+import { cpuPool } from "./workerPool";
+
+// QR_CACHE_SIZE is the count of images kept in memory, QR_CACHE_DIR (unset by default) also keeps the rendered images
+// on disk, so they survive restarts and outlive their eviction from memory. Only the images of existing invitations and
+// tickets are cached, the routes need no login so anyone could otherwise fill the caches with made up UUIDs.
+const {
+    PUBLIC_FRONTEND_BASE_INVITATION_URL,
+    PUBLIC_FRONTEND_BASE_TICKET_URL,
+    QR_CACHE_SIZE = '5000',
+    QR_CACHE_DIR
+} = env;
+
+export const qrKinds = { invitation: PUBLIC_FRONTEND_BASE_INVITATION_URL, ticket: PUBLIC_FRONTEND_BASE_TICKET_URL }
+export type QRKind = keyof typeof qrKinds
+
+export const qrFormats = { png: 'image/png', svg: 'image/svg+xml' }
+export type QRFormat = keyof typeof qrFormats
+
+// The body and strong ETag of a rendered image, known tells whether its invitation or ticket exists
+export type QRImage = { body: Buffer, etag: string, known: boolean }
+
+// The images never change for a UUID, only an eviction drops them
+export const qrCache = new TTLCache<QRImage>('qr', Infinity, parseInt(QR_CACHE_SIZE))
+export const qrDiskCache = Boolean(QR_CACHE_DIR)
+
+
+// Rendered off the event loop, see workers/cpuTasks
+const render = (content: string, format: QRFormat) => cpuPool.run('qr', { content, format })
+
+const toImage = (body: Buffer, known: boolean): QRImage => ({ body, etag: `"${createHash('sha256').update(body).digest('base64url')}"`, known })
+
+const exists = async (kind: QRKind, UUID: string) => {
+    const select = { UUID: true }
+    const row = kind === 'ticket'
+        ? await prismaClient.ticket.findUnique({ where: { UUID }, select })
+        : await prismaClient.invitation.findUnique({ where: { UUID }, select })
+    return row !== null
+}
+
+// UUIDs are validated by the callers, so the file names can not escape QR_CACHE_DIR
+const loadImage = async (kind: QRKind, UUID: string, format: QRFormat) => {
+    const content = `${qrKinds[kind]}/${UUID}`
+    // The content is part of the file name, so a change of the frontend url is not served stale images
+    const file = QR_CACHE_DIR && path.join(QR_CACHE_DIR, `${kind}-${UUID}-${createHash('sha1').update(content).digest('hex').slice(0, 8)}.${format}`)
+    if (file) {
+        // Only existing UUIDs are written, a file tells the UUID exists without a query
+        const body = await readFile(file).catch(() => undefined)
+        if (body) return toImage(body, true)
+    }
+
+    const [known, body] = await Promise.all([exists(kind, UUID), render(content, format)])
+    if (file && known) {
+        mkdir(QR_CACHE_DIR as string, { recursive: true })
+            .then(() => writeFile(file, body))
+            .catch((e) => console.log(e)) // The image is still served, it is rendered again next time
+    }
+    return toImage(body, known)
+}
+
+
+// The QR code linking to the frontend's page of the invitation or ticket, rendered once and then served from the cache.
+// The images of unknown UUIDs are still rendered, as the QR code does not depend on the row, but not kept.
+export const getQRImage = async (kind: QRKind, UUID: string, format: QRFormat = 'png') => {
+    const key = `${kind}/${UUID}.${format}`
+    const image = await qrCache.get(key, () => loadImage(kind, UUID, format))
+    if (!image.known) qrCache.delete(key)
+    return image
+}
+
+
+// Renders the PNGs of UUIDs in the background, one at a time so requests are served in between. Errors are only logged,
+// the images are then rendered on their first request instead.
+export const prerenderQRImages = (kind: QRKind, UUIDs: string[]) => {
+    (async () => {
+        for (const UUID of UUIDs) {
+            await getQRImage(kind, UUID)
+        }
+    })().catch((e) => console.log(e))
+}
@@ -0,0 +1,33 @@
+import { AsyncLocalStorage } from "async_hooks";
+import { performance } from "perf_hooks";
+
+type TimingEntry = { name: string, duration: number, description?: string }
+
+// Timings of the request being handled, only set when ENABLE_SERVER_TIMING is on (see middlewares/serverTiming)
+export const timingStorage = new AsyncLocalStorage<TimingEntry[]>()
+
+
+export const addTiming = (name: string, duration: number, description?: string) => {
+    timingStorage.getStore()?.push({ name, duration, description })
+}
+
+
+// Times fn within the current request, fn is ran as is outside of one
+export const measure = async <T>(name: string, fn: () => Promise<T> | T, description?: string): Promise<T> => {
+    if (!timingStorage.getStore()) return await fn()
+
+    const start = performance.now()
+    try {
+        return await fn()
+    } finally {
+        addTiming(name, performance.now() - start, description)
+    }
+}
+
+
+export const formatTimings = (entries: TimingEntry[]) => {
+    return entries.map(({ name, duration, description }) => {
+        const metric = `${name};dur=${duration.toFixed(2)}`
+        return description ? `${metric};desc="${description.replace(/["\\]/g, '')}"` : metric
+    }).join(', ')
+}
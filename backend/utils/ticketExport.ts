@@ -0,0 +1,116 @@
+import { Prisma } from "@prisma/client";
+import { prismaClient } from "../services/database";
+import { Response } from "../types";
+
+// Tickets read per query while exporting, only one chunk is held in memory at once
+export const EXPORT_CHUNK_SIZE = 500
+
+export const exportFormats = ['ndjson', 'csv'] as const
+export type ExportFormat = typeof exportFormats[number]
+
+const CSV_COLUMNS = ['UUID', 'ownerName', 'email', 'phone_number', 'organisation', 'invitation', 'createdTime', 'sentEmail', 'quotas']
+
+const exportSelect = {
+    UUID: true,
+    ownerName: true,
+    ownerContacts: true,
+    ownerAffiliationId: true,
+    ownerAffiliation: { select: { name: true } },
+    invitationId: true,
+    invitation: { select: { name: true } },
+    createdTime: true,
+    sentEmail: true,
+    quotas: {
+        orderBy: { quotaType: { name: 'asc' } },
+        select: {
+            UUID: true,
+            quotaTypeId: true,
+            quotaType: { select: { name: true } },
+            usageLeft: true
+        }
+    }
+} satisfies Prisma.TicketSelect
+
+type ExportedTicket = Prisma.TicketGetPayload<{ select: typeof exportSelect }>
+
+
+// Yields the tickets matching where, EXPORT_CHUNK_SIZE at a time, ordered by UUID so each chunk continues from the last row
+export async function* ticketChunks(where: Prisma.TicketWhereInput) {
+    let after: string | undefined = undefined
+    while (true) {
+        const chunk: ExportedTicket[] = await prismaClient.ticket.findMany({
+            where,
+            select: exportSelect,
+            orderBy: { UUID: 'asc' },
+            take: EXPORT_CHUNK_SIZE,
+            ...(after ? { cursor: { UUID: after }, skip: 1 } : {})
+        })
+        if (chunk.length) yield chunk
+        if (chunk.length < EXPORT_CHUNK_SIZE) return
+        after = chunk[chunk.length - 1].UUID
+    }
+}
+
+
+const csvCell = (value: unknown) => {
+    let cell = value === null || value === undefined ? '' : String(value)
+    // Keeps spreadsheets from evaluating user given values as formulas, numbers (e.g. phone numbers) are left as is
+    if (/^[=+\-@\t\r]/.test(cell) && !/^[+-]?\d+$/.test(cell)) cell = `'${cell}`
+    return /[",\r\n]/.test(cell) ? `"${cell.replace(/"/g, '""')}"` : cell
+}
+
+const toCsvRow = (ticket: ExportedTicket) => {
+    const contacts = (ticket.ownerContacts ?? {}) as { email?: string | null, phone_number?: string | null }
+    return [
+        ticket.UUID,
+        ticket.ownerName,
+        contacts.email,
+        contacts.phone_number,
+        ticket.ownerAffiliation.name,
+        ticket.invitation.name,
+        ticket.createdTime.toISOString(),
+        ticket.sentEmail,
+        ticket.quotas.map((quota) => `${quota.quotaType.name}=${quota.usageLeft}`).join(';')
+    ].map(csvCell).join(',') + '\r\n'
+}
+
+
+const formatChunk = (chunk: ExportedTicket[], format: ExportFormat) => {
+    if (format === 'csv') return chunk.map(toCsvRow).join('')
+    return chunk.map((ticket) => JSON.stringify(ticket) + '\n').join('')
+}
+
+
+// Resolves once the response can take more data, or once the client is gone
+const drained = (res: Response) => new Promise<void>((resolve) => {
+    const done = () => {
+        res.off('drain', done)
+        res.off('close', done)
+        resolve()
+    }
+    res.on('drain', done)
+    res.on('close', done)
+})
+
+
+// Streams the tickets matching where as newline delimited json (a ticket per line) or csv (with a header row).
+// Waits for the response to drain before reading the next chunk, so a slow client slows down the reads instead of
+// the chunks piling up in memory, and stops reading once the client disconnects.
+export const streamTickets = async (res: Response, where: Prisma.TicketWhereInput, format: ExportFormat, filename: string) => {
+    res.status(200)
+    res.set('Content-Type', format === 'csv' ? 'text/csv; charset=utf-8' : 'application/x-ndjson; charset=utf-8')
+    res.set('Content-Disposition', `attachment; filename="${filename}.${format}"`)
+    if (format === 'csv') res.write(CSV_COLUMNS.join(',') + '\r\n')
+
+    try {
+        for await (const chunk of ticketChunks(where)) {
+            if (res.destroyed) return
+            if (!res.write(formatChunk(chunk, format))) await drained(res)
+        }
+        res.end()
+    } catch (e) {
+        console.log(e)
+        // Headers are already sent, cutting the response short is the only way to tell the client it is incomplete
+        res.destroy(e as Error)
+    }
+}
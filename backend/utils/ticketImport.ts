@@ -0,0 +1,112 @@
+import readline from "readline";
+import { Readable } from "stream";
+import { StringDecoder } from "string_decoder";
+
+export const importFormats = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson'
+} as const
+
+// A row to import, numbered from 1 without the csv header, error is set when the row could not be parsed at all
+export type ImportRow = { row: number, ownerName?: unknown, ownerContacts?: unknown, error?: string }
+
+
+// Splits csv text into records, following RFC 4180: fields may be quoted, quoted fields may hold commas, doubled
+// quotes and line breaks. Only the record being parsed is held in memory.
+export async function* csvRecords(input: Readable) {
+    const decoder = new StringDecoder('utf8')
+    let record: string[] = []
+    let field = ''
+    let quoted = false
+    let afterQuote = false // The previous character closed a quote, or was the first of a doubled quote
+
+    const parse = function* (text: string) {
+        for (const char of text) {
+            if (quoted) {
+                if (char === '"') { quoted = false; afterQuote = true }
+                else field += char
+                continue
+            }
+            if (char === '"') {
+                if (afterQuote) field += '"' // A doubled quote within a quoted field
+                quoted = true
+                afterQuote = false
+                continue
+            }
+            afterQuote = false
+            if (char === ',') { record.push(field); field = '' }
+            else if (char === '\n') {
+                record.push(field.endsWith('\r') ? field.slice(0, -1) : field)
+                yield record
+                record = []
+                field = ''
+            }
+            else field += char
+        }
+    }
+
+    for await (const chunk of input) {
+        yield* parse(typeof chunk === 'string' ? chunk : decoder.write(chunk))
+    }
+    yield* parse(decoder.end())
+    if (field || record.length) yield [...record, field]
+}
+
+
+// Rows of a csv with a header row, columns are matched by name: ownerName, email and phone_number (as exported by
+// utils/ticketExport), other columns are ignored. Blank lines are skipped.
+async function* csvRows(input: Readable): AsyncGenerator<ImportRow> {
+    let header: string[] | undefined = undefined
+    let row = 0
+    for await (const record of csvRecords(input)) {
+        if (!header) {
+            header = record.map((column) => column.trim().replace(/^\uFEFF/, ''))
+            continue
+        }
+        row++
+        if (record.length === 1 && !record[0].trim()) continue
+        const fields: Record<string, string> = {}
+        header.forEach((column, idx) => fields[column] = (record[idx] ?? '').trim())
+        yield {
+            row,
+            ownerName: fields['ownerName'],
+            ownerContacts: { email: fields['email'] || null, phone_number: fields['phone_number'] || null }
+        }
+    }
+}
+
+
+// Rows of newline delimited json, each line holds the body of /ticket/create without the invitationId
+async function* ndjsonRows(input: Readable): AsyncGenerator<ImportRow> {
+    let row = 0
+    for await (const line of readline.createInterface({ input, crlfDelay: Infinity })) {
+        row++
+        if (!line.trim()) continue
+        try {
+            const { ownerName, ownerContacts } = JSON.parse(line)
+            yield { row, ownerName, ownerContacts }
+        } catch (e) {
+            yield { row, error: 'Invalid JSON' }
+        }
+    }
+}
+
+
+export const importRows = (input: Readable, format: typeof importFormats[keyof typeof importFormats]) => {
+    return format === 'csv' ? csvRows(input) : ndjsonRows(input)
+}
+
+
+// Groups the rows into batches of size, the last batch may be smaller
+export async function* batches<T>(rows: AsyncIterable<T>, size: number) {
+    let batch: T[] = []
+    for await (const row of rows) {
+        batch.push(row)
+        if (batch.length >= size) {
+            yield batch
+            batch = []
+        }
+    }
+    if (batch.length) yield batch
+}
@@ -0,0 +1,136 @@
+import { env } from "process";
+import os from "os";
+import path from "path";
+import { performance } from "perf_hooks";
+import { Worker } from "worker_threads";
+import { cpuTasks, CPUTask, CPUTaskArgs, CPUTaskResult } from "../workers/cpuTasks";
+import { addTiming } from "./serverTiming";
+
+// WORKER_POOL_SIZE=0 runs the tasks on the event loop, as before the pool
+const {
+    WORKER_POOL_SIZE = String(Math.max(1, os.cpus().length - 1)),
+    WORKER_QUEUE_LIMIT = '1000'
+} = env;
+
+type Job = {
+    task: CPUTask,
+    args: unknown,
+    queuedAt: number,
+    startedAt: number,
+    resolve: (value: { result: any, waitTime: number, runTime: number }) => void,
+    reject: (reason: Error) => void
+}
+
+
+// Thrown when the queue of the pool is full, the caller should answer 503 and let the client retry
+export class PoolBusyError extends Error {
+    constructor() {
+        super('The worker pool queue is full')
+    }
+}
+
+
+// Runs the tasks of workers/cpuTasks on size threads, one task per thread at a time. Tasks wait in a queue of at most
+// queueLimit tasks for a free thread, past which run() throws PoolBusyError instead of letting the backlog (and the
+// response times) grow unbounded. Each run adds the time waited for, and spent on, a thread to the Server-Timing
+// header as 'pool-wait' and 'pool-run'.
+export class WorkerPool {
+    private workers: Worker[] = []
+    private idle: Worker[] = []
+    private running = new Map<Worker, Job>()
+    private queue: Job[] = []
+    readonly stats = { completed: 0, failed: 0, rejected: 0, waitTime: 0, runTime: 0, maxQueueDepth: 0 }
+
+    constructor(readonly size: number, readonly queueLimit: number) { }
+
+    get queueDepth() {
+        return this.queue.length
+    }
+
+    get busy() {
+        return this.running.size
+    }
+
+    // Threads are only started by the first task, so importing the pool (e.g. from the seed script) costs nothing
+    private start() {
+        // Under ts-node this file is ran as is, the worker then needs ts-node too
+        const extension = path.extname(__filename)
+        const file = path.join(__dirname, '../workers/cpuTasks' + extension)
+        while (this.workers.length < this.size) {
+            const worker = new Worker(file, { execArgv: extension === '.ts' ? ['-r', 'ts-node/register'] : [] })
+            worker.on('message', (message) => this.finish(worker, message))
+            worker.on('error', (e) => this.finish(worker, { error: e.message }))
+            worker.on('exit', () => this.replace(worker))
+            worker.unref()
+            this.workers.push(worker)
+            this.idle.push(worker)
+        }
+    }
+
+    private replace(worker: Worker) {
+        this.finish(worker, { error: 'Worker exited' })
+        this.workers = this.workers.filter((w) => w !== worker)
+        this.idle = this.idle.filter((w) => w !== worker)
+        this.start()
+        this.dispatch()
+    }
+
+    private dispatch() {
+        while (this.idle.length && this.queue.length) {
+            const worker = this.idle.pop() as Worker
+            const job = this.queue.shift() as Job
+            job.startedAt = performance.now()
+            this.running.set(worker, job)
+            worker.postMessage({ task: job.task, args: job.args })
+        }
+    }
+
+    private finish(worker: Worker, { result, error }: { result?: unknown, error?: string }) {
+        const job = this.running.get(worker)
+        if (!job) return
+        this.running.delete(worker)
+        if (!this.idle.includes(worker) && this.workers.includes(worker)) this.idle.push(worker)
+
+        const waitTime = job.startedAt - job.queuedAt
+        const runTime = performance.now() - job.startedAt
+        this.stats.waitTime += waitTime
+        this.stats.runTime += runTime
+        if (error !== undefined) {
+            this.stats.failed++
+            job.reject(new Error(error))
+        } else {
+            this.stats.completed++
+            // Buffers arrive as plain Uint8Arrays
+            job.resolve({ result: result instanceof Uint8Array ? Buffer.from(result.buffer, result.byteOffset, result.byteLength) : result, waitTime, runTime })
+        }
+        this.dispatch()
+    }
+
+    async run<T extends CPUTask>(task: T, args: CPUTaskArgs<T>): Promise<CPUTaskResult<T>> {
+        if (this.size <= 0) {
+            const start = performance.now()
+            try {
+                return await cpuTasks[task](args as any) as CPUTaskResult<T>
+            } finally {
+                addTiming('pool-run', performance.now() - start, task)
+            }
+        }
+        if (this.queue.length >= this.queueLimit) {
+            this.stats.rejected++
+            throw new PoolBusyError()
+        }
+
+        this.start()
+        const { result, waitTime, runTime } = await new Promise<{ result: any, waitTime: number, runTime: number }>((resolve, reject) => {
+            this.queue.push({ task, args, queuedAt: performance.now(), startedAt: 0, resolve, reject })
+            this.stats.maxQueueDepth = Math.max(this.stats.maxQueueDepth, this.queue.length)
+            this.dispatch()
+        })
+        // Back in the caller's context, so the timings go to its request
+        addTiming('pool-wait', waitTime, task)
+        addTiming('pool-run', runTime, task)
+        return result
+    }
+}
+
+export const cpuPool = new WorkerPool(parseInt(WORKER_POOL_SIZE), parseInt(WORKER_QUEUE_LIMIT))
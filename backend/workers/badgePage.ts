@@ -0,0 +1,78 @@
+import { deflateSync } from "zlib";
+import QRCode, { QRCodeErrorCorrectionLevel } from 'qrcode';
+
+// A4 in points, badges are laid out in a grid of SHEET_COLUMNS by SHEET_ROWS with dashed cut lines between them
+export const PAGE_WIDTH = 595
+export const PAGE_HEIGHT = 842
+export const SHEET_COLUMNS = 3
+export const SHEET_ROWS = 4
+export const BADGES_PER_PAGE = SHEET_COLUMNS * SHEET_ROWS
+
+const PAGE_MARGIN = 36
+const CELL_WIDTH = (PAGE_WIDTH - 2 * PAGE_MARGIN) / SHEET_COLUMNS
+const CELL_HEIGHT = (PAGE_HEIGHT - 2 * PAGE_MARGIN) / SHEET_ROWS
+const CELL_PADDING = 10
+const NAME_SIZE = 11
+const UUID_SIZE = 7
+const QR_SIDE = Math.min(CELL_WIDTH, CELL_HEIGHT - NAME_SIZE - UUID_SIZE - 8) - 2 * CELL_PADDING
+
+export type Badge = { UUID: string, ownerName: string, content: string }
+export type QROptions = { errorCorrectionLevel: string, margin: number }
+
+
+const num = (value: number) => Number(value.toFixed(2)).toString()
+
+// A literal string of the standard fonts' encoding (WinAnsi), other characters are replaced
+const pdfString = (text: string) => {
+    const latin1 = Array.from(text, (char) => char.charCodeAt(0) <= 0xFF ? char : '?').join('')
+    return `(${latin1.replace(/[\\()]/g, (char) => '\\' + char)})`
+}
+
+// Helvetica is about half as wide as it is tall on average, truncates text to about width points
+const fit = (text: string, size: number, width: number) => {
+    const max = Math.floor(width / (size * 0.55))
+    return text.length > max ? text.slice(0, max - 3) + '...' : text
+}
+
+
+// The QR code as filled rectangles, a rectangle per run of dark modules of a row
+const drawQR = (content: string, { errorCorrectionLevel, margin }: QROptions, left: number, top: number) => {
+    const { modules } = QRCode.create(content, { errorCorrectionLevel: errorCorrectionLevel as QRCodeErrorCorrectionLevel })
+    const moduleSize = QR_SIDE / (modules.size + 2 * margin)
+    const ops: string[] = []
+    for (let row = 0; row < modules.size; row++) {
+        let runStart = -1
+        for (let col = 0; col <= modules.size; col++) {
+            const dark = col < modules.size && modules.get(row, col)
+            if (dark && runStart < 0) runStart = col
+            if (!dark && runStart >= 0) {
+                const x = left + (margin + runStart) * moduleSize
+                const y = top - (margin + row + 1) * moduleSize
+                ops.push(`${num(x)} ${num(y)} ${num((col - runStart) * moduleSize)} ${num(moduleSize)} re`)
+                runStart = -1
+            }
+        }
+    }
+    return ops.join('\n') + '\nf'
+}
+
+
+// The deflated content stream of a page holding up to BADGES_PER_PAGE badges: the QR code, the owner's name and the
+// ticket's UUID. Only the PDF's built-in Helvetica is used, so the sheet embeds no font.
+export const renderBadgePage = (badges: Badge[], qrOptions: QROptions) => {
+    const ops: string[] = ['0 g']
+    badges.slice(0, BADGES_PER_PAGE).forEach(({ UUID, ownerName, content }, idx) => {
+        const cellLeft = PAGE_MARGIN + (idx % SHEET_COLUMNS) * CELL_WIDTH
+        const cellTop = PAGE_HEIGHT - PAGE_MARGIN - Math.floor(idx / SHEET_COLUMNS) * CELL_HEIGHT
+        const left = cellLeft + (CELL_WIDTH - QR_SIDE) / 2
+        const top = cellTop - CELL_PADDING
+
+        ops.push(
+            `q 0.75 G 0.5 w [3 3] 0 d ${num(cellLeft)} ${num(cellTop - CELL_HEIGHT)} ${num(CELL_WIDTH)} ${num(CELL_HEIGHT)} re S Q`,
+            drawQR(content, qrOptions, left, top),
+            `BT /F1 ${NAME_SIZE} Tf ${num(left)} ${num(top - QR_SIDE - NAME_SIZE)} Td ${pdfString(fit(ownerName, NAME_SIZE, QR_SIDE))} Tj ET`,
+            `BT /F1 ${UUID_SIZE} Tf 0.4 g ${num(left)} ${num(top - QR_SIDE - NAME_SIZE - UUID_SIZE - 4)} Td ${pdfString(UUID)} Tj ET 0 g`
+        )
+    })
+    return deflateSync(Buffer.from(ops.join('\n'), 'latin1'))
+}
@@ -0,0 +1,81 @@
+import { env } from "process";
+import { isMainThread, parentPort } from "worker_threads";
+import QRCode, { QRCodeToBufferOptions, QRCodeToStringOptions } from 'qrcode';
+import { render } from "@react-email/components";
+import { InvitationEmail } from '../emails/invitation-email'
+import { TicketEmail } from '../emails/ticket-email'
+import { Badge, renderBadgePage } from './badgePage'
+import { EmailTemplate } from './emailTemplate'
+import { TTLCache } from '../utils/cache'
+
+// The CPU bound work of the backend, ran by the threads of utils/workerPool so the event loop keeps serving requests.
+// Arguments and results are copied between threads, hence plain data only.
+
+const QRCodeOptions = { errorCorrectionLevel: 'Q', scale: 8, margin: 2 }
+
+// EMAIL_TEMPLATE_CACHE=0 renders every email with React, as before the templates
+const { EMAIL_TEMPLATE_CACHE = '1' } = env;
+
+type TicketEmailProps = Parameters<typeof TicketEmail>[0]
+type InvitationEmailProps = Parameters<typeof InvitationEmail>[0]
+
+// The props which differ between the emails of an event, the rest (the event, the images and the time zone) is the
+// shell shared by all of them
+const ticketEmailFields = ['ownerName', 'ticketLink', 'qrImgUrl'] as const
+const invitationEmailFields = ['invitationLink', 'qrImgUrl', 'invitationId'] as const
+type TicketEmailFields = typeof ticketEmailFields[number]
+type InvitationEmailFields = typeof invitationEmailFields[number]
+export type TicketEmailRecipient = Pick<TicketEmailProps, TicketEmailFields>
+export type TicketEmailShell = Omit<TicketEmailProps, TicketEmailFields>
+
+// Templates of this thread by their shell, so an event config update compiles new ones and the old are evicted
+const ticketTemplates = new TTLCache<EmailTemplate<TicketEmailFields>>('ticket-email', Infinity, 8)
+const invitationTemplates = new TTLCache<EmailTemplate<InvitationEmailFields>>('invitation-email', Infinity, 8)
+
+const ticketTemplate = (shell: TicketEmailShell) => ticketTemplates.get(JSON.stringify(shell), async () => (
+    new EmailTemplate((placeholders) => render(TicketEmail({ ...shell, ...placeholders })), ticketEmailFields)
+))
+
+const invitationTemplate = (shell: Omit<InvitationEmailProps, InvitationEmailFields>) => invitationTemplates.get(JSON.stringify(shell), async () => (
+    new EmailTemplate((placeholders) => render(InvitationEmail({ ...shell, ...placeholders })), invitationEmailFields)
+))
+
+const renderTicketEmail = async ({ ownerName = '', ticketLink = '', qrImgUrl = '', ...shell }: TicketEmailProps) => {
+    if (EMAIL_TEMPLATE_CACHE === '0') return render(TicketEmail({ ...shell, ownerName, ticketLink, qrImgUrl }))
+    return (await ticketTemplate(shell)).fill({ ownerName, ticketLink, qrImgUrl })
+}
+
+export const cpuTasks = {
+    qr: async ({ content, format }: { content: string, format: 'png' | 'svg' }) => {
+        if (format === 'svg') return Buffer.from(await QRCode.toString(content, { ...QRCodeOptions, type: 'svg' } as QRCodeToStringOptions))
+        return await QRCode.toBuffer(content, QRCodeOptions as QRCodeToBufferOptions)
+    },
+    ticketEmail: renderTicketEmail,
+    // The emails of a batch in a single message, the template is looked up once for all of them
+    ticketEmails: async ({ shell, recipients }: { shell: TicketEmailShell, recipients: TicketEmailRecipient[] }) => {
+        if (EMAIL_TEMPLATE_CACHE === '0') return await Promise.all(recipients.map((recipient) => renderTicketEmail({ ...shell, ...recipient })))
+        const template = await ticketTemplate(shell)
+        return recipients.map(({ ownerName = '', ticketLink = '', qrImgUrl = '' }) => template.fill({ ownerName, ticketLink, qrImgUrl }))
+    },
+    invitationEmail: async ({ invitationLink = '', qrImgUrl = '', invitationId = '', ...shell }: InvitationEmailProps) => {
+        if (EMAIL_TEMPLATE_CACHE === '0') return render(InvitationEmail({ ...shell, invitationLink, qrImgUrl, invitationId }))
+        return (await invitationTemplate(shell)).fill({ invitationLink, qrImgUrl, invitationId })
+    },
+    badgePage: async (badges: Badge[]) => renderBadgePage(badges, QRCodeOptions)
+}
+
+export type CPUTask = keyof typeof cpuTasks
+export type CPUTaskArgs<T extends CPUTask> = Parameters<typeof cpuTasks[T]>[0]
+export type CPUTaskResult<T extends CPUTask> = Awaited<ReturnType<typeof cpuTasks[T]>>
+
+
+if (!isMainThread && parentPort) {
+    const port = parentPort
+    port.on('message', async ({ task, args }: { task: CPUTask, args: any }) => {
+        try {
+            port.postMessage({ result: await cpuTasks[task](args) })
+        } catch (e) {
+            port.postMessage({ error: e instanceof Error ? e.message : String(e) })
+        }
+    })
+}
@@ -0,0 +1,37 @@
+import { randomBytes } from "crypto";
+
+// The characters React escapes in text and attribute values, and how, so spliced fields come out as render would
+const ESCAPES: Record<string, string> = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;' }
+
+export const escapeHtml = (value: string) => value.replace(/[&<>"']/g, (char) => ESCAPES[char])
+
+
+// The HTML of an email rendered once with a placeholder in place of each of fields, filled in by splicing the
+// escaped values of an email between the parts around them. The placeholders only hold characters React writes as
+// is, and a random nonce so that no other content of the email can match them.
+export class EmailTemplate<F extends string> {
+    private parts: string[] = []
+    private order: F[] = []
+
+    constructor(renderHtml: (placeholders: Record<F, string>) => string, fields: readonly F[]) {
+        const nonce = randomBytes(8).toString('hex')
+        const placeholders = Object.fromEntries(fields.map((field) => [field, `__${field}_${nonce}__`])) as Record<F, string>
+        const byPlaceholder = new Map(fields.map((field) => [placeholders[field], field]))
+
+        const pattern = new RegExp(fields.map((field) => placeholders[field]).join('|'), 'g')
+        const html = renderHtml(placeholders)
+        let last = 0
+        for (const match of html.matchAll(pattern)) {
+            this.parts.push(html.slice(last, match.index))
+            this.order.push(byPlaceholder.get(match[0]) as F)
+            last = (match.index as number) + match[0].length
+        }
+        this.parts.push(html.slice(last))
+    }
+
+    fill(values: Record<F, string>) {
+        let html = this.parts[0]
+        for (let idx = 0; idx < this.order.length; idx++) html += escapeHtml(values[this.order[idx]] ?? '') + this.parts[idx + 1]
+        return html
+    }
+}
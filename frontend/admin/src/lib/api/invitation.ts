@@ -7,6 +7,7 @@ export const getAll = async (): Promise<Invitation[]> => {
         const res = await axios({
             method: 'GET',
             url: `${import.meta.env.VITE_API_BASE_URL}/invitation/`,
+            params: { all: true }
         })
         return res.data.invitations
     } catch (e) {
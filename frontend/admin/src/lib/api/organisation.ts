@@ -7,6 +7,7 @@ export const getAll = async (): Promise<Organisation[]> => {
         const res = await axios({
             method: 'GET',
             url: `${import.meta.env.VITE_API_BASE_URL}/organisation/`,
+            params: { all: true }
         })
         return res.data.organisations.map((organisation: Organisation) => ({ top_manager: organisation.managers?.at(0)?.username || "No manager", ...organisation }))
     } catch (e) {
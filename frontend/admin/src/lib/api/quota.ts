@@ -7,6 +7,7 @@ export const getAll = async (): Promise<Quota[]> => {
         const res = await axios({
             method: 'GET',
             url: `${import.meta.env.VITE_API_BASE_URL}/quota/`,
+            params: { all: true }
         })
         return res.data.quotas
     } catch (e) {
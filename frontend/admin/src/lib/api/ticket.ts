@@ -7,6 +7,7 @@ export const getAll = async (): Promise<Ticket[]> => {
         const res = await axios({
             method: 'GET',
             url: `${import.meta.env.VITE_API_BASE_URL}/ticket/`,
+            params: { all: true }
         })
         return res.data.tickets
     } catch (e) {
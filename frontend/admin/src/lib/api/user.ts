@@ -105,6 +105,7 @@ export const getAll = async (): Promise<UserSanitized[]> => {
         const res = await axios({
             method: 'GET',
             url: `${import.meta.env.VITE_API_BASE_URL}/user/`,
+            params: { all: true }
         })
         return sanitizeUsers(res.data.users)
     } catch (e) {